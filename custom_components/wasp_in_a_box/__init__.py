@@ -9,11 +9,17 @@ from __future__ import annotations
 import voluptuous as vol
 from awesomeversion.awesomeversion import AwesomeVersion
 
-from homeassistant.config_entries import ConfigEntry
+from homeassistant.components.binary_sensor import DOMAIN as BINARY_SENSOR_DOMAIN
+from homeassistant.config_entries import SOURCE_INTEGRATION_DISCOVERY, ConfigEntry
 from homeassistant.const import __version__ as HA_VERSION  # noqa: N812
-from homeassistant.core import Event, HomeAssistant
-from homeassistant.helpers import config_validation as cv, entity_registry as er
-from homeassistant.helpers.event import async_track_entity_registry_updated_event
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import (
+    config_validation as cv,
+    discovery_flow,
+    entity_registry as er,
+    service,
+)
+from homeassistant.helpers.start import async_at_started
 from homeassistant.helpers.typing import ConfigType
 
 from .const import (
@@ -23,7 +29,17 @@ from .const import (
     LOGGER,
     MIN_HA_VERSION,
     PLATFORMS,
+    SERVICE_RESET,
+)
+from .models import (
+    async_evaluate_pending_sensors,
+    async_get_data,
+    get_room_sources,
+    get_room_unique_id,
+    get_rooms,
+    get_source_entity_ids,
 )
+from .websocket_api import async_setup_websocket_api
 
 CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 
@@ -43,60 +59,60 @@ async def async_setup(
         LOGGER.critical(msg)
         return False
 
+    async_get_data(hass)
+    async_setup_websocket_api(hass)
+
+    # Sensors added during startup are evaluated in a single pass once started
+    async_at_started(hass, async_evaluate_pending_sensors)
+    # Propose the rooms of areas with motion and door sensors
+    async_at_started(hass, async_start_discovery)
+
+    # Registered once for the sensors of all entries
+    service.async_register_platform_entity_service(
+        hass,
+        DOMAIN,
+        SERVICE_RESET,
+        entity_domain=BINARY_SENSOR_DOMAIN,
+        schema={},
+        func="async_reset",
+    )
+
     return True
 
 
+@callback
+def async_start_discovery(hass: HomeAssistant) -> None:
+    """Start a discovery flow, it aborts when there is nothing to propose."""
+    discovery_flow.async_create_flow(
+        hass,
+        DOMAIN,
+        context={"source": SOURCE_INTEGRATION_DISCOVERY},
+        data={},
+    )
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Min/Max from a config entry."""
 
-    entity_registry = er.async_get(hass)
+    # Validate the sources of every room in one registry pass
+    source_entity_ids = get_source_entity_ids(get_rooms(entry.options, entry.title))
     try:
-        wasp_entity_id = er.async_validate_entity_id(
-            entity_registry, entry.options[CONF_WASP_ID]
-        )
-    except vol.Invalid:
-        # The entity is identified by an unknown entity registry ID
-        LOGGER.error(
-            "Failed to setup wasp_in_a_box for unknown entity %s",
-            entry.options[CONF_WASP_ID],
-        )
-        return False
-    try:
-        box_entity_id = er.async_validate_entity_id(
-            entity_registry, entry.options[CONF_BOX_ID]
-        )
+        entity_ids = er.async_validate_entity_ids(er.async_get(hass), source_entity_ids)
     except vol.Invalid:
-        # The entity is identified by an unknown entity registry ID
+        # An entity is identified by an unknown entity registry ID
         LOGGER.error(
-            "Failed to setup wasp_in_a_box for unknown entity %s",
-            entry.options[CONF_BOX_ID],
+            "Failed to setup wasp_in_a_box for unknown entity in %s",
+            source_entity_ids,
         )
         return False
 
-    async def async_registry_updated(
-        event: Event[er.EventEntityRegistryUpdatedData],
-    ) -> None:
-        """Handle entity registry update."""
-        data = event.data
-        if data["action"] == "remove":
-            await hass.config_entries.async_remove(entry.entry_id)
-
-        if data["action"] != "update":
-            return
-
-        if "entity_id" in data["changes"]:
-            # Entity_id changed, reload the config entry
-            await hass.config_entries.async_reload(entry.entry_id)
-
     entry.async_on_unload(
-        async_track_entity_registry_updated_event(
-            hass, wasp_entity_id, async_registry_updated
-        )
+        async_get_data(hass).registry_watcher.async_track(entry.entry_id, entity_ids)
     )
-    entry.async_on_unload(
-        async_track_entity_registry_updated_event(
-            hass, box_entity_id, async_registry_updated
-        )
+
+    # The rooms the sensors run with, to tell what an update changes
+    async_get_data(hass).applied_rooms[entry.entry_id] = get_rooms(
+        entry.options, entry.title
     )
 
     entry.async_on_unload(entry.add_update_listener(config_entry_update_listener))
@@ -106,11 +122,58 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return True
 
 
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Migrate an old config entry."""
+    if entry.version > 2:  # noqa: PLR2004
+        # Downgraded from a future version
+        return False
+
+    if entry.version == 1:
+        # Single source entities became lists of sources
+        options = {**entry.options}
+        for conf in (CONF_WASP_ID, CONF_BOX_ID):
+            if isinstance(options[conf], str):
+                options[conf] = [options[conf]]
+        hass.config_entries.async_update_entry(entry, options=options, version=2)
+        LOGGER.debug("Migrated config entry %s to version 2", entry.entry_id)
+
+    return True
+
+
 async def config_entry_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
-    """Update listener, called when the config entry options are changed."""
-    await hass.config_entries.async_reload(entry.entry_id)
+    """Update listener, called when the config entry options are changed.
+
+    Timing options are applied to the running sensors, keeping their state and
+    timers. The entry is only reloaded when the rooms or their sources change.
+    """
+    data = async_get_data(hass)
+    rooms = get_rooms(entry.options, entry.title)
+    applied = data.applied_rooms.get(entry.entry_id)
+    if rooms == applied:
+        # Already applied, such as a source renamed in place
+        return
+    if applied is None or get_room_sources(rooms) != get_room_sources(applied):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    sensors = {sensor.unique_id: sensor for sensor in data.sensors}
+    room_sensors = [
+        (room, sensor)
+        for room in rooms
+        if (sensor := sensors.get(get_room_unique_id(entry.entry_id, room))) is not None
+    ]
+    if len(room_sensors) != len(rooms):
+        # A sensor is not running, such as when it is disabled
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    for room, sensor in room_sensors:
+        sensor.async_update_options(room)
+    data.applied_rooms[entry.entry_id] = rooms
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        async_get_data(hass).applied_rooms.pop(entry.entry_id, None)
+    return unload_ok
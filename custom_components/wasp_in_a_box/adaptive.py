@@ -0,0 +1,269 @@
+"""Online learning of the door closed delay and door open timeout."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Self
+
+from .occupancy import STATE_OFF, STATE_ON
+
+# Quantile of the observed gaps a learned duration has to cover
+ADAPTIVE_QUANTILE = 0.95
+# Weight of the latest gap in the moving average
+ADAPTIVE_EWMA_ALPHA = 0.1
+# Gaps to observe before the learned duration replaces the option
+ADAPTIVE_MIN_SAMPLES = 10
+# Margins added to the learned durations and the longest gaps counted, in
+# seconds, longer gaps are taken for an empty room rather than a slow sensor
+# or a still occupant
+ADAPTIVE_DOOR_CLOSED_DELAY_MARGIN = 10
+ADAPTIVE_DOOR_CLOSED_DELAY_GAP_LIMIT = 120
+ADAPTIVE_DOOR_OPEN_TIMEOUT_MARGIN = 30
+ADAPTIVE_DOOR_OPEN_TIMEOUT_GAP_LIMIT = 1800
+
+P2_MARKERS = 5
+
+
+class P2Quantile:
+    """Estimate a quantile in constant memory with the P² algorithm.
+
+    Five markers track the minimum, the maximum, the quantile and the points
+    half way to it, their heights are adjusted with a piecewise parabolic
+    prediction as observations arrive (Jain and Chlamtac, 1985).
+    """
+
+    __slots__ = ("count", "desired", "heights", "positions", "quantile")
+
+    def __init__(self, quantile: float) -> None:
+        """Initialize the estimator of a quantile between 0 and 1."""
+        self.quantile = quantile
+        self.count = 0
+        self.heights: list[float] = []
+        self.positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.desired = [
+            1.0,
+            1 + 2 * quantile,
+            1 + 4 * quantile,
+            3 + 2 * quantile,
+            5.0,
+        ]
+
+    @property
+    def value(self) -> float | None:
+        """Return the estimated quantile, None before any observation."""
+        if not self.heights:
+            return None
+        if self.count < P2_MARKERS:
+            ordered = sorted(self.heights)
+            return ordered[round(self.quantile * (len(ordered) - 1))]
+        return self.heights[2]
+
+    def add(self, value: float) -> None:
+        """Add an observation."""
+        self.count += 1
+        heights = self.heights
+        if self.count <= P2_MARKERS:
+            heights.append(value)
+            if self.count == P2_MARKERS:
+                heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(1, P2_MARKERS) if value < heights[i]) - 1
+
+        positions = self.positions
+        for i in range(cell + 1, P2_MARKERS):
+            positions[i] += 1
+        quantile = self.quantile
+        for i, increment in enumerate(
+            (0.0, quantile / 2, quantile, (1 + quantile) / 2, 1.0)
+        ):
+            self.desired[i] += increment
+
+        for i in range(1, P2_MARKERS - 1):
+            offset = self.desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (
+                offset <= -1 and positions[i - 1] - positions[i] < -1
+            ):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (
+                        positions[i + step] - positions[i]
+                    )
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        """Return the piecewise parabolic prediction of a marker height."""
+        heights = self.heights
+        positions = self.positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step)
+            * (heights[i + 1] - heights[i])
+            / (positions[i + 1] - positions[i])
+            + (positions[i + 1] - positions[i] - step)
+            * (heights[i] - heights[i - 1])
+            / (positions[i] - positions[i - 1])
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the markers to store."""
+        return {
+            "count": self.count,
+            "heights": self.heights,
+            "positions": self.positions,
+            "desired": self.desired,
+        }
+
+    @classmethod
+    def from_dict(cls, quantile: float, restored: dict[str, Any]) -> Self:
+        """Return the estimator from stored markers."""
+        estimator = cls(quantile)
+        estimator.count = restored["count"]
+        estimator.heights = list(restored["heights"])
+        estimator.positions = list(restored["positions"])
+        estimator.desired = list(restored["desired"])
+        return estimator
+
+
+@dataclass(slots=True)
+class LearnedDuration:
+    """A duration learned from observed gaps.
+
+    The learned duration is the larger of the quantile, which bounds the
+    tail of all gaps seen, and the moving average, which follows recent gaps
+    faster, plus a margin. It is only used once enough gaps have been seen,
+    and is bounded by the configured option: a shortening duration is at most
+    the option, any other at least the option.
+    """
+
+    margin: float
+    gap_limit: float
+    shortening: bool
+    quantile: P2Quantile = field(default_factory=lambda: P2Quantile(ADAPTIVE_QUANTILE))
+    average: float | None = None
+
+    @property
+    def samples(self) -> int:
+        """Return the number of observed gaps."""
+        return self.quantile.count
+
+    def add(self, gap: float) -> None:
+        """Add an observed gap, gaps beyond the limit are ignored."""
+        if gap > self.gap_limit:
+            return
+        self.quantile.add(gap)
+        self.average = (
+            gap
+            if self.average is None
+            else self.average + ADAPTIVE_EWMA_ALPHA * (gap - self.average)
+        )
+
+    def value(self, option: float) -> float:
+        """Return the learned duration, or the option while still learning."""
+        if (
+            self.samples < ADAPTIVE_MIN_SAMPLES
+            or (quantile := self.quantile.value) is None
+            or self.average is None
+        ):
+            return option
+        learned = max(quantile, self.average) + self.margin
+        return min(learned, option) if self.shortening else max(learned, option)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the statistics to store."""
+        return {"quantile": self.quantile.as_dict(), "average": self.average}
+
+    def restore(self, restored: dict[str, Any]) -> None:
+        """Restore stored statistics."""
+        self.quantile = P2Quantile.from_dict(ADAPTIVE_QUANTILE, restored["quantile"])
+        self.average = restored["average"]
+
+
+def _door_closed_delay() -> LearnedDuration:
+    return LearnedDuration(
+        ADAPTIVE_DOOR_CLOSED_DELAY_MARGIN,
+        ADAPTIVE_DOOR_CLOSED_DELAY_GAP_LIMIT,
+        shortening=True,
+    )
+
+
+def _door_open_timeout() -> LearnedDuration:
+    return LearnedDuration(
+        ADAPTIVE_DOOR_OPEN_TIMEOUT_MARGIN,
+        ADAPTIVE_DOOR_OPEN_TIMEOUT_GAP_LIMIT,
+        shortening=False,
+    )
+
+
+@dataclass(slots=True)
+class AdaptiveTiming:
+    """Learn the door closed delay and door open timeout of a room.
+
+    The door closed delay has to outlast the motion sensor clearing in an
+    empty room, so it learns from the gap between the door closing and the
+    motion clearing, counted when the door opens again without further
+    motion. The door open timeout has to outlast an occupant keeping still
+    with the door open, so it learns from gaps without motion while the door
+    is open that end with motion.
+
+    Learning only moves each duration in the direction it is meant to
+    improve: the door closed delay is shortened below its option to detect
+    vacancy sooner, the door open timeout is lengthened above its option to
+    keep still occupants.
+    """
+
+    door_closed_delay: LearnedDuration = field(default_factory=_door_closed_delay)
+    door_open_timeout: LearnedDuration = field(default_factory=_door_open_timeout)
+    _door_closed_at: float | None = None
+    _clear_gap: float | None = None
+    _still_since: float | None = None
+
+    def wasp_changed(self, time: float, wasp_state: str, box_state: str) -> None:
+        """Observe the wasp state changing."""
+        if wasp_state == STATE_OFF:
+            if box_state == STATE_ON:
+                self._still_since = time
+            elif (
+                box_state == STATE_OFF
+                and self._door_closed_at is not None
+                and self._clear_gap is None
+            ):
+                # Counted once the door opens without motion in between
+                self._clear_gap = time - self._door_closed_at
+        elif wasp_state == STATE_ON:
+            # Motion after the door closed, the room was occupied
+            self._door_closed_at = self._clear_gap = None
+            if self._still_since is not None and box_state == STATE_ON:
+                self.door_open_timeout.add(time - self._still_since)
+            self._still_since = None
+
+    def box_changed(self, time: float, box_state: str, wasp_state: str) -> None:
+        """Observe the box state changing."""
+        if box_state == STATE_OFF:
+            self._door_closed_at = time if wasp_state == STATE_ON else None
+            self._clear_gap = self._still_since = None
+        elif box_state == STATE_ON:
+            if self._clear_gap is not None:
+                self.door_closed_delay.add(self._clear_gap)
+            self._door_closed_at = self._clear_gap = None
+            self._still_since = time if wasp_state == STATE_OFF else None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the statistics to store."""
+        return {
+            "door_closed_delay": self.door_closed_delay.as_dict(),
+            "door_open_timeout": self.door_open_timeout.as_dict(),
+        }
+
+    def restore(self, restored: dict[str, Any]) -> None:
+        """Restore stored statistics."""
+        self.door_closed_delay.restore(restored["door_closed_delay"])
+        self.door_open_timeout.restore(restored["door_open_timeout"])
@@ -2,42 +2,70 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+import time
+from collections.abc import Container, Mapping
+from dataclasses import asdict, dataclass
+from operator import itemgetter
+from typing import Any, Self
 
 from homeassistant.components.binary_sensor import (
     BinarySensorDeviceClass,
     BinarySensorEntity,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import STATE_OFF, STATE_ON, STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.const import (
+    CONF_NAME,
+    STATE_ON,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+)
 from homeassistant.core import (
     CALLBACK_TYPE,
+    CoreState,
     Event,
     EventStateChangedData,
     HomeAssistant,
+    State,
     callback,
 )
-from homeassistant.helpers import entity_registry as er
-from homeassistant.helpers.entity_platform import (
-    AddConfigEntryEntitiesCallback,
-    async_get_current_platform,
-)
-from homeassistant.helpers.event import (
-    async_call_later,
-    async_track_state_change_event,
-)
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
+from homeassistant.helpers.restore_state import ExtraStoredData, RestoreEntity
+from homeassistant.util import dt as dt_util
 
+from .adaptive import AdaptiveTiming
 from .const import (
     ATTR_DOOR_SENSOR_STATE,
     ATTR_MOTION_SENSOR_STATE,
+    CONF_ADAPTIVE,
     CONF_BOX_ID,
+    CONF_BOX_SETTLE_TIME,
+    CONF_COALESCE_WINDOW,
     CONF_DOOR_CLOSED_DELAY,
     CONF_DOOR_OPEN_TIMEOUT,
     CONF_IMMEDIATE_ON,
+    CONF_RECORDER_FRIENDLY,
     CONF_WASP_ID,
+    CONF_WASP_SETTLE_TIME,
+    DEFAULT_ADAPTIVE,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_RECORDER_FRIENDLY,
+    DEFAULT_SETTLE_TIME,
     LOGGER,
-    SERVICE_RESET,
+    SIGNAL_STATISTICS_UPDATED,
 )
+from .debounce import SourceDebouncer
+from .latency import LatencyHistogram
+from .models import (
+    async_evaluate_sensors,
+    async_get_data,
+    get_room_statistics_reset,
+    get_room_unique_id,
+    get_rooms,
+)
+from .occupancy import OccupancyRules, SourceGroup, TimerCommand, normalize_state
+from .snapshot import SensorSnapshot
+from .stats import OccupancyStatistics, parse_reset_time
 
 
 async def async_setup_entry(
@@ -47,341 +75,803 @@ async def async_setup_entry(
 ) -> bool:
     """Initialize config entry."""
 
-    wasp_entity_id: str = config_entry.options[CONF_WASP_ID]
-    box_entity_id: str = config_entry.options[CONF_BOX_ID]
-    delay = config_entry.options[CONF_DOOR_CLOSED_DELAY]
-    timeout = config_entry.options[CONF_DOOR_OPEN_TIMEOUT]
-    immediate_on = config_entry.options[CONF_IMMEDIATE_ON]
-
     async_add_entities(
         [
-            WaspInABoxSensor(
+            (
+                WaspInABoxRecorderFriendlySensor
+                if room.get(CONF_RECORDER_FRIENDLY, DEFAULT_RECORDER_FRIENDLY)
+                else WaspInABoxSensor
+            )(
                 hass,
-                wasp_entity_id,
-                box_entity_id,
-                delay,
-                timeout,
-                immediate_on,
-                config_entry.title,
-                config_entry.entry_id,
+                room[CONF_WASP_ID],
+                room.get(CONF_BOX_ID, []),
+                room[CONF_DOOR_CLOSED_DELAY],
+                room[CONF_DOOR_OPEN_TIMEOUT],
+                room[CONF_IMMEDIATE_ON],
+                room[CONF_NAME],
+                get_room_unique_id(config_entry.entry_id, room),
+                coalesce_window=room.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW),
+                adaptive=room.get(CONF_ADAPTIVE, DEFAULT_ADAPTIVE),
+                statistics_reset=get_room_statistics_reset(room),
+                wasp_settle_time=room.get(CONF_WASP_SETTLE_TIME, DEFAULT_SETTLE_TIME),
+                box_settle_time=room.get(CONF_BOX_SETTLE_TIME, DEFAULT_SETTLE_TIME),
             )
+            for room in get_rooms(config_entry.options, config_entry.title)
         ]
     )
 
-    # Register entity services
-    platform = async_get_current_platform()
-    platform.async_register_entity_service(
-        SERVICE_RESET,
-        {},
-        "async_reset",
+    return True
+
+
+def _is_reappearance(
+    old_state: State | None, new_state: State | None, known_state: str
+) -> bool:
+    """Return True if a source is added with the state it is known to have.
+
+    A renamed source is removed and added again under its new entity id.
+    """
+    return (
+        old_state is None
+        and new_state is not None
+        and normalize_state(new_state.state) == known_state
     )
 
-    return True
+
+@dataclass
+class WaspInABoxExtraStoredData(ExtraStoredData):
+    """Occupancy and timer deadlines of a sensor, stored across restarts.
+
+    Deadlines are UTC timestamps as the loop clock does not survive a restart.
+    Adaptive timing and occupancy statistics are stored when enabled.
+    """
+
+    state: str
+    wasp_state: str
+    box_state: str
+    motion_was_detected: bool
+    door_closed_delay_deadline: float | None
+    door_open_timeout_deadline: float | None
+    adaptive: dict[str, Any] | None = None
+    statistics: dict[str, Any] | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a dict representation of the stored data."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, restored: dict[str, Any]) -> Self | None:
+        """Initialize the stored data from a dict."""
+        try:
+            return cls(
+                restored["state"],
+                restored["wasp_state"],
+                restored["box_state"],
+                restored["motion_was_detected"],
+                restored["door_closed_delay_deadline"],
+                restored["door_open_timeout_deadline"],
+                restored.get("adaptive"),
+                restored.get("statistics"),
+            )
+        except KeyError:
+            return None
 
 
-class WaspInABoxSensor(BinarySensorEntity):
+class WaspInABoxSensor(BinarySensorEntity, RestoreEntity):
     """Representation of a wasp_in_a_box sensor."""
 
     _attr_device_class = BinarySensorDeviceClass.OCCUPANCY
     _attr_should_poll = False
     _attr_translation_key = "wasp_in_a_box"
     _state_had_real_change = False
-    _wasp_state: str = STATE_UNKNOWN
-    _box_state: str = STATE_UNKNOWN
-    _door_closed_delay_timer: CALLBACK_TYPE | None = None
-    _door_open_timeout_timer: CALLBACK_TYPE | None = None
-    _motion_was_detected: bool = False
     _awaiting_first_wasp_state: bool = True
     _awaiting_first_box_state: bool = True
+    _evaluated: bool = False
+    _last_written: tuple[str, str, str] | None = None
+    _skipped_writes: int = 0
+    _write_deferred: bool = False
+    _suppressed_writes: int = 0
+    _source_fired: float | None = None
 
     def __init__(  # noqa: PLR0913
         self,
         hass: HomeAssistant,
-        wasp_entity_id: str,
-        box_entity_id: str,
-        delay: int,
-        timeout: int,
+        wasp_entity_ids: list[str],
+        box_entity_ids: list[str],
+        delay: float,
+        timeout: float,
         immediate_on: bool,
         name: str | None,
         unique_id: str | None,
+        *,
+        coalesce_window: float = DEFAULT_COALESCE_WINDOW,
+        adaptive: bool = DEFAULT_ADAPTIVE,
+        statistics_reset: str | None = None,
+        wasp_settle_time: float = DEFAULT_SETTLE_TIME,
+        box_settle_time: float = DEFAULT_SETTLE_TIME,
     ) -> None:
         """Initialize the min/max sensor."""
         self._attr_unique_id = unique_id
-        self._wasp_entity_id = wasp_entity_id
-        self._box_entity_id = box_entity_id
+        self._wasp_entity_ids = wasp_entity_ids
+        self._box_entity_ids = box_entity_ids
+        self._source_unsubs: dict[str, list[CALLBACK_TYPE]] = {}
+        self._wasp_sources = SourceGroup.from_entity_ids(wasp_entity_ids)
+        self._box_sources = SourceGroup.from_entity_ids(box_entity_ids)
         self._delay = delay
         self._timeout = timeout
-        self._immediate_on = immediate_on
+        self._coalesce_window = coalesce_window or 0
+        self._adaptive = AdaptiveTiming() if adaptive else None
+        self._latency = LatencyHistogram()
+        self._statistics = (
+            None
+            if statistics_reset is None
+            else OccupancyStatistics(
+                parse_reset_time(statistics_reset), dt_util.get_default_time_zone()
+            )
+        )
         self._attr_name = name
-        self._state: str = STATE_UNKNOWN
+        self._rules = OccupancyRules(immediate_on, boxless=not box_entity_ids)
+        self._attr_extra_state_attributes = {
+            ATTR_MOTION_SENSOR_STATE: self._rules.wasp_state,
+            ATTR_DOOR_SENSOR_STATE: self._rules.box_state,
+        }
+
+        data = async_get_data(hass)
+        self._snapshot_stream = data.snapshot_stream
+        scheduler = data.scheduler
+        self._clock = scheduler.time
+        self._door_closed_delay_timer = scheduler.async_deadline(
+            self._async_door_closed_delay_callback
+        )
+        self._door_open_timeout_timer = scheduler.async_deadline(
+            self._async_door_open_timeout_callback
+        )
+        self._coalesce_timer = scheduler.async_deadline(
+            self._async_coalesce_window_callback
+        )
+        self._wasp_debouncer = SourceDebouncer(
+            scheduler, wasp_settle_time or 0, self._async_wasp_state_listener
+        )
+        self._box_debouncer = SourceDebouncer(
+            scheduler, box_settle_time or 0, self._async_box_state_listener
+        )
 
     async def async_added_to_hass(self) -> None:
         """Handle added to Hass."""
 
         await super().async_added_to_hass()
 
-        self.async_on_remove(
-            async_track_state_change_event(
-                self.hass,
-                self._wasp_entity_id,
-                self._async_wasp_state_listener,
+        if (last_extra_data := await self.async_get_last_extra_data()) and (
+            restored := WaspInABoxExtraStoredData.from_dict(last_extra_data.as_dict())
+        ):
+            self._async_restore(restored)
+
+        data = async_get_data(self.hass)
+        data.sensors.add(self)
+        self.async_on_remove(lambda: data.sensors.discard(self))
+        if self.unique_id is not None:
+            data.latency[self.unique_id] = self._latency
+            if self._statistics is not None:
+                data.statistics[self.unique_id] = self._statistics
+            self.async_on_remove(self._async_unregister)
+
+        for entity_id in {*self.source_entity_ids}:
+            self._async_track_source(entity_id)
+        self.async_on_remove(self._async_untrack_sources)
+
+        if self.hass.state is CoreState.running:
+            async_evaluate_sensors(self.hass, [self], write=False)
+        else:
+            # Sources are often not loaded yet, evaluate once started
+            data.pending_evaluation.add(self)
+            self.async_on_remove(lambda: data.pending_evaluation.discard(self))
+
+        # The platform writes the state once added
+        self._async_update_attributes()
+        self._async_notify_changed()
+
+    @callback
+    def _async_unregister(self) -> None:
+        """Stop reporting the latency histogram and statistics of the sensor."""
+        data = async_get_data(self.hass)
+        for registered, own in (
+            (data.latency, self._latency),
+            (data.statistics, self._statistics),
+        ):
+            if (
+                own is not None
+                and self.unique_id is not None
+                and registered.get(self.unique_id) is own
+            ):
+                del registered[self.unique_id]
+
+    @callback
+    def _async_track_source(self, entity_id: str) -> None:
+        """Track the state changes of a source in each role it has."""
+        dispatcher = async_get_data(self.hass).dispatcher
+        unsubs = self._source_unsubs.setdefault(entity_id, [])
+        if entity_id in self._wasp_sources.states:
+            unsubs.append(
+                dispatcher.async_track(entity_id, self._wasp_debouncer.async_handle)
             )
-        )
-        self.async_on_remove(
-            async_track_state_change_event(
-                self.hass,
-                self._box_entity_id,
-                self._async_box_state_listener,
+        if entity_id in self._box_sources.states:
+            unsubs.append(
+                dispatcher.async_track(entity_id, self._box_debouncer.async_handle)
             )
-        )
 
-        registry = er.async_get(self.hass)
-        wasp_entry = registry.async_get(self._wasp_entity_id)
-        box_entry = registry.async_get(self._box_entity_id)
+    @callback
+    def _async_untrack_source(self, entity_id: str) -> None:
+        """Stop tracking the state changes of a source."""
+        for unsub in self._source_unsubs.pop(entity_id, ()):
+            unsub()
+        self._wasp_debouncer.async_cancel(entity_id)
+        self._box_debouncer.async_cancel(entity_id)
 
-        if not wasp_entry:
-            LOGGER.warning(
-                "Unable to find entity %s",
-                self._wasp_entity_id,
-            )
-        if not box_entry:
+    @callback
+    def _async_untrack_sources(self) -> None:
+        """Stop tracking the state changes of all sources."""
+        for entity_id in list(self._source_unsubs):
+            self._async_untrack_source(entity_id)
+
+    @callback
+    def async_rename_source(self, old_entity_id: str, new_entity_id: str) -> None:
+        """Move a source to its new entity id, keeping the state and timers."""
+        self._async_untrack_source(old_entity_id)
+        self._async_untrack_source(new_entity_id)
+        for group in (self._wasp_sources, self._box_sources):
+            if old_entity_id in group.states:
+                group.rename(old_entity_id, new_entity_id)
+        self._wasp_entity_ids = list(self._wasp_sources.states)
+        self._box_entity_ids = list(self._box_sources.states)
+        self._async_track_source(new_entity_id)
+        LOGGER.debug("Source %s renamed to %s", old_entity_id, new_entity_id)
+
+    @property
+    def source_entity_ids(self) -> list[str]:
+        """Return the wasp and box entity ids."""
+        return [*self._wasp_entity_ids, *self._box_entity_ids]
+
+    @callback
+    def async_evaluate_sources(
+        self,
+        states: Mapping[str, State | None],
+        missing: Container[str],
+        *,
+        write: bool,
+    ) -> None:
+        """Seed the source groups and apply source changes since the last state."""
+        self._evaluated = True
+        missing_sources = [
+            entity_id for entity_id in self.source_entity_ids if entity_id in missing
+        ]
+        for entity_id in missing_sources:
             LOGGER.warning(
                 "Unable to find entity %s",
-                self._box_entity_id,
+                entity_id,
             )
+        if missing_sources:
+            return
 
-        if wasp_entry and box_entry:
-            # Replay current state of wasp entitiy
-            wasp_state = self.hass.states.get(self._wasp_entity_id)
-            wasp_state_event: Event[EventStateChangedData] = Event(
-                "",
-                {
-                    "entity_id": self._wasp_entity_id,
-                    "new_state": wasp_state,
-                    "old_state": None,
-                },
+        for group in (self._wasp_sources, self._box_sources):
+            for entity_id in group.states:
+                state = states[entity_id]
+                group.update(entity_id, state.state if state else None)
+        self._awaiting_first_wasp_state = False
+        self._awaiting_first_box_state = False
+
+        # Sources may have changed while the sensor was not running
+        rules = self._rules
+        if self._wasp_sources.state != rules.wasp_state:
+            self._async_apply_command(
+                rules.wasp_changed(self._wasp_sources.state), write=False
+            )
+        if self._box_entity_ids and self._box_sources.state != rules.box_state:
+            self._async_apply_command(
+                rules.box_changed(self._box_sources.state, rules.box_state),
+                write=False,
             )
-            self._async_wasp_state_listener(wasp_state_event)
-
-            # Replay current state of box entitiy
-            box_state = self.hass.states.get(self._box_entity_id)
-            box_state_event: Event[EventStateChangedData] = Event(
-                "",
-                {
-                    "entity_id": self._box_entity_id,
-                    "new_state": box_state,
-                    "old_state": None,
-                },
+
+        if write:
+            self._async_write_state()
+
+    @callback
+    def _async_restore(self, restored: WaspInABoxExtraStoredData) -> None:
+        """Restore the occupancy, resolving expired deadlines and re-arming others."""
+        rules = self._rules
+        rules.state = restored.state
+        rules.wasp_state = restored.wasp_state
+        rules.box_state = restored.box_state
+        rules.motion_was_detected = restored.motion_was_detected
+        if self._adaptive is not None and restored.adaptive is not None:
+            try:
+                self._adaptive.restore(restored.adaptive)
+            except (KeyError, TypeError):
+                LOGGER.debug("Discarding invalid adaptive timing statistics")
+                self._adaptive = AdaptiveTiming()
+        if self._statistics is not None and restored.statistics is not None:
+            try:
+                self._statistics.restore(restored.statistics, time.time())
+            except (KeyError, TypeError):
+                LOGGER.debug("Discarding invalid occupancy statistics")
+
+        now = dt_util.utcnow().timestamp()
+        deadlines = [
+            (deadline, timer, expired)
+            for deadline, timer, expired in (
+                (
+                    restored.door_closed_delay_deadline,
+                    self._door_closed_delay_timer,
+                    rules.door_closed_delay_expired,
+                ),
+                (
+                    restored.door_open_timeout_deadline,
+                    self._door_open_timeout_timer,
+                    rules.door_open_timeout_expired,
+                ),
             )
-            self._async_box_state_listener(box_state_event)
+            if deadline is not None
+        ]
+        for deadline, timer, expired in sorted(deadlines, key=itemgetter(0)):
+            if deadline <= now:
+                LOGGER.debug("Timer expired while stopped, recalculating state")
+                expired()
+            else:
+                timer.async_schedule(deadline - now)
+
+    @callback
+    def async_update_options(self, room: Mapping[str, Any]) -> None:
+        """Apply the timing options of the room, moving running deadlines.
+
+        Running deadlines are moved by the difference between the old and new
+        durations.
+        """
+        delay = room[CONF_DOOR_CLOSED_DELAY]
+        timeout = room[CONF_DOOR_OPEN_TIMEOUT]
+        immediate_on = room[CONF_IMMEDIATE_ON]
+        coalesce_window = room.get(CONF_COALESCE_WINDOW, DEFAULT_COALESCE_WINDOW)
+        adaptive = room.get(CONF_ADAPTIVE, DEFAULT_ADAPTIVE)
+        wasp_settle_time = room.get(CONF_WASP_SETTLE_TIME, DEFAULT_SETTLE_TIME)
+        box_settle_time = room.get(CONF_BOX_SETTLE_TIME, DEFAULT_SETTLE_TIME)
+        old_durations = (self.door_closed_delay, self.door_open_timeout)
+        self._delay = delay
+        self._timeout = timeout
+        if not adaptive:
+            self._adaptive = None
+        elif self._adaptive is None:
+            self._adaptive = AdaptiveTiming()
+
+        for timer, old, new in (
+            (self._door_closed_delay_timer, old_durations[0], self.door_closed_delay),
+            (self._door_open_timeout_timer, old_durations[1], self.door_open_timeout),
+        ):
+            if (remaining := timer.remaining) is not None and new != old:
+                timer.async_schedule(max(remaining - old + new, 0))
+
+        rules = self._rules
+        immediate_on_changed = rules.immediate_on != immediate_on
+        rules.immediate_on = immediate_on
+        self._coalesce_window = coalesce_window or 0
+        # Changes already held settle at the time they were scheduled for
+        self._wasp_debouncer.settle_time = wasp_settle_time or 0
+        self._box_debouncer.settle_time = box_settle_time or 0
+        if (
+            immediate_on_changed
+            and self._evaluated
+            and not rules.boxless
+            # A running door closed delay recalculates once it expires
+            and self._door_closed_delay_timer.remaining is None
+        ):
+            rules.calculate()
+            self._async_log_state()
+            self._async_write_state()
+        self._async_notify_changed()
+        LOGGER.debug(
+            "Applied options: delay=%s, timeout=%s, immediate_on=%s, "
+            "coalesce_window=%s, adaptive=%s, wasp_settle_time=%s, "
+            "box_settle_time=%s",
+            delay,
+            timeout,
+            immediate_on,
+            coalesce_window,
+            adaptive,
+            wasp_settle_time,
+            box_settle_time,
+        )
+
+    @property
+    def door_closed_delay(self) -> float:
+        """Return the door closed delay, learned when adaptive timing is enabled."""
+        if self._adaptive is None:
+            return self._delay
+        return self._adaptive.door_closed_delay.value(self._delay)
+
+    @property
+    def door_open_timeout(self) -> float:
+        """Return the door open timeout, learned when adaptive timing is enabled."""
+        if self._adaptive is None:
+            return self._timeout
+        return self._adaptive.door_open_timeout.value(self._timeout)
 
     async def async_will_remove_from_hass(self) -> None:
         """Handle removal from hass."""
         # Cancel any pending timers to prevent callbacks after removal
-        if self._door_closed_delay_timer is not None:
-            self._door_closed_delay_timer()
-            self._door_closed_delay_timer = None
+        self._door_closed_delay_timer.async_cancel()
+        self._door_open_timeout_timer.async_cancel()
+        self._coalesce_timer.async_cancel()
+        self._wasp_debouncer.async_cancel()
+        self._box_debouncer.async_cancel()
+        self._snapshot_stream.async_removed(self.entity_id)
 
-        if self._door_open_timeout_timer is not None:
-            self._door_open_timeout_timer()
-            self._door_open_timeout_timer = None
+    @property
+    def snapshot(self) -> SensorSnapshot:
+        """Return the written occupancy and source states and timer deadlines."""
+        rules = self._rules
+        state, wasp_state, box_state = self._last_written or (
+            rules.state,
+            rules.wasp_state,
+            rules.box_state,
+        )
+        return SensorSnapshot(
+            state,
+            wasp_state,
+            box_state,
+            self._door_closed_delay_timer.when,
+            self._door_open_timeout_timer.when,
+        )
 
     @property
     def is_on(self) -> bool | None:
         """Return true if occupancy is detected."""
-        if self._state in [STATE_UNKNOWN, STATE_UNAVAILABLE]:
+        if self._rules.state in [STATE_UNKNOWN, STATE_UNAVAILABLE]:
             return None
         # Convert state to boolean - "on" means occupied
-        return self._state == STATE_ON
+        return self._rules.state == STATE_ON
+
+    @property
+    def extra_restore_state_data(self) -> WaspInABoxExtraStoredData:
+        """Return the occupancy and timer deadlines to restore."""
+        now = dt_util.utcnow().timestamp()
+        door_closed_delay = self._door_closed_delay_timer.remaining
+        door_open_timeout = self._door_open_timeout_timer.remaining
+        return WaspInABoxExtraStoredData(
+            self._rules.state,
+            self._rules.wasp_state,
+            self._rules.box_state,
+            self._rules.motion_was_detected,
+            None if door_closed_delay is None else now + door_closed_delay,
+            None if door_open_timeout is None else now + door_open_timeout,
+            None if self._adaptive is None else self._adaptive.as_dict(),
+            None if self._statistics is None else self._statistics.as_dict(),
+        )
+
+    @property
+    def skipped_writes(self) -> int:
+        """Return the number of state writes skipped as unchanged."""
+        return self._skipped_writes
 
     @property
-    def extra_state_attributes(self) -> dict[str, str]:
-        """Return state attributes."""
+    def suppressed_writes(self) -> int:
+        """Return the number of intermediate writes collapsed by coalescing."""
+        return self._suppressed_writes
+
+    @property
+    def bounces(self) -> int:
+        """Return the number of source changes absorbed by debouncing."""
+        return sum(self._wasp_debouncer.bounces.values()) + sum(
+            self._box_debouncer.bounces.values()
+        )
+
+    @property
+    def latency(self) -> LatencyHistogram:
+        """Return the histogram of the time from a source change to its write."""
+        return self._latency
+
+    @callback
+    def async_get_diagnostics(self) -> dict[str, Any]:
+        """Return diagnostics of the sensor."""
+        dispatcher = async_get_data(self.hass).dispatcher
         return {
-            ATTR_MOTION_SENSOR_STATE: self._wasp_state,
-            ATTR_DOOR_SENSOR_STATE: self._box_state,
+            "state": self._rules.state,
+            "wasp_state": self._rules.wasp_state,
+            "box_state": self._rules.box_state,
+            "motion_was_detected": self._rules.motion_was_detected,
+            "active_motion_sources": self._wasp_sources.on_count,
+            "open_doors": self._box_sources.on_count,
+            "door_closed_delay_remaining": self._door_closed_delay_timer.remaining,
+            "door_open_timeout_remaining": self._door_open_timeout_timer.remaining,
+            "skipped_writes": self._skipped_writes,
+            "suppressed_writes": self._suppressed_writes,
+            "filtered_events": {
+                entity_id: dispatcher.filtered_events(entity_id)
+                for entity_id in self.source_entity_ids
+            },
+            "bounces": {
+                entity_id: self._wasp_debouncer.bounces.get(entity_id, 0)
+                + self._box_debouncer.bounces.get(entity_id, 0)
+                for entity_id in self.source_entity_ids
+            },
+            "latency": self._latency.as_dict(),
+            "statistics": None
+            if self._statistics is None
+            else self._statistics.as_dict(),
+            "adaptive": None
+            if self._adaptive is None
+            else {
+                name: {
+                    "value": duration,
+                    "samples": learned.samples,
+                    "quantile": learned.quantile.value,
+                    "average": learned.average,
+                }
+                for name, duration, learned in (
+                    (
+                        "door_closed_delay",
+                        self.door_closed_delay,
+                        self._adaptive.door_closed_delay,
+                    ),
+                    (
+                        "door_open_timeout",
+                        self.door_open_timeout,
+                        self._adaptive.door_open_timeout,
+                    ),
+                )
+            },
         }
 
     @callback
     def _async_wasp_state_listener(self, event: Event[EventStateChangedData]) -> None:
         """Handle the wasp sensor state changes."""
+        entity_id = event.data["entity_id"]
         new_state = event.data["new_state"]
         old_state = event.data.get("old_state")
 
+        known_state = self._wasp_sources.states[entity_id]
+        wasp_state = self._wasp_sources.update(
+            entity_id, new_state.state if new_state else None
+        )
+
+        if not self._evaluated:
+            return
+
         if self._awaiting_first_wasp_state:
             self._awaiting_first_wasp_state = False
             return
 
-        LOGGER.debug("Wasp state changed from %s to %s", old_state, new_state)
-
-        if (
-            new_state is None
-            or new_state.state is None
-            or new_state.state
-            in [
-                STATE_UNKNOWN,
-                STATE_UNAVAILABLE,
-            ]
-        ):
-            self._wasp_state = STATE_UNKNOWN
-        else:
-            self._wasp_state = new_state.state
+        if _is_reappearance(old_state, new_state, known_state):
+            return
 
-        # Cancel any existing timeout timer
-        if self._door_open_timeout_timer is not None:
-            self._door_open_timeout_timer()
-            self._door_open_timeout_timer = None
+        LOGGER.debug("Wasp state changed from %s to %s", old_state, new_state)
 
-        if self._wasp_state == STATE_OFF and (
-            self._box_state in [STATE_ON, STATE_UNKNOWN]
-        ):
-            LOGGER.debug(
-                "Motion unoccupied and door open, waiting %s seconds before recalculating",
-                self._timeout,
-            )
-            self._door_open_timeout_timer = async_call_later(
-                self.hass, self._timeout, self._async_door_open_timeout_callback
+        if self._adaptive is not None and wasp_state != self._rules.wasp_state:
+            self._adaptive.wasp_changed(
+                self._clock(), wasp_state, self._rules.box_state
             )
 
-        self.async_calculate_state()
+        self._async_apply_source_command(event, self._rules.wasp_changed(wasp_state))
 
     @callback
     def _async_box_state_listener(self, event: Event[EventStateChangedData]) -> None:
         """Handle the box sensor state changes."""
+        entity_id = event.data["entity_id"]
         new_state = event.data["new_state"]
         old_state = event.data.get("old_state")
 
+        known_state = self._box_sources.states[entity_id]
+        old_box_state = self._box_sources.state
+        box_state = self._box_sources.update(
+            entity_id, new_state.state if new_state else None
+        )
+
+        if not self._evaluated:
+            return
+
         if self._awaiting_first_box_state:
             self._awaiting_first_box_state = False
             return
 
-        LOGGER.debug("Box state changed from %s to %s", old_state, new_state)
+        if _is_reappearance(old_state, new_state, known_state):
+            return
 
-        if (
-            new_state is None
-            or new_state.state is None
-            or new_state.state
-            in [
-                STATE_UNKNOWN,
-                STATE_UNAVAILABLE,
-            ]
-        ):
-            self._box_state = STATE_UNKNOWN
-        else:
-            # Check if door just closed (transition from open to closed)
-            door_just_closed = (
-                old_state is not None
-                and old_state.state == STATE_ON
-                and new_state.state == STATE_OFF
-            )
+        LOGGER.debug("Box state changed from %s to %s", old_state, new_state)
 
-            self._box_state = new_state.state
+        if self._adaptive is not None and box_state != old_box_state:
+            self._adaptive.box_changed(self._clock(), box_state, self._rules.wasp_state)
 
-            if door_just_closed:
-                # Cancel any existing timer
-                if self._door_closed_delay_timer is not None:
-                    self._door_closed_delay_timer()
-                    self._door_closed_delay_timer = None
+        self._async_apply_source_command(
+            event, self._rules.box_changed(box_state, old_box_state)
+        )
 
-                # Set a delay before recalculating state
-                LOGGER.debug(
-                    "Door closed, waiting %s seconds before recalculating", self._delay
-                )
-                self._door_closed_delay_timer = async_call_later(
-                    self.hass, self._delay, self._async_door_closed_delay_callback
-                )
-                return
+    @callback
+    def _async_apply_source_command(
+        self, event: Event[EventStateChangedData], command: TimerCommand
+    ) -> None:
+        """Apply the transition of a source change, timing the write it causes."""
+        self._source_fired = event.time_fired_timestamp
+        try:
+            self._async_apply_command(command)
+        finally:
+            self._source_fired = None
 
-        # Cancel any pending timer if door opens or state becomes unknown
-        if self._door_closed_delay_timer is not None:
-            self._door_closed_delay_timer()
-            self._door_closed_delay_timer = None
+    @callback
+    def _async_apply_command(
+        self, command: TimerCommand, *, write: bool = True
+    ) -> None:
+        """Apply the timer changes of a transition and write the state."""
+        if command & TimerCommand.CANCEL_DOOR_CLOSED_DELAY:
+            self._door_closed_delay_timer.async_cancel()
 
-        # Cancel any existing timeout timer
-        if self._door_open_timeout_timer is not None:
-            self._door_open_timeout_timer()
-            self._door_open_timeout_timer = None
+        if command & TimerCommand.CANCEL_DOOR_OPEN_TIMEOUT:
+            self._door_open_timeout_timer.async_cancel()
 
-        if self._wasp_state == STATE_OFF and self._box_state == STATE_ON:
+        if command & TimerCommand.START_DOOR_OPEN_TIMEOUT:
             LOGGER.debug(
                 "Motion unoccupied and door open, waiting %s seconds before recalculating",
-                self._timeout,
+                timeout := self.door_open_timeout,
             )
-            self._door_open_timeout_timer = async_call_later(
-                self.hass, self._timeout, self._async_door_open_timeout_callback
+            self._door_open_timeout_timer.async_schedule(timeout)
+
+        if command & TimerCommand.START_DOOR_CLOSED_DELAY:
+            # Set a delay before recalculating state, moving any existing one
+            LOGGER.debug(
+                "Door closed, waiting %s seconds before recalculating",
+                delay := self.door_closed_delay,
             )
+            self._door_closed_delay_timer.async_schedule(delay)
+            self._async_notify_changed()
+            return
 
-        self.async_calculate_state()
+        self._async_log_state()
+        if write:
+            self._async_write_state()
+        self._async_notify_changed()
 
     @callback
-    def _async_door_closed_delay_callback(self, _now: datetime) -> None:
+    def _async_door_closed_delay_callback(self) -> None:
         """Handle the delay timer callback."""
-        self._door_closed_delay_timer = None
         LOGGER.debug("Door closed delay expired, recalculating state")
-        self._motion_was_detected = False
-        self.async_calculate_state()
+        self._rules.door_closed_delay_expired()
+        self._async_log_state()
+        self._async_write_state()
+        self._async_notify_changed()
 
     @callback
-    def _async_door_open_timeout_callback(self, _now: datetime) -> None:
+    def _async_door_open_timeout_callback(self) -> None:
         """Handle the timeout timer callback."""
-        self._door_open_timeout_timer = None
         LOGGER.debug("Door open timeout expired, setting state to off")
-        self._wasp_state = STATE_OFF
-        self._motion_was_detected = False
-
-        self._state = STATE_OFF
-        self.async_write_ha_state()
+        self._rules.door_open_timeout_expired()
+        self._async_write_state()
+        self._async_notify_changed()
 
     @callback
-    def async_calculate_state(self) -> None:
-        """Calculate the state based on wasp and box states."""
+    def _async_log_state(self) -> None:
+        """Log the calculated state."""
         LOGGER.debug(
-            "Calculating state: wasp_state=%s, box_state=%s, motion_was_detected=%s",
-            self._wasp_state,
-            self._box_state,
-            self._motion_was_detected,
+            "Calculated state %s: wasp_state=%s, box_state=%s, motion_was_detected=%s",
+            self._rules.state,
+            self._rules.wasp_state,
+            self._rules.box_state,
+            self._rules.motion_was_detected,
         )
 
-        if self._wasp_state == STATE_UNKNOWN:
-            self._state = STATE_UNKNOWN
-            self.async_write_ha_state()
+    @callback
+    def _async_write_state(self) -> None:
+        """Write the state if it or one of the exposed attributes changed.
+
+        With a coalescing window, the first change is written at once and
+        opens the window. Changes inside the window are deferred and the final
+        value is written when it closes, except immediate on transitions.
+        """
+        rules = self._rules
+        written = (rules.state, rules.wasp_state, rules.box_state)
+        if self._is_written(written):
+            self._skipped_writes += 1
+            if self._write_deferred:
+                # The deferred change was reverted before the window closed
+                self._write_deferred = False
+                self._suppressed_writes += 1
             return
 
-        # Room is occupied when door is closed (box 'off') and motion detected (wasp 'on')
-        door_closed = (
-            False if self._box_state == STATE_UNKNOWN else self._box_state == STATE_OFF
-        )
-        motion_detected_now = self._wasp_state == STATE_ON
-        motion_detected = motion_detected_now or self._motion_was_detected
+        if self._coalesce_timer.pending:
+            immediate = (
+                rules.immediate_on
+                and rules.state == STATE_ON
+                and (self._last_written is None or self._last_written[0] != STATE_ON)
+            )
+            if not immediate:
+                if self._write_deferred:
+                    self._suppressed_writes += 1
+                self._write_deferred = True
+                return
 
-        if door_closed and motion_detected:
-            self._state = STATE_ON
-        else:
-            self._state = STATE_OFF
+            if self._write_deferred:
+                self._write_deferred = False
+                self._suppressed_writes += 1
 
-        if not door_closed and self._immediate_on:
-            self._state = STATE_ON
+        self._async_write()
 
-        if motion_detected_now and self._immediate_on:
-            self._state = STATE_ON
+    def _is_written(self, written: tuple[str, str, str]) -> bool:
+        """Return True if the state and exposed attributes are already written."""
+        return written == self._last_written
 
-        self._motion_was_detected = motion_detected
+    @callback
+    def _async_coalesce_window_callback(self) -> None:
+        """Write the final value deferred during the coalescing window."""
+        if self._write_deferred:
+            self._write_deferred = False
+            self._async_write()
 
+    @callback
+    def _async_write(self) -> None:
+        """Write the state and open the coalescing window."""
+        if self._coalesce_window:
+            self._coalesce_timer.async_schedule(self._coalesce_window)
+
+        if self._source_fired is not None:
+            self._latency.record(time.time() - self._source_fired)
+        self._async_update_attributes()
         self.async_write_ha_state()
+        self._async_notify_changed()
+
+    @callback
+    def _async_notify_changed(self) -> None:
+        """Report a possible change of the snapshot to subscribers."""
+        self._snapshot_stream.async_changed(self)
+
+    @callback
+    def _async_update_attributes(self) -> None:
+        """Update the exposed attributes, remembering what is written."""
+        rules = self._rules
+        last_written, self._last_written = (
+            self._last_written,
+            (rules.state, rules.wasp_state, rules.box_state),
+        )
+        if self._statistics is not None and (
+            last_written is None or last_written[0] != rules.state
+        ):
+            self._statistics.transition(time.time(), rules.state == STATE_ON)
+            if self.unique_id is not None:
+                async_dispatcher_send(
+                    self.hass, f"{SIGNAL_STATISTICS_UPDATED}_{self.unique_id}"
+                )
+        self._attr_extra_state_attributes = {
+            ATTR_MOTION_SENSOR_STATE: rules.wasp_state,
+            ATTR_DOOR_SENSOR_STATE: rules.box_state,
+        }
 
     async def async_reset(self) -> None:
         """Reset the occupancy sensor to off."""
 
         # Cancel any pending timers
-        if self._door_closed_delay_timer is not None:
-            self._door_closed_delay_timer()
-            self._door_closed_delay_timer = None
-
-        if self._door_open_timeout_timer is not None:
-            self._door_open_timeout_timer()
-            self._door_open_timeout_timer = None
+        self._door_closed_delay_timer.async_cancel()
+        self._door_open_timeout_timer.async_cancel()
+        self._coalesce_timer.async_cancel()
+        self._write_deferred = False
 
         # Reset internal state
-        self._motion_was_detected = False
-        self._state = STATE_OFF
-        self.async_write_ha_state()
+        self._rules.reset()
+        self._async_write_state()
+        self._async_notify_changed()
+
+
+class WaspInABoxRecorderFriendlySensor(WaspInABoxSensor):
+    """A wasp_in_a_box sensor written only when the occupancy changes.
+
+    The recorder stores a row for every write, source changes alone would
+    duplicate the source states it already stores. The source state
+    attributes are not recorded and are as of the last occupancy change,
+    the snapshot has the live source states.
+    """
+
+    _unrecorded_attributes = frozenset(
+        {ATTR_MOTION_SENSOR_STATE, ATTR_DOOR_SENSOR_STATE}
+    )
+
+    def _is_written(self, written: tuple[str, str, str]) -> bool:
+        """Return True if the state is already written."""
+        return self._last_written is not None and written[0] == self._last_written[0]
+
+    @property
+    def snapshot(self) -> SensorSnapshot:
+        """Return the written occupancy, live source states and timer deadlines."""
+        return super().snapshot._replace(
+            wasp_state=self._rules.wasp_state, box_state=self._rules.box_state
+        )
@@ -9,46 +9,64 @@ import voluptuous as vol
 
 from homeassistant.components.binary_sensor import DOMAIN as BINARY_SENSOR_DOMAIN
 from homeassistant.components.input_boolean import DOMAIN as INPUT_BOOLEAN_DOMAIN
-from homeassistant.const import CONF_NAME
-from homeassistant.helpers import selector
+from homeassistant.config_entries import ConfigFlowResult
+from homeassistant.const import CONF_ID, CONF_NAME
+from homeassistant.helpers import entity_registry as er, selector
 from homeassistant.helpers.schema_config_entry_flow import (
+    SchemaCommonFlowHandler,
     SchemaConfigFlowHandler,
+    SchemaFlowError,
     SchemaFlowFormStep,
+    SchemaOptionsFlowHandler,
 )
+from homeassistant.helpers.typing import DiscoveryInfoType
 
 from .const import (
+    CONF_ADAPTIVE,
     CONF_BOX_ID,
+    CONF_BOX_SETTLE_TIME,
+    CONF_COALESCE_WINDOW,
     CONF_DOOR_CLOSED_DELAY,
     CONF_DOOR_OPEN_TIMEOUT,
     CONF_IMMEDIATE_ON,
+    CONF_LATENCY_SENSORS,
+    CONF_RECORDER_FRIENDLY,
+    CONF_ROOM,
+    CONF_ROOMS,
+    CONF_STATISTICS_RESET,
+    CONF_STATISTICS_SENSORS,
     CONF_WASP_ID,
+    CONF_WASP_SETTLE_TIME,
     DEFAULT_DOOR_CLOSED_DELAY,
     DEFAULT_IMMEDIATE_ON,
     DEFAULT_OPEN_DOOR_TIMEOUT,
+    DISCOVERY_UNIQUE_ID,
     DOMAIN,
 )
+from .discovery import DiscoveredRoom, async_discover_rooms
+from .models import get_rooms
 
 OPTIONS_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_WASP_ID): selector.EntitySelector(
             selector.EntitySelectorConfig(
                 domain=[BINARY_SENSOR_DOMAIN, INPUT_BOOLEAN_DOMAIN],
-                multiple=False,
+                multiple=True,
             ),
         ),
-        vol.Required(CONF_BOX_ID): selector.EntitySelector(
+        vol.Optional(CONF_BOX_ID, default=list): selector.EntitySelector(
             selector.EntitySelectorConfig(
                 domain=[BINARY_SENSOR_DOMAIN, INPUT_BOOLEAN_DOMAIN],
-                multiple=False,
+                multiple=True,
             ),
         ),
         vol.Required(
             CONF_DOOR_CLOSED_DELAY, default=DEFAULT_DOOR_CLOSED_DELAY
         ): selector.NumberSelector(
             selector.NumberSelectorConfig(
-                min=1,
+                min=0.001,
                 max=600,
-                step=1,
+                step=0.001,
                 mode=selector.NumberSelectorMode.BOX,
             ),
         ),
@@ -56,15 +74,44 @@ OPTIONS_SCHEMA = vol.Schema(
             CONF_DOOR_OPEN_TIMEOUT, default=DEFAULT_OPEN_DOOR_TIMEOUT
         ): selector.NumberSelector(
             selector.NumberSelectorConfig(
-                min=1,
+                min=0.001,
                 max=3600,
-                step=1,
+                step=0.001,
                 mode=selector.NumberSelectorMode.BOX,
             ),
         ),
         vol.Required(
             CONF_IMMEDIATE_ON, default=DEFAULT_IMMEDIATE_ON
         ): selector.BooleanSelector(),
+        vol.Optional(CONF_COALESCE_WINDOW): selector.NumberSelector(
+            selector.NumberSelectorConfig(
+                min=0,
+                max=10,
+                step=0.1,
+                mode=selector.NumberSelectorMode.BOX,
+            ),
+        ),
+        vol.Optional(CONF_WASP_SETTLE_TIME): selector.NumberSelector(
+            selector.NumberSelectorConfig(
+                min=0,
+                max=10,
+                step=0.001,
+                mode=selector.NumberSelectorMode.BOX,
+            ),
+        ),
+        vol.Optional(CONF_BOX_SETTLE_TIME): selector.NumberSelector(
+            selector.NumberSelectorConfig(
+                min=0,
+                max=10,
+                step=0.001,
+                mode=selector.NumberSelectorMode.BOX,
+            ),
+        ),
+        vol.Optional(CONF_ADAPTIVE): selector.BooleanSelector(),
+        vol.Optional(CONF_LATENCY_SENSORS): selector.BooleanSelector(),
+        vol.Optional(CONF_RECORDER_FRIENDLY): selector.BooleanSelector(),
+        vol.Optional(CONF_STATISTICS_SENSORS): selector.BooleanSelector(),
+        vol.Optional(CONF_STATISTICS_RESET): selector.TimeSelector(),
     }
 )
 
@@ -78,12 +125,125 @@ CONFIG_SCHEMA = vol.Schema(
     }
 ).extend(OPTIONS_SCHEMA.schema)
 
+
+async def validate_options(
+    handler: SchemaCommonFlowHandler, user_input: dict[str, Any]
+) -> dict[str, Any]:
+    """Validate the wasps of an entry do not include the entry itself.
+
+    Wasps may be the sensors of other entries, follow them down the hierarchy
+    and reject the options if this entry is reached.
+    """
+    if not isinstance(handler.parent_handler, SchemaOptionsFlowHandler):
+        # A new entry has no sensor any other entry can use yet
+        return user_input
+
+    hass = handler.parent_handler.hass
+    entry_id = handler.parent_handler.config_entry.entry_id
+    entity_registry = er.async_get(hass)
+    pending = list(user_input[CONF_WASP_ID])
+    seen: set[str] = set()
+    while pending:
+        entity_id = pending.pop()
+        if entity_id in seen:
+            continue
+        seen.add(entity_id)
+
+        entity_entry = entity_registry.async_get(entity_id)
+        if entity_entry is None or entity_entry.platform != DOMAIN:
+            continue
+        if entity_entry.config_entry_id == entry_id:
+            raise SchemaFlowError("wasp_cycle")
+        if entity_entry.config_entry_id and (
+            child := hass.config_entries.async_get_entry(entity_entry.config_entry_id)
+        ):
+            for room in get_rooms(child.options, child.title):
+                pending.extend(room[CONF_WASP_ID])
+
+    return user_input
+
+
 CONFIG_FLOW = {
     "user": SchemaFlowFormStep(CONFIG_SCHEMA),
 }
 
+
+async def get_options_schema(handler: SchemaCommonFlowHandler) -> vol.Schema:
+    """Return the options schema, multi-room entries first select a room."""
+    if CONF_ROOMS not in handler.options:
+        return OPTIONS_SCHEMA
+    return vol.Schema(
+        {
+            vol.Required(CONF_ROOM): selector.SelectSelector(
+                selector.SelectSelectorConfig(
+                    options=[
+                        selector.SelectOptionDict(
+                            value=room[CONF_ID], label=room[CONF_NAME]
+                        )
+                        for room in handler.options[CONF_ROOMS]
+                    ],
+                    mode=selector.SelectSelectorMode.LIST,
+                )
+            )
+        }
+    )
+
+
+async def validate_init(
+    handler: SchemaCommonFlowHandler, user_input: dict[str, Any]
+) -> dict[str, Any]:
+    """Validate the options, or pass on the room selected to the room step."""
+    if CONF_ROOMS in handler.options:
+        return user_input
+    return await validate_options(handler, user_input)
+
+
+async def get_init_next_step(options: dict[str, Any]) -> str | None:
+    """Return the room step for multi-room entries."""
+    return "room" if CONF_ROOMS in options else None
+
+
+async def get_room_suggested_values(
+    handler: SchemaCommonFlowHandler,
+) -> dict[str, Any]:
+    """Return the options of the selected room."""
+    return next(
+        dict(room)
+        for room in handler.options[CONF_ROOMS]
+        if room[CONF_ID] == handler.options[CONF_ROOM]
+    )
+
+
+async def validate_room_options(
+    handler: SchemaCommonFlowHandler, user_input: dict[str, Any]
+) -> dict[str, Any]:
+    """Validate the options of the selected room and replace them in the rooms.
+
+    The id and name of the room are kept, the options left empty are removed.
+    """
+    user_input = await validate_options(handler, user_input)
+    room_id = handler.options.pop(CONF_ROOM)
+    return {
+        CONF_ROOMS: [
+            {CONF_ID: room[CONF_ID], CONF_NAME: room[CONF_NAME], **user_input}
+            if room[CONF_ID] == room_id
+            else room
+            for room in handler.options[CONF_ROOMS]
+        ]
+    }
+
+
 OPTIONS_FLOW = {
-    "init": SchemaFlowFormStep(OPTIONS_SCHEMA),
+    "init": SchemaFlowFormStep(
+        get_options_schema,
+        validate_user_input=validate_init,
+        next_step=get_init_next_step,
+    ),
+    "room": SchemaFlowFormStep(
+        OPTIONS_SCHEMA,
+        validate_user_input=validate_room_options,
+        suggested_values=get_room_suggested_values,
+    ),
 }
 
 
@@ -93,9 +253,91 @@ class ConfigFlowHandler(SchemaConfigFlowHandler, domain=DOMAIN):
     config_flow = CONFIG_FLOW
     options_flow = OPTIONS_FLOW
 
-    VERSION = 1
+    VERSION = 2
     MINOR_VERSION = 1
 
+    _discovered_rooms: dict[str, DiscoveredRoom]
+
+    async def async_step_integration_discovery(
+        self, discovery_info: DiscoveryInfoType
+    ) -> ConfigFlowResult:
+        """Handle rooms discovered from the area, device and entity registries.
+
+        Rooms already configured are not discovered, the proposal is keyed by
+        the areas left so areas added later are proposed again.
+        """
+        self._discovered_rooms = {
+            room.area_id: room for room in async_discover_rooms(self.hass)
+        }
+        if not self._discovered_rooms:
+            return self.async_abort(reason="no_rooms")
+
+        await self.async_set_unique_id(
+            f"{DISCOVERY_UNIQUE_ID}_{','.join(sorted(self._discovered_rooms))}"
+        )
+        self._abort_if_unique_id_configured()
+        return await self.async_step_discovery_confirm()
+
+    async def async_step_ignore(self, user_input: dict[str, Any]) -> ConfigFlowResult:
+        """Ignore the discovered rooms.
+
+        The schema handler sets the title of the entries it creates, the ignore
+        entry is created as a plain config flow would.
+        """
+        await self.async_set_unique_id(user_input["unique_id"], raise_on_progress=False)
+        return super(SchemaConfigFlowHandler, self).async_create_entry(
+            title=user_input["title"], data={}
+        )
+
+    async def async_step_discovery_confirm(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Confirm which discovered rooms to create, as one multi-room entry."""
+        if user_input is not None:
+            if not user_input[CONF_ROOMS]:
+                return self.async_abort(reason="no_rooms")
+            return self.async_create_entry(
+                data={
+                    CONF_NAME: self.hass.config.location_name,
+                    CONF_ROOMS: [
+                        {
+                            CONF_ID: room.area_id,
+                            CONF_NAME: room.name,
+                            CONF_WASP_ID: room.wasp_ids,
+                            CONF_BOX_ID: room.box_ids,
+                            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+                            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+                            CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+                        }
+                        for area_id in user_input[CONF_ROOMS]
+                        if (room := self._discovered_rooms.get(area_id))
+                    ],
+                }
+            )
+
+        return self.async_show_form(
+            step_id="discovery_confirm",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_ROOMS, default=list(self._discovered_rooms)
+                    ): selector.SelectSelector(
+                        selector.SelectSelectorConfig(
+                            options=[
+                                selector.SelectOptionDict(
+                                    value=room.area_id, label=room.name
+                                )
+                                for room in self._discovered_rooms.values()
+                            ],
+                            multiple=True,
+                            mode=selector.SelectSelectorMode.LIST,
+                        )
+                    )
+                }
+            ),
+            description_placeholders={"count": str(len(self._discovered_rooms))},
+        )
+
     def async_config_entry_title(self, options: Mapping[str, Any]) -> str:
         """Return config entry title."""
         return cast(str, options[CONF_NAME]) if CONF_NAME in options else ""
@@ -9,19 +9,38 @@ LOGGER: Logger = getLogger(__package__)
 MIN_HA_VERSION = "2026.1"
 
 DOMAIN = "wasp_in_a_box"
+DISCOVERY_UNIQUE_ID = "area_discovery"
 
-PLATFORMS = [Platform.BINARY_SENSOR]
+PLATFORMS = [Platform.BINARY_SENSOR, Platform.SENSOR]
 
 CONF_WASP_ID = "wasp_id"
 CONF_BOX_ID = "box_id"
 CONF_DOOR_CLOSED_DELAY = "door_closed_delay"
 CONF_DOOR_OPEN_TIMEOUT = "door_open_timeout"
 CONF_IMMEDIATE_ON = "immediate_on"
+CONF_COALESCE_WINDOW = "coalesce_window"
+CONF_ADAPTIVE = "adaptive"
+CONF_WASP_SETTLE_TIME = "wasp_settle_time"
+CONF_BOX_SETTLE_TIME = "box_settle_time"
+CONF_LATENCY_SENSORS = "latency_sensors"
+CONF_RECORDER_FRIENDLY = "recorder_friendly"
+CONF_STATISTICS_SENSORS = "statistics_sensors"
+CONF_STATISTICS_RESET = "statistics_reset"
+CONF_ROOMS = "rooms"
+CONF_ROOM = "room"
 
 DEFAULT_DOOR_CLOSED_DELAY = 30
 DEFAULT_OPEN_DOOR_TIMEOUT = 300
 DEFAULT_IMMEDIATE_ON = True
+DEFAULT_COALESCE_WINDOW = 0
+DEFAULT_ADAPTIVE = False
+DEFAULT_SETTLE_TIME = 0
+DEFAULT_LATENCY_SENSORS = False
+DEFAULT_RECORDER_FRIENDLY = False
+DEFAULT_STATISTICS_SENSORS = False
+DEFAULT_STATISTICS_RESET = "00:00:00"
 
 ATTR_MOTION_SENSOR_STATE = "motion_sensor_state"
 ATTR_DOOR_SENSOR_STATE = "door_sensor_state"
 SERVICE_RESET = "reset"
+SIGNAL_STATISTICS_UPDATED = f"{DOMAIN}_statistics_updated"
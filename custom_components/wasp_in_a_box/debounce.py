@@ -0,0 +1,109 @@
+"""Per source debouncing of state changes for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from functools import partial
+
+from homeassistant.core import Event, EventStateChangedData, State, callback
+
+from .dispatcher import StateListener
+from .scheduler import Deadline, DeadlineScheduler
+
+
+class SourceDebouncer:
+    """Pass on the state changes of sources once they have settled.
+
+    A change of a source is held for the settle time, each further change of
+    the source within it restarts the wait. Once the source has settled a
+    single change from the state before the first change to the last state is
+    passed on, or nothing if the source settled back where it started. Every
+    change that is not passed on is counted as a bounce of its source. With
+    no settle time changes are passed on at once.
+    """
+
+    def __init__(
+        self,
+        scheduler: DeadlineScheduler,
+        settle_time: float,
+        listener: StateListener,
+    ) -> None:
+        """Initialize the debouncer."""
+        self.settle_time = settle_time
+        self._scheduler = scheduler
+        self._listener = listener
+        self._pending: dict[str, tuple[State | None, Event[EventStateChangedData]]] = {}
+        self._deadlines: dict[str, Deadline] = {}
+        self._bounces: dict[str, int] = {}
+
+    @property
+    def bounces(self) -> dict[str, int]:
+        """Return the number of changes absorbed per source."""
+        return self._bounces
+
+    @callback
+    def async_handle(self, event: Event[EventStateChangedData]) -> None:
+        """Handle a state change of a source."""
+        entity_id = event.data["entity_id"]
+        pending = self._pending.get(entity_id)
+
+        # Removed sources are not waited for
+        if not self.settle_time or event.data["new_state"] is None:
+            if pending is not None:
+                self.async_cancel(entity_id)
+                event = _replace_old_state(event, pending[0])
+            self._listener(event)
+            return
+
+        if pending is None:
+            pending = (event.data["old_state"], event)
+        else:
+            self._bounces[entity_id] = self._bounces.get(entity_id, 0) + 1
+            pending = (pending[0], event)
+        self._pending[entity_id] = pending
+
+        if (deadline := self._deadlines.get(entity_id)) is None:
+            deadline = self._deadlines[entity_id] = self._scheduler.async_deadline(
+                partial(self._async_settled, entity_id)
+            )
+        deadline.async_schedule(self.settle_time)
+
+    @callback
+    def async_cancel(self, entity_id: str | None = None) -> None:
+        """Drop the held changes of a source, or of all sources."""
+        for source in [entity_id] if entity_id is not None else list(self._deadlines):
+            self._pending.pop(source, None)
+            if (deadline := self._deadlines.pop(source, None)) is not None:
+                deadline.async_cancel()
+
+    @callback
+    def _async_settled(self, entity_id: str) -> None:
+        """Pass on the settled change of a source."""
+        old_state, event = self._pending.pop(entity_id)
+        new_state = event.data["new_state"]
+        if (
+            old_state is not None
+            and new_state is not None
+            and old_state.state == new_state.state
+        ):
+            self._bounces[entity_id] = self._bounces.get(entity_id, 0) + 1
+            return
+        self._listener(_replace_old_state(event, old_state))
+
+
+def _replace_old_state(
+    event: Event[EventStateChangedData], old_state: State | None
+) -> Event[EventStateChangedData]:
+    """Return the state change event from another old state."""
+    if event.data["old_state"] is old_state:
+        return event
+    return Event(
+        event.event_type,
+        EventStateChangedData(
+            entity_id=event.data["entity_id"],
+            old_state=old_state,
+            new_state=event.data["new_state"],
+        ),
+        event.origin,
+        event.time_fired_timestamp,
+        event.context,
+    )
@@ -0,0 +1,33 @@
+"""Diagnostics support for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .latency import LatencyHistogram
+from .models import async_get_data
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    data = async_get_data(hass)
+
+    return {
+        "options": dict(entry.options),
+        "dispatcher": {"tracked_sources": data.dispatcher.source_count},
+        "scheduler": {
+            "pending_deadlines": data.scheduler.pending,
+            "queued_deadlines": data.scheduler.queued,
+        },
+        "latency": LatencyHistogram.merged(data.latency.values()).as_dict(),
+        "sensors": {
+            sensor.entity_id: sensor.async_get_diagnostics()
+            for sensor in data.sensors
+            if sensor.platform.config_entry is entry
+        },
+    }
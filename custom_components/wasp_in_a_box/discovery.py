@@ -0,0 +1,96 @@
+"""Discover candidate wasp_in_a_box rooms from the registries."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from homeassistant.components.binary_sensor import (
+    DOMAIN as BINARY_SENSOR_DOMAIN,
+    BinarySensorDeviceClass,
+)
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import (
+    area_registry as ar,
+    device_registry as dr,
+    entity_registry as er,
+)
+
+from .const import DOMAIN
+from .models import get_rooms, get_source_entity_ids
+
+WASP_DEVICE_CLASSES = {
+    BinarySensorDeviceClass.MOTION,
+    BinarySensorDeviceClass.OCCUPANCY,
+    BinarySensorDeviceClass.PRESENCE,
+}
+BOX_DEVICE_CLASSES = {
+    BinarySensorDeviceClass.DOOR,
+    BinarySensorDeviceClass.OPENING,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class DiscoveredRoom:
+    """An area with motion and door sensors."""
+
+    area_id: str
+    name: str
+    wasp_ids: list[str]
+    box_ids: list[str]
+
+
+@callback
+def async_discover_rooms(hass: HomeAssistant) -> list[DiscoveredRoom]:
+    """Return the areas with both motion and door sensors not in use yet.
+
+    The area index is built in a single pass over the entity registry, an
+    entity without an area of its own takes the area of its device.
+    """
+    entity_registry = er.async_get(hass)
+    device_registry = dr.async_get(hass)
+    area_registry = ar.async_get(hass)
+
+    configured = set(
+        get_source_entity_ids(
+            [
+                room
+                for entry in hass.config_entries.async_entries(DOMAIN)
+                for room in get_rooms(entry.options, entry.title)
+            ]
+        )
+    )
+
+    wasps: dict[str, list[str]] = {}
+    boxes: dict[str, list[str]] = {}
+    for entity_entry in entity_registry.entities.values():
+        if (
+            entity_entry.domain != BINARY_SENSOR_DOMAIN
+            or entity_entry.platform == DOMAIN
+            or entity_entry.disabled_by is not None
+            or entity_entry.entity_id in configured
+        ):
+            continue
+
+        device_class = entity_entry.device_class or entity_entry.original_device_class
+        if device_class in WASP_DEVICE_CLASSES:
+            index = wasps
+        elif device_class in BOX_DEVICE_CLASSES:
+            index = boxes
+        else:
+            continue
+
+        area_id = entity_entry.area_id
+        if area_id is None and entity_entry.device_id is not None:
+            device_entry = device_registry.async_get(entity_entry.device_id)
+            area_id = device_entry.area_id if device_entry else None
+        if area_id is not None:
+            index.setdefault(area_id, []).append(entity_entry.entity_id)
+
+    rooms = [
+        DiscoveredRoom(
+            area_id, area.name, sorted(wasps[area_id]), sorted(boxes[area_id])
+        )
+        for area_id in wasps.keys() & boxes.keys()
+        if (area := area_registry.async_get_area(area_id)) is not None
+    ]
+    return sorted(rooms, key=lambda room: room.name)
@@ -0,0 +1,114 @@
+"""Shared source state change dispatcher for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    Event,
+    EventStateChangedData,
+    HomeAssistant,
+    callback,
+)
+
+from .const import LOGGER
+
+type StateListener = Callable[[Event[EventStateChangedData]], None]
+
+
+class SourceDispatcher:
+    """Route source state changes to the sensors that use them.
+
+    A single state_changed listener is shared by every sensor in the domain,
+    events are routed through a source entity id to listeners index so the
+    cost of an event only depends on the sensors using that source. Events
+    that only change attributes are dropped by the filter and counted per
+    source.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the dispatcher."""
+        self._hass = hass
+        self._index: dict[str, tuple[StateListener, ...]] = {}
+        self._filtered: dict[str, int] = {}
+        self._unsub: CALLBACK_TYPE | None = None
+
+    @property
+    def source_count(self) -> int:
+        """Return the number of source entities being tracked."""
+        return len(self._index)
+
+    @callback
+    def filtered_events(self, entity_id: str) -> int:
+        """Return the number of attribute only events dropped for a source."""
+        return self._filtered.get(entity_id, 0)
+
+    @callback
+    def async_track(self, entity_id: str, listener: StateListener) -> CALLBACK_TYPE:
+        """Track state changes of a source entity, return a remove callback."""
+        self._index[entity_id] = (*self._index.get(entity_id, ()), listener)
+
+        if self._unsub is None:
+            self._unsub = self._hass.bus.async_listen(
+                EVENT_STATE_CHANGED,
+                self._async_dispatch,
+                event_filter=self._async_filter,
+            )
+
+        @callback
+        def _async_remove() -> None:
+            self._async_untrack(entity_id, listener)
+
+        return _async_remove
+
+    @callback
+    def _async_untrack(self, entity_id: str, listener: StateListener) -> None:
+        """Remove a listener from the index."""
+        listeners = list(self._index.get(entity_id, ()))
+        if listener not in listeners:
+            return
+
+        listeners.remove(listener)
+        if listeners:
+            self._index[entity_id] = tuple(listeners)
+        else:
+            del self._index[entity_id]
+            self._filtered.pop(entity_id, None)
+
+        if not self._index and self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_filter(self, event_data: EventStateChangedData) -> bool:
+        """Only dispatch state changes of tracked source entities."""
+        entity_id = event_data["entity_id"]
+        if entity_id not in self._index:
+            return False
+
+        new_state = event_data["new_state"]
+        old_state = event_data["old_state"]
+        if (
+            new_state is not None
+            and old_state is not None
+            and new_state.state == old_state.state
+        ):
+            self._filtered[entity_id] = self._filtered.get(entity_id, 0) + 1
+            return False
+        return True
+
+    @callback
+    def _async_dispatch(self, event: Event[EventStateChangedData]) -> None:
+        """Dispatch a state change to the listeners of the source entity."""
+        entity_id = event.data["entity_id"]
+        for listener in self._index.get(entity_id, ()):
+            try:
+                listener(event)
+            except Exception:  # noqa: BLE001
+                LOGGER.exception(
+                    "Error while dispatching state change of %s to %s",
+                    entity_id,
+                    listener,
+                )
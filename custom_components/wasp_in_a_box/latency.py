@@ -0,0 +1,103 @@
+"""Fixed bucket latency histograms for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Iterable
+from typing import Any, Self
+
+# Upper bounds of the buckets in seconds, a last bucket counts the rest
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """Count latencies in fixed buckets, in constant memory and time.
+
+    Percentiles are interpolated linearly within the bucket they fall in and
+    are never above the largest latency recorded.
+    """
+
+    __slots__ = ("count", "counts", "maximum", "total")
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    @classmethod
+    def merged(cls, histograms: Iterable[LatencyHistogram]) -> Self:
+        """Return a histogram of the latencies of all histograms."""
+        merged = cls()
+        for histogram in histograms:
+            merged.counts = [
+                a + b for a, b in zip(merged.counts, histogram.counts, strict=True)
+            ]
+            merged.count += histogram.count
+            merged.total += histogram.total
+            merged.maximum = max(merged.maximum, histogram.maximum)
+        return merged
+
+    def record(self, latency: float) -> None:
+        """Record a latency in seconds."""
+        latency = max(latency, 0.0)
+        self.counts[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def percentile(self, quantile: float) -> float | None:
+        """Return the latency at a quantile between 0 and 1, None if empty."""
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        cumulative = 0
+        lower = 0.0
+        for upper, count in zip(
+            (*LATENCY_BUCKETS, self.maximum), self.counts, strict=True
+        ):
+            if count and cumulative + count >= rank:
+                interpolated = lower + (upper - lower) * (rank - cumulative) / count
+                return min(interpolated, self.maximum)
+            cumulative += count
+            lower = upper
+        return self.maximum
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the percentiles and bucket counts, latencies in seconds."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.maximum if self.count else None,
+            **{
+                f"p{round(quantile * 100)}": self.percentile(quantile)
+                for quantile in LATENCY_QUANTILES
+            },
+            "buckets": {
+                **{
+                    str(bound): count
+                    for bound, count in zip(
+                        LATENCY_BUCKETS, self.counts[:-1], strict=True
+                    )
+                },
+                "+Inf": self.counts[-1],
+            },
+        }
@@ -0,0 +1,268 @@
+"""Runtime data models for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from collections.abc import Collection, Mapping
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.const import CONF_ID, CONF_NAME
+from homeassistant.core import HomeAssistant, State, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util.hass_dict import HassKey
+
+from .const import (
+    CONF_BOX_ID,
+    CONF_LATENCY_SENSORS,
+    CONF_RECORDER_FRIENDLY,
+    CONF_ROOMS,
+    CONF_STATISTICS_RESET,
+    CONF_STATISTICS_SENSORS,
+    CONF_WASP_ID,
+    DEFAULT_LATENCY_SENSORS,
+    DEFAULT_RECORDER_FRIENDLY,
+    DEFAULT_STATISTICS_RESET,
+    DEFAULT_STATISTICS_SENSORS,
+    DOMAIN,
+    LOGGER,
+)
+from .dispatcher import SourceDispatcher
+from .latency import LatencyHistogram
+from .registry import SourceRegistryWatcher
+from .scheduler import DeadlineScheduler
+from .snapshot import SnapshotStream
+from .stats import OccupancyStatistics
+
+if TYPE_CHECKING:
+    from .binary_sensor import WaspInABoxSensor
+
+
+@dataclass
+class WaspInABoxData:
+    """Runtime data shared by all wasp_in_a_box config entries."""
+
+    dispatcher: SourceDispatcher
+    registry_watcher: SourceRegistryWatcher
+    scheduler: DeadlineScheduler
+    snapshot_stream: SnapshotStream
+    sensors: set[WaspInABoxSensor] = field(default_factory=set)
+    pending_evaluation: set[WaspInABoxSensor] = field(default_factory=set)
+    applied_rooms: dict[str, list[Mapping[str, Any]]] = field(default_factory=dict)
+    latency: dict[str, LatencyHistogram] = field(default_factory=dict)
+    statistics: dict[str, OccupancyStatistics] = field(default_factory=dict)
+
+
+DATA_WASP_IN_A_BOX: HassKey[WaspInABoxData] = HassKey(DOMAIN)
+
+
+@callback
+def async_get_data(hass: HomeAssistant) -> WaspInABoxData:
+    """Return the shared runtime data, creating it on first use."""
+    if (data := hass.data.get(DATA_WASP_IN_A_BOX)) is None:
+        sensors: set[WaspInABoxSensor] = set()
+        data = hass.data[DATA_WASP_IN_A_BOX] = WaspInABoxData(
+            dispatcher=SourceDispatcher(hass),
+            registry_watcher=SourceRegistryWatcher(
+                hass,
+                partial(async_rename_source, hass),
+                partial(async_remove_sources, hass),
+            ),
+            scheduler=DeadlineScheduler(hass),
+            snapshot_stream=SnapshotStream(hass, sensors),
+            sensors=sensors,
+        )
+    return data
+
+
+def get_rooms(options: Mapping[str, Any], title: str) -> list[Mapping[str, Any]]:
+    """Return the room options of a config entry.
+
+    A multi-room entry lists its rooms under CONF_ROOMS, each with an id and a
+    name. Any other entry is a single room named after the entry.
+    """
+    if CONF_ROOMS in options:
+        rooms: list[Mapping[str, Any]] = options[CONF_ROOMS]
+        return rooms
+    return [{**options, CONF_NAME: title}]
+
+
+def get_room_unique_id(entry_id: str, room: Mapping[str, Any]) -> str:
+    """Return the unique id of the sensor of a room."""
+    if CONF_ID in room:
+        return f"{entry_id}_{room[CONF_ID]}"
+    return entry_id
+
+
+def get_room_sources(
+    rooms: list[Mapping[str, Any]],
+) -> list[tuple[str | None, str, list[str], list[str], bool, bool, str | None]]:
+    """Return what identifies the entities of the rooms and their sources.
+
+    Options outside of this can be applied to the running sensors.
+    """
+    return [
+        (
+            room.get(CONF_ID),
+            room[CONF_NAME],
+            room[CONF_WASP_ID],
+            room.get(CONF_BOX_ID, []),
+            room.get(CONF_LATENCY_SENSORS, DEFAULT_LATENCY_SENSORS),
+            room.get(CONF_RECORDER_FRIENDLY, DEFAULT_RECORDER_FRIENDLY),
+            get_room_statistics_reset(room),
+        )
+        for room in rooms
+    ]
+
+
+def get_room_statistics_reset(room: Mapping[str, Any]) -> str | None:
+    """Return the reset time of the statistics of a room, None if disabled."""
+    if not room.get(CONF_STATISTICS_SENSORS, DEFAULT_STATISTICS_SENSORS):
+        return None
+    reset: str = room.get(CONF_STATISTICS_RESET, DEFAULT_STATISTICS_RESET)
+    return reset
+
+
+def rename_source(
+    options: Mapping[str, Any], old_entity_id: str, new_entity_id: str
+) -> dict[str, Any]:
+    """Return the options of a config entry with a source renamed."""
+
+    def _rename(room: Mapping[str, Any]) -> dict[str, Any]:
+        return {
+            **room,
+            **{
+                conf: [
+                    new_entity_id if entity_id == old_entity_id else entity_id
+                    for entity_id in room[conf]
+                ]
+                for conf in (CONF_WASP_ID, CONF_BOX_ID)
+                if conf in room
+            },
+        }
+
+    if CONF_ROOMS in options:
+        return {**options, CONF_ROOMS: [_rename(room) for room in options[CONF_ROOMS]]}
+    return _rename(options)
+
+
+def get_source_entity_ids(rooms: list[Mapping[str, Any]]) -> list[str]:
+    """Return the wasp and box entity ids of all rooms."""
+    return [
+        entity_id
+        for room in rooms
+        for conf in (CONF_WASP_ID, CONF_BOX_ID)
+        for entity_id in room.get(conf, [])
+    ]
+
+
+@callback
+def async_evaluate_sensors(
+    hass: HomeAssistant, sensors: Collection[WaspInABoxSensor], *, write: bool
+) -> None:
+    """Evaluate sensors from the current states of their sources.
+
+    The registry entry and state of each source are looked up once, however
+    many sensors share it.
+    """
+    registry = er.async_get(hass)
+    states: dict[str, State | None] = {}
+    missing: set[str] = set()
+    for sensor in sensors:
+        for entity_id in sensor.source_entity_ids:
+            if entity_id in states:
+                continue
+            states[entity_id] = hass.states.get(entity_id)
+            if registry.async_get(entity_id) is None:
+                missing.add(entity_id)
+
+    for sensor in sensors:
+        sensor.async_evaluate_sources(states, missing, write=write)
+
+
+@callback
+def async_evaluate_pending_sensors(hass: HomeAssistant) -> None:
+    """Evaluate the sensors added while Home Assistant was starting."""
+    data = async_get_data(hass)
+    sensors, data.pending_evaluation = data.pending_evaluation, set()
+    LOGGER.debug("Evaluating %s sensors after startup", len(sensors))
+    async_evaluate_sensors(hass, sensors, write=True)
+
+
+@callback
+def async_rename_source(
+    hass: HomeAssistant,
+    entry_ids: Collection[str],
+    old_entity_id: str,
+    new_entity_id: str,
+) -> None:
+    """Move the sensors and config entries using a source to its new entity id.
+
+    The sensors keep their state and timers. The applied rooms are updated
+    before the options, so the update listener has nothing left to apply.
+    """
+    data = async_get_data(hass)
+    for sensor in data.sensors:
+        if old_entity_id in sensor.source_entity_ids:
+            sensor.async_rename_source(old_entity_id, new_entity_id)
+
+    for entry_id in entry_ids:
+        if (entry := hass.config_entries.async_get_entry(entry_id)) is None:
+            continue
+        options = rename_source(entry.options, old_entity_id, new_entity_id)
+        if entry_id in data.applied_rooms:
+            data.applied_rooms[entry_id] = get_rooms(options, entry.title)
+        hass.config_entries.async_update_entry(entry, options=options)
+
+
+@callback
+def async_remove_sources(
+    hass: HomeAssistant, entry_id: str, entity_ids: Collection[str]
+) -> None:
+    """Drop the rooms of a config entry using removed sources.
+
+    A multi-room entry keeps its other rooms and the entities of the dropped
+    rooms are removed from the entity registry. A single room entry, or one
+    left without rooms, is removed.
+    """
+    if (entry := hass.config_entries.async_get_entry(entry_id)) is None:
+        return
+
+    removed = set(entity_ids)
+    rooms = get_rooms(entry.options, entry.title)
+    kept = [room for room in rooms if removed.isdisjoint(get_source_entity_ids([room]))]
+    if CONF_ROOMS not in entry.options or not kept:
+        LOGGER.debug("Sources %s removed, removing entry %s", removed, entry_id)
+        hass.async_create_task(hass.config_entries.async_remove(entry_id))
+        return
+    if len(kept) == len(rooms):
+        return
+
+    # Entities of a room have its unique id, or it followed by a suffix
+    room_unique_ids = {
+        get_room_unique_id(entry_id, room): room in kept for room in rooms
+    }
+    registry = er.async_get(hass)
+    for entity_entry in er.async_entries_for_config_entry(registry, entry_id):
+        owner = max(
+            (
+                room_unique_id
+                for room_unique_id in room_unique_ids
+                if entity_entry.unique_id == room_unique_id
+                or entity_entry.unique_id.startswith(f"{room_unique_id}_")
+            ),
+            key=len,
+            default=None,
+        )
+        if owner is not None and not room_unique_ids[owner]:
+            registry.async_remove(entity_entry.entity_id)
+
+    LOGGER.debug(
+        "Sources %s removed, dropping %s rooms of entry %s",
+        removed,
+        len(rooms) - len(kept),
+        entry_id,
+    )
+    hass.config_entries.async_update_entry(
+        entry, options={**entry.options, CONF_ROOMS: kept}
+    )
@@ -0,0 +1,251 @@
+"""Occupancy rules for wasp_in_a_box.
+
+This module has no Home Assistant imports so the same rules can be used by
+the sensor and by offline tooling such as the parameter sweep simulator.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from enum import IntFlag
+from math import inf
+
+STATE_ON = "on"
+STATE_OFF = "off"
+STATE_UNKNOWN = "unknown"
+STATE_UNAVAILABLE = "unavailable"
+
+
+class TimerCommand(IntFlag):
+    """Timer changes requested by a transition, start also restarts."""
+
+    NONE = 0
+    CANCEL_DOOR_CLOSED_DELAY = 1
+    START_DOOR_CLOSED_DELAY = 2
+    CANCEL_DOOR_OPEN_TIMEOUT = 4
+    START_DOOR_OPEN_TIMEOUT = 8
+
+
+def normalize_state(state: str | None) -> str:
+    """Return a source state with unavailable mapped to unknown."""
+    if state is None or state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+        return STATE_UNKNOWN
+    return state
+
+
+@dataclass(slots=True)
+class SourceGroup:
+    """Aggregated state of the sources of a role, such as all doors of a room.
+
+    The group is on when any source is on, unknown when none is on and any is
+    unknown, otherwise off. Running counts keep each update constant time.
+    """
+
+    states: dict[str, str]
+    on_count: int = 0
+    unknown_count: int = 0
+
+    @classmethod
+    def from_entity_ids(cls, entity_ids: Iterable[str]) -> SourceGroup:
+        """Return a group with every source unknown."""
+        states = dict.fromkeys(entity_ids, STATE_UNKNOWN)
+        return cls(states, unknown_count=len(states))
+
+    @property
+    def state(self) -> str:
+        """Return the aggregated state."""
+        if self.on_count:
+            return STATE_ON
+        if self.unknown_count:
+            return STATE_UNKNOWN
+        return STATE_OFF
+
+    def update(self, entity_id: str, new_state: str | None) -> str:
+        """Update the state of a source and return the aggregated state."""
+        new_state = normalize_state(new_state)
+        old_state = self.states[entity_id]
+        if new_state != old_state:
+            self.states[entity_id] = new_state
+            self.on_count += (new_state == STATE_ON) - (old_state == STATE_ON)
+            self.unknown_count += (new_state == STATE_UNKNOWN) - (
+                old_state == STATE_UNKNOWN
+            )
+        return self.state
+
+    def rename(self, old_entity_id: str, new_entity_id: str) -> None:
+        """Move the state of a source to its new entity id."""
+        state = self.states.pop(old_entity_id)
+        if new_entity_id in self.states:
+            # Already a source, the renamed source is dropped
+            self.on_count -= state == STATE_ON
+            self.unknown_count -= state == STATE_UNKNOWN
+        else:
+            self.states[new_entity_id] = state
+
+
+@dataclass(slots=True)
+class OccupancyRules:
+    """Occupancy state machine of a single room.
+
+    Methods apply a source change or timer expiry and return the timer
+    changes the caller has to make, timing itself is left to the caller.
+    Without a box the state follows the wasps, such as a floor whose wasps
+    are the sensors of its rooms.
+
+    The parameter sweep in simulation.py has a vectorised copy of these
+    rules, any rule change has to be made there as well.
+    """
+
+    immediate_on: bool
+    boxless: bool = False
+    wasp_state: str = STATE_UNKNOWN
+    box_state: str = STATE_UNKNOWN
+    state: str = STATE_UNKNOWN
+    motion_was_detected: bool = False
+
+    def wasp_changed(self, new_state: str | None) -> TimerCommand:
+        """Handle the wasp sensor state changing."""
+        self.wasp_state = normalize_state(new_state)
+
+        if self.boxless:
+            self.state = self.wasp_state
+            return TimerCommand.NONE
+
+        command = TimerCommand.CANCEL_DOOR_OPEN_TIMEOUT
+        if self.wasp_state == STATE_OFF and self.box_state in (
+            STATE_ON,
+            STATE_UNKNOWN,
+        ):
+            command = TimerCommand.START_DOOR_OPEN_TIMEOUT
+
+        self.calculate()
+        return command
+
+    def box_changed(self, new_state: str | None, old_state: str | None) -> TimerCommand:
+        """Handle the box sensor state changing."""
+        new_state = normalize_state(new_state)
+
+        if new_state == STATE_UNKNOWN:
+            self.box_state = STATE_UNKNOWN
+        else:
+            # Check if door just closed (transition from open to closed)
+            door_just_closed = old_state == STATE_ON and new_state == STATE_OFF
+            self.box_state = new_state
+
+            if door_just_closed:
+                # Recalculate once the door closed delay expires
+                return TimerCommand.START_DOOR_CLOSED_DELAY
+
+        command = TimerCommand.CANCEL_DOOR_CLOSED_DELAY
+        if self.wasp_state == STATE_OFF and self.box_state == STATE_ON:
+            command |= TimerCommand.START_DOOR_OPEN_TIMEOUT
+        else:
+            command |= TimerCommand.CANCEL_DOOR_OPEN_TIMEOUT
+
+        self.calculate()
+        return command
+
+    def door_closed_delay_expired(self) -> None:
+        """Handle the door closed delay expiring."""
+        self.motion_was_detected = False
+        self.calculate()
+
+    def door_open_timeout_expired(self) -> None:
+        """Handle the door open timeout expiring."""
+        self.wasp_state = STATE_OFF
+        self.motion_was_detected = False
+        self.state = STATE_OFF
+
+    def reset(self) -> None:
+        """Reset the occupancy to off."""
+        self.motion_was_detected = False
+        self.state = STATE_OFF
+
+    def calculate(self) -> str:
+        """Calculate the state based on wasp and box states."""
+        if self.wasp_state == STATE_UNKNOWN:
+            self.state = STATE_UNKNOWN
+            return self.state
+
+        # Room is occupied when door is closed (box 'off') and motion detected (wasp 'on')
+        door_closed = self.box_state == STATE_OFF
+        motion_detected_now = self.wasp_state == STATE_ON
+        motion_detected = motion_detected_now or self.motion_was_detected
+
+        state = STATE_ON if door_closed and motion_detected else STATE_OFF
+
+        if not door_closed and self.immediate_on:
+            state = STATE_ON
+
+        if motion_detected_now and self.immediate_on:
+            state = STATE_ON
+
+        self.state = state
+        self.motion_was_detected = motion_detected
+        return state
+
+
+@dataclass
+class VirtualOccupancy:
+    """Drive the occupancy rules of a room with a virtual clock.
+
+    Source changes must be fed in time order, the timers expire on the
+    virtual clock and every change of the occupancy state is recorded.
+    """
+
+    door_closed_delay: float
+    door_open_timeout: float
+    immediate_on: bool
+    boxless: bool = False
+    rules: OccupancyRules = field(init=False)
+    transitions: list[tuple[float, str]] = field(default_factory=list)
+    _box_raw: str | None = field(default=None, init=False)
+    _door_closed_deadline: float = field(default=inf, init=False)
+    _door_open_deadline: float = field(default=inf, init=False)
+
+    def __post_init__(self) -> None:
+        """Create the rules."""
+        self.rules = OccupancyRules(self.immediate_on, boxless=self.boxless)
+
+    def advance(self, time: float) -> None:
+        """Expire the timers due up to and including time."""
+        while True:
+            deadline = min(self._door_closed_deadline, self._door_open_deadline)
+            if deadline > time:
+                return
+            if self._door_closed_deadline <= self._door_open_deadline:
+                self._door_closed_deadline = inf
+                self.rules.door_closed_delay_expired()
+            else:
+                self._door_open_deadline = inf
+                self.rules.door_open_timeout_expired()
+            self._record(deadline)
+
+    def wasp_changed(self, time: float, state: str | None) -> None:
+        """Feed a wasp state change."""
+        self.advance(time)
+        self._apply(time, self.rules.wasp_changed(state))
+
+    def box_changed(self, time: float, state: str | None) -> None:
+        """Feed a box state change."""
+        self.advance(time)
+        old_state, self._box_raw = self._box_raw, state
+        self._apply(time, self.rules.box_changed(state, old_state))
+
+    def _apply(self, time: float, command: TimerCommand) -> None:
+        """Apply the timer changes of a transition and record the state."""
+        if command & TimerCommand.CANCEL_DOOR_CLOSED_DELAY:
+            self._door_closed_deadline = inf
+        if command & TimerCommand.START_DOOR_CLOSED_DELAY:
+            self._door_closed_deadline = time + self.door_closed_delay
+        if command & TimerCommand.CANCEL_DOOR_OPEN_TIMEOUT:
+            self._door_open_deadline = inf
+        if command & TimerCommand.START_DOOR_OPEN_TIMEOUT:
+            self._door_open_deadline = time + self.door_open_timeout
+        self._record(time)
+
+    def _record(self, time: float) -> None:
+        """Record the state if it changed."""
+        if not self.transitions or self.transitions[-1][1] != self.rules.state:
+            self.transitions.append((time, self.rules.state))
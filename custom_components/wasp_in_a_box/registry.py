@@ -0,0 +1,148 @@
+"""Shared entity registry watcher for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Collection, Iterable
+
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+
+from .const import DOMAIN, LOGGER
+
+
+class SourceRegistryWatcher:
+    """Watch the entity registry for changes to source entities.
+
+    A single registry listener is shared by every config entry, source entity
+    ids are mapped to the entries using them. A renamed source is handed to the
+    rename callback at once, so listeners move before the source is removed and
+    added again under its new entity id. Removals arriving in the same loop
+    iteration are batched so the remove callback is called at most once per
+    affected entry, with all its removed sources. Sources that are sensors of
+    this integration, such as the rooms of a floor, are not removals of a
+    source the user set up, so a parent is kept with the removed child as an
+    unknown wasp.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        rename_callback: Callable[[Collection[str], str, str], None],
+        remove_callback: Callable[[str, Collection[str]], None],
+    ) -> None:
+        """Initialize the watcher."""
+        self._hass = hass
+        self._rename_callback = rename_callback
+        self._remove_callback = remove_callback
+        self._index: dict[str, set[str]] = {}
+        self._tracked: dict[str, set[str]] = {}
+        self._own: set[str] = set()
+        self._pending: dict[str, set[str]] = {}
+        self._flush_scheduled = False
+        self._unsub: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_track(self, entry_id: str, entity_ids: Iterable[str]) -> CALLBACK_TYPE:
+        """Track registry updates of source entities, return a remove callback."""
+        tracked = self._tracked[entry_id] = set(entity_ids)
+        registry = er.async_get(self._hass)
+        for entity_id in tracked:
+            self._index.setdefault(entity_id, set()).add(entry_id)
+            if (
+                entity_entry := registry.async_get(entity_id)
+            ) is not None and entity_entry.platform == DOMAIN:
+                self._own.add(entity_id)
+
+        if self._unsub is None:
+            self._unsub = self._hass.bus.async_listen(
+                er.EVENT_ENTITY_REGISTRY_UPDATED,
+                self._async_registry_updated,
+                event_filter=self._async_filter,
+            )
+
+        @callback
+        def _async_remove() -> None:
+            self._async_untrack(entry_id)
+
+        return _async_remove
+
+    @callback
+    def _async_untrack(self, entry_id: str) -> None:
+        """Remove an entry from the index."""
+        for entity_id in self._tracked.pop(entry_id, ()):
+            if (entry_ids := self._index.get(entity_id)) is None:
+                continue
+            entry_ids.discard(entry_id)
+            if not entry_ids:
+                del self._index[entity_id]
+                self._own.discard(entity_id)
+
+        if not self._index and self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_filter(self, event_data: er.EventEntityRegistryUpdatedData) -> bool:
+        """Only handle registry updates of tracked source entities."""
+        if event_data["entity_id"] in self._index:
+            return True
+        return (
+            event_data["action"] == "update"
+            and event_data.get("old_entity_id") in self._index
+        )
+
+    @callback
+    def _async_registry_updated(
+        self, event: Event[er.EventEntityRegistryUpdatedData]
+    ) -> None:
+        """Handle a renamed source or queue a removed one for its entries."""
+        data = event.data
+        if data["action"] == "update" and "entity_id" in data["changes"]:
+            self._async_rename(data["old_entity_id"], data["entity_id"])
+            return
+        if data["action"] != "remove":
+            return
+        if data["entity_id"] in self._own:
+            LOGGER.debug(
+                "Sensor %s removed, keeping the entries using it", data["entity_id"]
+            )
+            return
+
+        for entry_id in self._index.get(data["entity_id"], ()):
+            self._pending.setdefault(entry_id, set()).add(data["entity_id"])
+        if self._pending and not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._hass.loop.call_soon(self._async_flush)
+
+    @callback
+    def _async_rename(self, old_entity_id: str, new_entity_id: str) -> None:
+        """Move the entries tracking a source to its new entity id."""
+        if (entry_ids := self._index.pop(old_entity_id, None)) is None:
+            return
+
+        self._index.setdefault(new_entity_id, set()).update(entry_ids)
+        if old_entity_id in self._own:
+            self._own.discard(old_entity_id)
+            self._own.add(new_entity_id)
+        for entry_id in entry_ids:
+            tracked = self._tracked[entry_id]
+            tracked.discard(old_entity_id)
+            tracked.add(new_entity_id)
+
+        LOGGER.debug(
+            "Source entity %s renamed to %s, updating entries %s",
+            old_entity_id,
+            new_entity_id,
+            entry_ids,
+        )
+        self._rename_callback(entry_ids, old_entity_id, new_entity_id)
+
+    @callback
+    def _async_flush(self) -> None:
+        """Hand each queued entry its removed sources once."""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+
+        for entry_id, entity_ids in pending.items():
+            LOGGER.debug("Sources %s removed, updating entry %s", entity_ids, entry_id)
+            self._remove_callback(entry_id, entity_ids)
@@ -0,0 +1,190 @@
+"""Replay recorder history through the wasp_in_a_box occupancy rules.
+
+Run it with python -m custom_components.wasp_in_a_box.replay, see --help.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from homeassistant.const import CONF_NAME
+
+from .const import (
+    CONF_BOX_ID,
+    CONF_DOOR_CLOSED_DELAY,
+    CONF_DOOR_OPEN_TIMEOUT,
+    CONF_IMMEDIATE_ON,
+    CONF_WASP_ID,
+    DOMAIN,
+)
+from .models import get_rooms
+from .occupancy import SourceGroup, VirtualOccupancy
+
+DEFAULT_CHUNK_SIZE = 10000
+
+_STATES_QUERY = """
+SELECT states_meta.entity_id, states.state, states.last_updated_ts
+FROM states
+JOIN states_meta ON states.metadata_id = states_meta.metadata_id
+WHERE states_meta.entity_id IN ({placeholders})
+AND states.last_updated_ts >= ?
+AND states.last_updated_ts < ?
+ORDER BY states.last_updated_ts, states.state_id
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class RoomConfig:
+    """Options of a room to replay."""
+
+    name: str
+    wasp_ids: tuple[str, ...]
+    box_ids: tuple[str, ...]
+    door_closed_delay: float
+    door_open_timeout: float
+    immediate_on: bool
+
+
+def _entity_ids(value: str | list[str]) -> tuple[str, ...]:
+    """Return the source entity ids of a version 1 or 2 config entry option."""
+    return (value,) if isinstance(value, str) else tuple(value)
+
+
+def rooms_from_config_entries(path: Path) -> list[RoomConfig]:
+    """Return the rooms of the wasp_in_a_box entries in core.config_entries."""
+    storage = json.loads(path.read_text(encoding="utf-8"))
+    return [
+        RoomConfig(
+            name=room[CONF_NAME],
+            wasp_ids=_entity_ids(room[CONF_WASP_ID]),
+            box_ids=_entity_ids(room.get(CONF_BOX_ID, [])),
+            door_closed_delay=room[CONF_DOOR_CLOSED_DELAY],
+            door_open_timeout=room[CONF_DOOR_OPEN_TIMEOUT],
+            immediate_on=room[CONF_IMMEDIATE_ON],
+        )
+        for entry in storage["data"]["entries"]
+        if entry["domain"] == DOMAIN
+        for room in get_rooms(entry["options"], entry["title"])
+    ]
+
+
+def iter_source_states(
+    database: Path,
+    entity_ids: Sequence[str],
+    start: float = 0.0,
+    end: float = float("inf"),
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[tuple[str, str | None, float]]:
+    """Yield the time ordered states of the source entities in batches."""
+    connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        query = _STATES_QUERY.format(placeholders=", ".join("?" * len(entity_ids)))
+        cursor = connection.execute(query, (*entity_ids, start, end))
+        while rows := cursor.fetchmany(chunk_size):
+            yield from rows
+    finally:
+        connection.close()
+
+
+def replay_room(
+    database: Path,
+    room: RoomConfig,
+    start: float = 0.0,
+    end: float = float("inf"),
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> list[tuple[float, str]]:
+    """Return the occupancy transitions of a room.
+
+    Rows with the state the source already had, such as attribute only
+    updates, are skipped as the dispatcher filter drops them from the sensor.
+    """
+    occupancy = VirtualOccupancy(
+        room.door_closed_delay,
+        room.door_open_timeout,
+        room.immediate_on,
+        boxless=not room.box_ids,
+    )
+    wasp = SourceGroup.from_entity_ids(room.wasp_ids)
+    box = SourceGroup.from_entity_ids(room.box_ids)
+    previous: dict[str, str | None] = {}
+    last_time = start
+    for entity_id, state, time in iter_source_states(
+        database, (*room.wasp_ids, *room.box_ids), start, end, chunk_size
+    ):
+        last_time = time
+        if entity_id in previous and previous[entity_id] == state:
+            continue
+        previous[entity_id] = state
+        if entity_id in wasp.states:
+            occupancy.wasp_changed(time, wasp.update(entity_id, state))
+        if entity_id in box.states:
+            occupancy.box_changed(time, box.update(entity_id, state))
+
+    occupancy.advance(end if end != float("inf") else last_time)
+    return occupancy.transitions
+
+
+def _replay_room_task(
+    args: tuple[Path, RoomConfig, float, float, int],
+) -> list[tuple[float, str]]:
+    """Replay a room in a worker process."""
+    return replay_room(*args)
+
+
+def replay_rooms(  # noqa: PLR0913
+    database: Path,
+    rooms: Sequence[RoomConfig],
+    *,
+    start: float = 0.0,
+    end: float = float("inf"),
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int | None = None,
+) -> dict[str, list[tuple[float, str]]]:
+    """Return the occupancy transitions of each room, keyed by room name."""
+    tasks = [(database, room, start, end, chunk_size) for room in rooms]
+
+    if workers == 1:
+        results = [_replay_room_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_replay_room_task, tasks))
+
+    return {room.name: result for room, result in zip(rooms, results, strict=True)}
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Replay a recorder database and write the timelines as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database", type=Path, help="Recorder SQLite database")
+    parser.add_argument(
+        "--config-entries",
+        type=Path,
+        required=True,
+        help="Path to .storage/core.config_entries",
+    )
+    parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument("--start", type=float, default=0.0, help="Start timestamp")
+    parser.add_argument("--end", type=float, default=float("inf"), help="End timestamp")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    timelines = replay_rooms(
+        args.database,
+        rooms_from_config_entries(args.config_entries),
+        start=args.start,
+        end=args.end,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
+    args.output.write_text(json.dumps(timelines), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
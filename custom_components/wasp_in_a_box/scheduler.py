@@ -0,0 +1,172 @@
+"""Shared deadline scheduler for wasp_in_a_box timers."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from heapq import heappop, heappush
+from itertools import count
+from math import inf
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import LOGGER
+
+
+class Deadline:
+    """A deadline that can be moved or cancelled without new loop timers.
+
+    The queued attributes are managed by the scheduler and track the single
+    live heap entry of the deadline.
+    """
+
+    __slots__ = ("action", "queued_at", "queued_seq", "scheduler", "when")
+
+    def __init__(
+        self, scheduler: DeadlineScheduler, action: Callable[[], None]
+    ) -> None:
+        """Initialize the deadline."""
+        self.scheduler = scheduler
+        self.action = action
+        self.when: float | None = None
+        self.queued_at: float | None = None
+        self.queued_seq: int | None = None
+
+    @property
+    def pending(self) -> bool:
+        """Return True if the deadline is scheduled."""
+        return self.when is not None
+
+    @property
+    def remaining(self) -> float | None:
+        """Return the seconds until the deadline, None if not scheduled."""
+        if self.when is None:
+            return None
+        return max(self.when - self.scheduler.time(), 0.0)
+
+    @callback
+    def async_schedule(self, delay: float) -> None:
+        """Schedule the deadline delay seconds from now."""
+        self.scheduler.async_schedule(self, self.scheduler.time() + delay)
+
+    @callback
+    def async_schedule_at(self, when: float) -> None:
+        """Schedule the deadline at a loop time."""
+        self.scheduler.async_schedule(self, when)
+
+    @callback
+    def async_cancel(self) -> None:
+        """Cancel the deadline."""
+        self.scheduler.async_cancel(self)
+
+
+class DeadlineScheduler:
+    """Schedule the deadlines of all sensors on a single loop timer.
+
+    Deadlines are ordered by a heap and one loop.call_at wakes up for the
+    earliest of them. Moving a deadline later only updates the deadline, its
+    heap entry is re-queued lazily when it comes due, so a new heap entry or
+    loop timer is only needed when a deadline moves earlier.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the scheduler."""
+        self._loop = hass.loop
+        self._heap: list[tuple[float, int, Deadline]] = []
+        self._seq = count()
+        self._pending = 0
+        self._wakeup: asyncio.TimerHandle | None = None
+        self._wakeup_at = inf
+
+    @property
+    def pending(self) -> int:
+        """Return the number of scheduled deadlines."""
+        return self._pending
+
+    @property
+    def queued(self) -> int:
+        """Return the number of heap entries, including stale ones."""
+        return len(self._heap)
+
+    def time(self) -> float:
+        """Return the current loop time."""
+        return self._loop.time()
+
+    @callback
+    def async_deadline(self, action: Callable[[], None]) -> Deadline:
+        """Return a new deadline running action when it expires."""
+        return Deadline(self, action)
+
+    @callback
+    def async_schedule(self, deadline: Deadline, when: float) -> None:
+        """Schedule a deadline at a loop time."""
+        if deadline.when is None:
+            self._pending += 1
+        deadline.when = when
+
+        # The live heap entry will come due first and re-queue itself
+        if deadline.queued_at is not None and deadline.queued_at <= when:
+            return
+
+        self._queue(deadline, when)
+        if when < self._wakeup_at:
+            self._arm(when)
+
+    @callback
+    def async_cancel(self, deadline: Deadline) -> None:
+        """Cancel a deadline, its heap entry is discarded when it comes due."""
+        if deadline.when is None:
+            return
+        deadline.when = None
+        self._pending -= 1
+
+    def _queue(self, deadline: Deadline, when: float) -> None:
+        """Push the live heap entry of a deadline."""
+        seq = next(self._seq)
+        deadline.queued_at = when
+        deadline.queued_seq = seq
+        heappush(self._heap, (when, seq, deadline))
+
+    def _arm(self, when: float) -> None:
+        """Arm the loop timer for the earliest heap entry."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup_at = when
+        self._wakeup = self._loop.call_at(when, self._async_wakeup)
+
+    @callback
+    def _async_wakeup(self) -> None:
+        """Run the actions of the deadlines that have expired."""
+        # The loop runs the timer within its clock resolution of the armed time
+        now = max(self._loop.time(), self._wakeup_at)
+        self._wakeup = None
+        self._wakeup_at = inf
+
+        heap = self._heap
+        due: list[Callable[[], None]] = []
+        while heap and heap[0][0] <= now:
+            _, seq, deadline = heappop(heap)
+            if deadline.queued_seq != seq:
+                # Superseded by an earlier heap entry
+                continue
+            deadline.queued_at = deadline.queued_seq = None
+
+            if (when := deadline.when) is None:
+                continue
+            if when > now:
+                # Moved later since it was queued
+                self._queue(deadline, when)
+                continue
+
+            deadline.when = None
+            self._pending -= 1
+            due.append(deadline.action)
+
+        if heap:
+            self._arm(heap[0][0])
+
+        for action in due:
+            try:
+                action()
+            except Exception:  # noqa: BLE001
+                LOGGER.exception("Error running deadline action %s", action)
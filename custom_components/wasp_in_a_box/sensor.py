@@ -0,0 +1,196 @@
+"""Occupancy statistics and diagnostic latency sensors for wasp_in_a_box."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_NAME, EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_LATENCY_SENSORS,
+    DEFAULT_LATENCY_SENSORS,
+    SIGNAL_STATISTICS_UPDATED,
+)
+from .latency import LATENCY_QUANTILES
+from .models import (
+    async_get_data,
+    get_room_statistics_reset,
+    get_room_unique_id,
+    get_rooms,
+)
+from .stats import OccupancyStatistics
+
+# Percentiles and the time occupied change slowly, polling keeps the cost off
+# the write path. Statistics are also updated as the occupancy changes.
+SCAN_INTERVAL = timedelta(seconds=60)
+
+
+@dataclass(frozen=True, kw_only=True)
+class WaspInABoxStatisticsSensorDescription(SensorEntityDescription):
+    """Describes an occupancy statistics sensor."""
+
+    value_fn: Callable[[OccupancyStatistics, float], float | int | datetime | None]
+    period: bool = True
+
+
+STATISTICS_SENSORS = (
+    WaspInABoxStatisticsSensorDescription(
+        key="occupied_time",
+        translation_key="occupied_time",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MINUTES,
+        state_class=SensorStateClass.TOTAL,
+        suggested_display_precision=0,
+        value_fn=lambda statistics, now: statistics.occupied_time(now) / 60,
+    ),
+    WaspInABoxStatisticsSensorDescription(
+        key="sessions",
+        translation_key="sessions",
+        state_class=SensorStateClass.TOTAL,
+        value_fn=lambda statistics, _: statistics.sessions,
+    ),
+    WaspInABoxStatisticsSensorDescription(
+        key="last_vacated",
+        translation_key="last_vacated",
+        device_class=SensorDeviceClass.TIMESTAMP,
+        value_fn=lambda statistics, _: (
+            None
+            if statistics.last_vacated is None
+            else dt_util.utc_from_timestamp(statistics.last_vacated)
+        ),
+        period=False,
+    ),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities: AddConfigEntryEntitiesCallback,
+) -> bool:
+    """Initialize config entry."""
+
+    rooms = get_rooms(config_entry.options, config_entry.title)
+    async_add_entities(
+        [
+            WaspInABoxStatisticsSensor(
+                room[CONF_NAME],
+                get_room_unique_id(config_entry.entry_id, room),
+                description,
+            )
+            for room in rooms
+            if get_room_statistics_reset(room) is not None
+            for description in STATISTICS_SENSORS
+        ]
+    )
+    async_add_entities(
+        [
+            WaspInABoxLatencySensor(
+                room[CONF_NAME],
+                get_room_unique_id(config_entry.entry_id, room),
+                quantile,
+            )
+            for room in rooms
+            if room.get(CONF_LATENCY_SENSORS, DEFAULT_LATENCY_SENSORS)
+            for quantile in LATENCY_QUANTILES
+        ]
+    )
+
+    return True
+
+
+class WaspInABoxLatencySensor(SensorEntity):
+    """A percentile of the time from a source change to the occupancy write."""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_has_entity_name = True
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 2
+    _attr_translation_key = "latency"
+
+    def __init__(self, name: str, room_unique_id: str, quantile: float) -> None:
+        """Initialize the latency sensor."""
+        percentile = round(quantile * 100)
+        self._room_unique_id = room_unique_id
+        self._quantile = quantile
+        self._attr_translation_placeholders = {
+            "room": name,
+            "percentile": str(percentile),
+        }
+        self._attr_unique_id = f"{room_unique_id}_latency_p{percentile}"
+
+    async def async_update(self) -> None:
+        """Read the percentile from the histogram of the occupancy sensor."""
+        histogram = async_get_data(self.hass).latency.get(self._room_unique_id)
+        value = None if histogram is None else histogram.percentile(self._quantile)
+        self._attr_native_value = None if value is None else value * 1000
+
+
+class WaspInABoxStatisticsSensor(SensorEntity):
+    """An occupancy statistic of a room, kept by its occupancy sensor."""
+
+    _attr_has_entity_name = True
+    entity_description: WaspInABoxStatisticsSensorDescription
+
+    def __init__(
+        self,
+        name: str,
+        room_unique_id: str,
+        description: WaspInABoxStatisticsSensorDescription,
+    ) -> None:
+        """Initialize the statistics sensor."""
+        self.entity_description = description
+        self._room_unique_id = room_unique_id
+        self._attr_translation_placeholders = {"room": name}
+        self._attr_unique_id = f"{room_unique_id}_{description.key}"
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the changes of the statistics."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                f"{SIGNAL_STATISTICS_UPDATED}_{self._room_unique_id}",
+                self._async_statistics_updated,
+            )
+        )
+        self._async_refresh()
+
+    @callback
+    def _async_statistics_updated(self) -> None:
+        """Write the statistic as the occupancy changed."""
+        self._async_refresh()
+        self.async_write_ha_state()
+
+    async def async_update(self) -> None:
+        """Read the statistic, starting a new period if one has begun."""
+        self._async_refresh()
+
+    @callback
+    def _async_refresh(self) -> None:
+        """Read the statistic from the statistics of the occupancy sensor."""
+        statistics = async_get_data(self.hass).statistics.get(self._room_unique_id)
+        if statistics is None:
+            self._attr_native_value = None
+            return
+        self._attr_native_value = self.entity_description.value_fn(
+            statistics, time.time()
+        )
+        if self.entity_description.period:
+            self._attr_last_reset = dt_util.utc_from_timestamp(statistics.period_start)
@@ -0,0 +1,237 @@
+"""Vectorised parameter sweep simulator for wasp_in_a_box.
+
+_SweepState is a vectorised copy of the rules in occupancy.py, only
+test_sweep_matches_scalar_rules keeps the two in step.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+from .occupancy import STATE_OFF, STATE_ON, normalize_state
+
+_OFF = np.int8(0)
+_ON = np.int8(1)
+_UNKNOWN = np.int8(2)
+
+_CODES = {STATE_OFF: _OFF, STATE_ON: _ON}
+
+
+@dataclass(frozen=True, slots=True)
+class TraceEvent:
+    """A source state change with the true occupancy after it."""
+
+    time: float
+    is_wasp: bool
+    state: str | None
+    occupied: bool
+
+
+@dataclass(frozen=True, slots=True)
+class SweepResult:
+    """False on and false off seconds for each parameter combination."""
+
+    door_closed_delay: npt.NDArray[np.float64]
+    door_open_timeout: npt.NDArray[np.float64]
+    immediate_on: npt.NDArray[np.bool_]
+    false_on: npt.NDArray[np.float64]
+    false_off: npt.NDArray[np.float64]
+
+    @property
+    def error(self) -> npt.NDArray[np.float64]:
+        """Return the total misclassified seconds of each combination."""
+        return self.false_on + self.false_off
+
+    def best(self) -> int:
+        """Return the index of the combination with the least error."""
+        return int(np.argmin(self.error))
+
+
+def parameter_grid(
+    door_closed_delays: Iterable[float],
+    door_open_timeouts: Iterable[float],
+    immediate_on: Iterable[bool] = (True, False),
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """Return the flattened cartesian product of the parameter values."""
+    delay, timeout, immediate = np.meshgrid(
+        np.asarray(list(door_closed_delays), dtype=np.float64),
+        np.asarray(list(door_open_timeouts), dtype=np.float64),
+        np.asarray(list(immediate_on), dtype=np.bool_),
+        indexing="ij",
+    )
+    return delay.ravel(), timeout.ravel(), immediate.ravel()
+
+
+def _code(state: str | None) -> np.int8:
+    """Return the array code of a source state."""
+    return _CODES.get(normalize_state(state), _UNKNOWN)
+
+
+class _SweepState:
+    """Occupancy state of every parameter combination.
+
+    The transitions mirror OccupancyRules, a rule change there has to be
+    made here as well.
+    """
+
+    def __init__(
+        self,
+        delay: npt.NDArray[np.float64],
+        timeout: npt.NDArray[np.float64],
+        immediate_on: npt.NDArray[np.bool_],
+    ) -> None:
+        size = delay.shape[0]
+        self.delay = delay
+        self.timeout = timeout
+        self.immediate_on = immediate_on
+        self.wasp = np.full(size, _UNKNOWN, dtype=np.int8)
+        self.box = _UNKNOWN
+        self.box_raw: str | None = None
+        self.state = np.full(size, _UNKNOWN, dtype=np.int8)
+        self.motion_was_detected = np.zeros(size, dtype=np.bool_)
+        self.door_closed_deadline = np.full(size, np.inf)
+        self.door_open_deadline = np.full(size, np.inf)
+        self.false_on = np.zeros(size)
+        self.false_off = np.zeros(size)
+
+    def calculate(self, mask: npt.NDArray[np.bool_] | None = None) -> None:
+        """Calculate the state of the masked combinations."""
+        unknown = self.wasp == _UNKNOWN
+        door_closed = self.box == _OFF
+        motion_detected_now = self.wasp == _ON
+        motion_detected = motion_detected_now | self.motion_was_detected
+
+        occupied = (door_closed & motion_detected) | (
+            self.immediate_on & (motion_detected_now | (not door_closed))
+        )
+        state = np.where(unknown, _UNKNOWN, np.where(occupied, _ON, _OFF))
+        motion_was_detected = np.where(
+            unknown, self.motion_was_detected, motion_detected
+        )
+
+        if mask is None:
+            self.state = state.astype(np.int8)
+            self.motion_was_detected = motion_was_detected
+        else:
+            self.state = np.where(mask, state, self.state).astype(np.int8)
+            self.motion_was_detected = np.where(
+                mask, motion_was_detected, self.motion_was_detected
+            )
+
+    def wasp_changed(self, time: float, state: str | None) -> None:
+        """Apply a wasp state change to every combination."""
+        code = _code(state)
+        self.wasp[:] = code
+        start = code == _OFF and self.box in (_ON, _UNKNOWN)
+        self.door_open_deadline = (
+            time + self.timeout if start else np.full_like(self.timeout, np.inf)
+        )
+        self.calculate()
+
+    def box_changed(self, time: float, state: str | None) -> None:
+        """Apply a box state change to every combination."""
+        code = _code(state)
+        old_state, self.box_raw = self.box_raw, state
+        if code != _UNKNOWN:
+            door_just_closed = old_state == STATE_ON and code == _OFF
+            self.box = code
+            if door_just_closed:
+                self.door_closed_deadline = time + self.delay
+                return
+        else:
+            self.box = _UNKNOWN
+
+        self.door_closed_deadline = np.full_like(self.delay, np.inf)
+        start = (self.wasp == _OFF) & (self.box == _ON)
+        self.door_open_deadline = np.where(start, time + self.timeout, np.inf)
+        self.calculate()
+
+    def expire(
+        self, closed: npt.NDArray[np.bool_], opened: npt.NDArray[np.bool_]
+    ) -> None:
+        """Expire the door closed delay and door open timeout of combinations."""
+        self.door_closed_deadline = np.where(closed, np.inf, self.door_closed_deadline)
+        self.motion_was_detected &= ~closed
+        self.calculate(closed)
+
+        self.door_open_deadline = np.where(opened, np.inf, self.door_open_deadline)
+        self.wasp = np.where(opened, _OFF, self.wasp).astype(np.int8)
+        self.motion_was_detected &= ~opened
+        self.state = np.where(opened, _OFF, self.state).astype(np.int8)
+
+    def accumulate(
+        self,
+        start: npt.NDArray[np.float64],
+        end: npt.NDArray[np.float64],
+        occupied: bool,
+    ) -> None:
+        """Accumulate misclassified time between start and end."""
+        if occupied:
+            self.false_off += np.where(self.state != _ON, end - start, 0.0)
+        else:
+            self.false_on += np.where(self.state == _ON, end - start, 0.0)
+
+    def advance(self, start: float, end: float, occupied: bool) -> None:
+        """Expire the timers due up to end, accumulating time since start."""
+        now = np.full(self.delay.shape[0], start)
+        # Timers are only started by source changes, each fires at most once
+        for _ in range(2):
+            deadline = np.minimum(self.door_closed_deadline, self.door_open_deadline)
+            due = deadline <= end
+            if not due.any():
+                break
+            expired_at = np.where(due, deadline, now)
+            self.accumulate(now, expired_at, occupied)
+            now = expired_at
+            closed = due & (self.door_closed_deadline <= self.door_open_deadline)
+            self.expire(closed, due & ~closed)
+        self.accumulate(now, np.full_like(now, end), occupied)
+
+
+def sweep(
+    trace: Sequence[TraceEvent],
+    door_closed_delay: npt.ArrayLike,
+    door_open_timeout: npt.ArrayLike,
+    immediate_on: npt.ArrayLike,
+    end_time: float | None = None,
+) -> SweepResult:
+    """Run a trace against every parameter combination.
+
+    The parameter arrays are broadcast against each other, each element is a
+    combination. False on time is accumulated while a combination reports
+    occupied and the trace is not, false off time the other way round.
+    """
+    delay, timeout, immediate = np.broadcast_arrays(
+        np.asarray(door_closed_delay, dtype=np.float64),
+        np.asarray(door_open_timeout, dtype=np.float64),
+        np.asarray(immediate_on, dtype=np.bool_),
+    )
+    delay, timeout, immediate = delay.ravel(), timeout.ravel(), immediate.ravel()
+
+    sim = _SweepState(delay, timeout, immediate)
+    if not trace:
+        return SweepResult(delay, timeout, immediate, sim.false_on, sim.false_off)
+
+    if end_time is None:
+        end_time = trace[-1].time
+
+    occupied = False
+    previous = trace[0].time
+    for event in trace:
+        if event.time > end_time:
+            break
+        sim.advance(previous, event.time, occupied)
+        if event.is_wasp:
+            sim.wasp_changed(event.time, event.state)
+        else:
+            sim.box_changed(event.time, event.state)
+        occupied = event.occupied
+        previous = event.time
+
+    sim.advance(previous, end_time, occupied)
+
+    return SweepResult(delay, timeout, immediate, sim.false_on, sim.false_off)
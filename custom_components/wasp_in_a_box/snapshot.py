@@ -0,0 +1,152 @@
+"""Shared sensor snapshot stream for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Collection
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import ATTR_DOOR_SENSOR_STATE, ATTR_MOTION_SENSOR_STATE, LOGGER
+
+if TYPE_CHECKING:
+    from .binary_sensor import WaspInABoxSensor
+
+type SnapshotListener = Callable[[dict[str, dict[str, Any] | None]], None]
+
+
+class SensorSnapshot(NamedTuple):
+    """Occupancy, source states and timer deadlines of a sensor.
+
+    Deadlines are loop times, so an unchanged deadline compares equal however
+    much time has passed.
+    """
+
+    state: str
+    wasp_state: str
+    box_state: str
+    door_closed_delay_deadline: float | None
+    door_open_timeout_deadline: float | None
+
+    def as_dict(self, utc_offset: float) -> dict[str, Any]:
+        """Return the snapshot with deadlines as UTC timestamps."""
+        return {
+            "state": self.state,
+            ATTR_MOTION_SENSOR_STATE: self.wasp_state,
+            ATTR_DOOR_SENSOR_STATE: self.box_state,
+            "door_closed_delay_deadline": _to_utc(
+                self.door_closed_delay_deadline, utc_offset
+            ),
+            "door_open_timeout_deadline": _to_utc(
+                self.door_open_timeout_deadline, utc_offset
+            ),
+        }
+
+
+def _to_utc(deadline: float | None, utc_offset: float) -> float | None:
+    """Return a loop time as a UTC timestamp."""
+    return None if deadline is None else round(deadline + utc_offset, 3)
+
+
+class SnapshotStream:
+    """Stream the snapshots of changed sensors to subscribers.
+
+    Sensors report every change, changes are only collected while there are
+    subscribers. Each loop tick, the sensors whose snapshot differs from the
+    last one sent are delivered to the subscribers in a single delta, a
+    removed sensor is delivered as None.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, sensors: Collection[WaspInABoxSensor]
+    ) -> None:
+        """Initialize the stream."""
+        self._hass = hass
+        self._sensors = sensors
+        self._listeners: list[SnapshotListener] = []
+        self._pending: dict[str, WaspInABoxSensor | None] = {}
+        self._sent: dict[str, SensorSnapshot] = {}
+        self._flush_scheduled = False
+
+    def _utc_offset(self) -> float:
+        """Return the offset from loop time to a UTC timestamp."""
+        return dt_util.utcnow().timestamp() - self._hass.loop.time()
+
+    @callback
+    def async_snapshot(self) -> dict[str, dict[str, Any]]:
+        """Return the snapshots of all sensors."""
+        utc_offset = self._utc_offset()
+        return {
+            sensor.entity_id: sensor.snapshot.as_dict(utc_offset)
+            for sensor in self._sensors
+        }
+
+    @callback
+    def async_subscribe(self, listener: SnapshotListener) -> CALLBACK_TYPE:
+        """Subscribe to deltas, return an unsubscribe callback.
+
+        The subscriber is expected to start from async_snapshot.
+        """
+        # Deliver what is pending so the sent snapshots can be reset
+        self._async_flush()
+        self._sent = {sensor.entity_id: sensor.snapshot for sensor in self._sensors}
+        self._listeners.append(listener)
+
+        @callback
+        def _async_unsubscribe() -> None:
+            self._listeners.remove(listener)
+            if not self._listeners:
+                self._pending.clear()
+                self._sent.clear()
+
+        return _async_unsubscribe
+
+    @callback
+    def async_changed(self, sensor: WaspInABoxSensor) -> None:
+        """Queue a sensor that may have changed."""
+        if self._listeners and sensor.entity_id:
+            self._pending[sensor.entity_id] = sensor
+            self._async_schedule_flush()
+
+    @callback
+    def async_removed(self, entity_id: str) -> None:
+        """Queue a removed sensor."""
+        if self._listeners:
+            self._pending[entity_id] = None
+            self._async_schedule_flush()
+
+    @callback
+    def _async_schedule_flush(self) -> None:
+        """Flush once at the end of the loop tick."""
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._hass.loop.call_soon(self._async_flush)
+
+    @callback
+    def _async_flush(self) -> None:
+        """Deliver the snapshots that changed since they were last sent."""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        if not self._listeners:
+            return
+
+        utc_offset = self._utc_offset()
+        delta: dict[str, dict[str, Any] | None] = {}
+        for entity_id, sensor in pending.items():
+            if sensor is None:
+                if self._sent.pop(entity_id, None) is not None:
+                    delta[entity_id] = None
+                continue
+            snapshot = sensor.snapshot
+            if self._sent.get(entity_id) != snapshot:
+                self._sent[entity_id] = snapshot
+                delta[entity_id] = snapshot.as_dict(utc_offset)
+
+        if not delta:
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(delta)
+            except Exception:  # noqa: BLE001
+                LOGGER.exception("Error delivering snapshots to %s", listener)
@@ -0,0 +1,97 @@
+"""Incrementally maintained occupancy statistics for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, tzinfo
+from typing import Any
+
+
+def parse_reset_time(value: str) -> time:
+    """Return the reset time of an option, midnight if it is invalid."""
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        return time()
+
+
+def get_period(
+    timestamp: float, reset_time: time, timezone: tzinfo
+) -> tuple[float, float]:
+    """Return the start and end of the daily period a timestamp falls in."""
+    local = datetime.fromtimestamp(timestamp, timezone)
+    boundary = datetime.combine(local.date(), reset_time, timezone)
+    if boundary > local:
+        return (boundary - timedelta(days=1)).timestamp(), boundary.timestamp()
+    return boundary.timestamp(), (boundary + timedelta(days=1)).timestamp()
+
+
+@dataclass(slots=True)
+class OccupancyStatistics:
+    """Occupied time, sessions and last vacated time of a room.
+
+    Periods start each day at the reset time. A session that is running when
+    a period starts counts as a session of the new period, its time before
+    the start belongs to the previous one.
+    """
+
+    reset_time: time
+    timezone: tzinfo
+    period_start: float = 0.0
+    period_end: float = 0.0
+    occupied_seconds: float = 0.0
+    sessions: int = 0
+    occupied_since: float | None = None
+    last_vacated: float | None = None
+
+    def roll(self, now: float) -> None:
+        """Start a new period if the current one has ended."""
+        if now < self.period_end:
+            return
+        self.period_start, self.period_end = get_period(
+            now, self.reset_time, self.timezone
+        )
+        self.occupied_seconds = 0.0
+        self.sessions = 0 if self.occupied_since is None else 1
+
+    def transition(self, now: float, occupied: bool) -> None:
+        """Observe the room becoming occupied or vacated."""
+        self.roll(now)
+        if occupied and self.occupied_since is None:
+            self.occupied_since = now
+            self.sessions += 1
+        elif not occupied and self.occupied_since is not None:
+            self.occupied_seconds += now - max(self.occupied_since, self.period_start)
+            self.occupied_since = None
+            self.last_vacated = now
+
+    def occupied_time(self, now: float) -> float:
+        """Return the seconds occupied in the current period."""
+        self.roll(now)
+        if self.occupied_since is None:
+            return self.occupied_seconds
+        return self.occupied_seconds + now - max(self.occupied_since, self.period_start)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the statistics to store."""
+        return {
+            "period_start": self.period_start,
+            "occupied_seconds": self.occupied_seconds,
+            "sessions": self.sessions,
+            "occupied_since": self.occupied_since,
+            "last_vacated": self.last_vacated,
+        }
+
+    def restore(self, restored: dict[str, Any], now: float) -> None:
+        """Restore stored statistics, discarding those of an earlier period."""
+        self.occupied_since = restored["occupied_since"]
+        self.last_vacated = restored["last_vacated"]
+        self.period_start, self.period_end = get_period(
+            now, self.reset_time, self.timezone
+        )
+        if restored["period_start"] < self.period_start:
+            self.occupied_seconds = 0.0
+            self.sessions = 0 if self.occupied_since is None else 1
+        else:
+            self.occupied_seconds = restored["occupied_seconds"]
+            self.sessions = restored["sessions"]
@@ -0,0 +1,72 @@
+"""Websocket API for wasp_in_a_box."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.auth.permissions.const import POLICY_READ
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+
+from .models import async_get_data
+
+
+@callback
+def async_setup_websocket_api(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, websocket_list)
+    websocket_api.async_register_command(hass, websocket_subscribe)
+
+
+def _readable[T](
+    connection: websocket_api.ActiveConnection, snapshots: dict[str, T]
+) -> dict[str, T]:
+    """Return the snapshots of the sensors the user may read."""
+    if connection.user.is_admin:
+        return snapshots
+    check_entity = connection.user.permissions.check_entity
+    return {
+        entity_id: snapshot
+        for entity_id, snapshot in snapshots.items()
+        if check_entity(entity_id, POLICY_READ)
+    }
+
+
+@websocket_api.websocket_command({vol.Required("type"): "wasp_in_a_box/list"})
+@callback
+def websocket_list(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Return the snapshots of all sensors."""
+    snapshots = async_get_data(hass).snapshot_stream.async_snapshot()
+    connection.send_result(msg["id"], {"sensors": _readable(connection, snapshots)})
+
+
+@websocket_api.websocket_command({vol.Required("type"): "wasp_in_a_box/subscribe"})
+@callback
+def websocket_subscribe(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Send the snapshots of all sensors, then the changed ones each loop tick."""
+    stream = async_get_data(hass).snapshot_stream
+
+    @callback
+    def _async_forward(delta: dict[str, dict[str, Any] | None]) -> None:
+        if delta := _readable(connection, delta):
+            connection.send_message(
+                websocket_api.event_message(msg["id"], {"sensors": delta})
+            )
+
+    connection.subscriptions[msg["id"]] = stream.async_subscribe(_async_forward)
+    connection.send_result(msg["id"])
+    connection.send_message(
+        websocket_api.event_message(
+            msg["id"], {"sensors": _readable(connection, stream.async_snapshot())}
+        )
+    )
@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 
-from collections.abc import Generator
+from collections.abc import Callable, Generator
+from datetime import timedelta
 from typing import Any
 from unittest.mock import AsyncMock, patch
 
@@ -10,20 +11,28 @@ import pytest
 from custom_components.wasp_in_a_box.const import (
     CONF_BOX_ID,
     CONF_DOOR_CLOSED_DELAY,
+    CONF_DOOR_OPEN_TIMEOUT,
     CONF_IMMEDIATE_ON,
     CONF_WASP_ID,
     DEFAULT_DOOR_CLOSED_DELAY,
     DEFAULT_IMMEDIATE_ON,
+    DEFAULT_OPEN_DOOR_TIMEOUT,
     DOMAIN,
 )
-from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
 
 from homeassistant.config_entries import SOURCE_USER
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
 
 pytest_plugins = "pytest_homeassistant_custom_component"
 
+MAX_WAKEUPS = 10
+
 
 # This fixture enables loading custom integrations in all tests.
 # Remove to enable selective use of this fixture
@@ -43,18 +52,32 @@ def mock_setup_entry() -> Generator[AsyncMock]:
         yield mock_setup_entry
 
 
+@pytest.fixture(name="config_overrides")
+async def config_overrides_to_integration_load() -> dict[str, Any]:
+    """Return options to change in the configuration.
+
+    To override options, tests can be marked with:
+    @pytest.mark.parametrize("config_overrides", [{...}])
+    """
+    return {}
+
+
 @pytest.fixture(name="get_config")
-async def get_config_to_integration_load() -> dict[str, Any]:
+async def get_config_to_integration_load(
+    config_overrides: dict[str, Any],
+) -> dict[str, Any]:
     """Return configuration.
 
     To override the config, tests can be marked with:
     @pytest.mark.parametrize("get_config", [{...}])
     """
     return {
-        CONF_WASP_ID: "binary_sensor.test_motion",
-        CONF_BOX_ID: "binary_sensor.test_door",
+        CONF_WASP_ID: ["binary_sensor.test_motion"],
+        CONF_BOX_ID: ["binary_sensor.test_door"],
         CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+        CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
         CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+        **config_overrides,
     }
 
 
@@ -85,6 +108,7 @@ async def load_integration(
         source=SOURCE_USER,
         options=get_config,
         entry_id="1",
+        version=2,
     )
 
     config_entry.add_to_hass(hass)
@@ -103,3 +127,21 @@ async def load_integration(
     await hass.async_block_till_done()
 
     return config_entry
+
+
+async def async_fire_time_changed_until(
+    hass: HomeAssistant, seconds: float, done: Callable[[], bool]
+) -> None:
+    """Fire time changes the given seconds ahead until done.
+
+    Mocked time does not move the loop clock, so each time fired runs one
+    scheduler wakeup and a deadline moved later since it was queued is only
+    re-armed by it.
+    """
+    for _ in range(MAX_WAKEUPS):
+        if done():
+            return
+        async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=seconds))
+        await hass.async_block_till_done()
+    if not done():
+        pytest.fail(f"Not done after {MAX_WAKEUPS} time changes")
@@ -0,0 +1,204 @@
+"""Test wasp_in_a_box adaptive timing."""
+
+from __future__ import annotations
+
+import random
+import statistics
+from typing import Any
+
+import pytest
+from custom_components.wasp_in_a_box.adaptive import (
+    ADAPTIVE_DOOR_CLOSED_DELAY_MARGIN,
+    ADAPTIVE_DOOR_OPEN_TIMEOUT_GAP_LIMIT,
+    ADAPTIVE_MIN_SAMPLES,
+    AdaptiveTiming,
+    LearnedDuration,
+    P2Quantile,
+)
+from custom_components.wasp_in_a_box.config_flow import ConfigFlowHandler
+from custom_components.wasp_in_a_box.const import (
+    CONF_ADAPTIVE,
+    DEFAULT_DOOR_CLOSED_DELAY,
+    DEFAULT_OPEN_DOOR_TIMEOUT,
+    DOMAIN,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    mock_restore_cache_with_extra_data,
+)
+
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant, State
+from homeassistant.helpers import entity_registry as er
+
+MOTION_CLEAR_GAP = 5
+# Options below and above anything learned
+SHORT_OPTION = 60
+LONG_OPTION = 3600
+SUB_SECOND_DELAY = 0.5
+
+
+def _learn_door_closed_delay(timing: AdaptiveTiming, visits: int) -> None:
+    """Leave the room, the motion clearing a few seconds after the door closes."""
+    for visit in range(visits):
+        now = visit * 100.0
+        timing.box_changed(now, STATE_ON, STATE_ON)
+        timing.box_changed(now + 2, STATE_OFF, STATE_ON)
+        timing.wasp_changed(now + 2 + MOTION_CLEAR_GAP, STATE_OFF, STATE_OFF)
+        timing.box_changed(now + 50, STATE_ON, STATE_OFF)
+        timing.wasp_changed(now + 51, STATE_ON, STATE_ON)
+
+
+@pytest.mark.parametrize("quantile", [0.5, 0.95])
+def test_p2_quantile(quantile: float) -> None:
+    """Test the estimate is close to the exact quantile."""
+
+    rng = random.Random(0)  # noqa: S311
+    samples = [rng.lognormvariate(3, 0.5) for _ in range(5000)]
+    estimator = P2Quantile(quantile)
+    for sample in samples:
+        estimator.add(sample)
+
+    exact = statistics.quantiles(samples, n=100, method="inclusive")[
+        round(quantile * 100) - 1
+    ]
+    assert estimator.value == pytest.approx(exact, rel=0.05)
+
+    restored = P2Quantile.from_dict(quantile, estimator.as_dict())
+    assert restored.value == estimator.value
+
+
+def test_learned_duration() -> None:
+    """Test the option is used until enough gaps are seen and bounds the rest."""
+
+    shortening = LearnedDuration(
+        0, ADAPTIVE_DOOR_OPEN_TIMEOUT_GAP_LIMIT, shortening=True
+    )
+    lengthening = LearnedDuration(
+        0, ADAPTIVE_DOOR_OPEN_TIMEOUT_GAP_LIMIT, shortening=False
+    )
+    for learned in (shortening, lengthening):
+        for _ in range(ADAPTIVE_MIN_SAMPLES - 1):
+            learned.add(DEFAULT_OPEN_DOOR_TIMEOUT)
+        assert learned.value(SHORT_OPTION) == SHORT_OPTION
+        learned.add(DEFAULT_OPEN_DOOR_TIMEOUT)
+
+        # Gaps beyond the limit are not counted
+        learned.add(ADAPTIVE_DOOR_OPEN_TIMEOUT_GAP_LIMIT * 2)
+        assert learned.samples == ADAPTIVE_MIN_SAMPLES
+
+    assert shortening.value(LONG_OPTION) == pytest.approx(DEFAULT_OPEN_DOOR_TIMEOUT)
+    assert shortening.value(SHORT_OPTION) == SHORT_OPTION
+    assert lengthening.value(SHORT_OPTION) == pytest.approx(DEFAULT_OPEN_DOOR_TIMEOUT)
+    assert lengthening.value(LONG_OPTION) == LONG_OPTION
+
+
+def test_options_kept() -> None:
+    """Test options learning would not move in its direction are kept."""
+
+    timing = AdaptiveTiming()
+    _learn_door_closed_delay(timing, ADAPTIVE_MIN_SAMPLES)
+    assert timing.door_closed_delay.value(SUB_SECOND_DELAY) == SUB_SECOND_DELAY
+    assert timing.door_open_timeout.value(LONG_OPTION) == LONG_OPTION
+    # Only the door closed delay is shortened
+    assert timing.door_closed_delay.value(DEFAULT_DOOR_CLOSED_DELAY) == (
+        MOTION_CLEAR_GAP + ADAPTIVE_DOOR_CLOSED_DELAY_MARGIN
+    )
+    assert (
+        timing.door_open_timeout.value(DEFAULT_OPEN_DOOR_TIMEOUT)
+        == DEFAULT_OPEN_DOOR_TIMEOUT
+    )
+
+
+def test_adaptive_timing() -> None:
+    """Test gaps are learned from door and motion changes."""
+
+    timing = AdaptiveTiming()
+    _learn_door_closed_delay(timing, ADAPTIVE_MIN_SAMPLES)
+    assert timing.door_closed_delay.samples == ADAPTIVE_MIN_SAMPLES
+    assert timing.door_closed_delay.value(DEFAULT_DOOR_CLOSED_DELAY) == (
+        MOTION_CLEAR_GAP + ADAPTIVE_DOOR_CLOSED_DELAY_MARGIN
+    )
+    # Each reentry ended a still gap of a second with the door open
+    assert timing.door_open_timeout.samples == ADAPTIVE_MIN_SAMPLES
+
+    # Motion after the door closed is an occupied room, not a gap
+    timing.box_changed(1000, STATE_OFF, STATE_ON)
+    timing.wasp_changed(1005, STATE_OFF, STATE_OFF)
+    timing.wasp_changed(1010, STATE_ON, STATE_OFF)
+    timing.box_changed(1100, STATE_ON, STATE_ON)
+    assert timing.door_closed_delay.samples == ADAPTIVE_MIN_SAMPLES
+
+    restored = AdaptiveTiming()
+    restored.restore(timing.as_dict())
+    assert restored.as_dict() == timing.as_dict()
+
+
+@pytest.mark.parametrize(
+    ("adaptive", "expected_delay"),
+    [
+        (True, MOTION_CLEAR_GAP + ADAPTIVE_DOOR_CLOSED_DELAY_MARGIN),
+        (False, DEFAULT_DOOR_CLOSED_DELAY),
+    ],
+)
+async def test_learned_delay_restored(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    get_config: dict[str, Any],
+    adaptive: bool,
+    expected_delay: float,
+) -> None:
+    """Test learned statistics survive a restart and set the door closed delay."""
+
+    for object_id in ("motion", "door"):
+        entity_registry.async_get_or_create(
+            "binary_sensor", "test", object_id, suggested_object_id=f"test_{object_id}"
+        )
+        hass.states.async_set(f"binary_sensor.test_{object_id}", STATE_ON)
+
+    timing = AdaptiveTiming()
+    _learn_door_closed_delay(timing, ADAPTIVE_MIN_SAMPLES)
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State("binary_sensor.mock_title", STATE_ON),
+                {
+                    "state": STATE_ON,
+                    "wasp_state": STATE_ON,
+                    "box_state": STATE_ON,
+                    "motion_was_detected": True,
+                    "door_closed_delay_deadline": None,
+                    "door_open_timeout_deadline": None,
+                    "adaptive": timing.as_dict(),
+                },
+            )
+        ],
+    )
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={**get_config, CONF_ADAPTIVE: adaptive},
+        version=ConfigFlowHandler.VERSION,
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    assert sensor.door_closed_delay == expected_delay
+
+    hass.states.async_set("binary_sensor.test_door", STATE_OFF)
+    await hass.async_block_till_done()
+
+    diagnostics = sensor.async_get_diagnostics()
+    assert diagnostics["door_closed_delay_remaining"] == pytest.approx(
+        expected_delay, abs=1
+    )
+    if adaptive:
+        assert diagnostics["adaptive"]["door_closed_delay"]["samples"] == (
+            ADAPTIVE_MIN_SAMPLES
+        )
+    else:
+        assert diagnostics["adaptive"] is None
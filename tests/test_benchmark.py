@@ -0,0 +1,387 @@
+"""Benchmark the wasp_in_a_box sensor hot path.
+
+Synthetic event traces are driven through the sensor listeners with a
+virtual clock behind the deadline scheduler, results are compared against
+benchmark_baseline.json, as is setting up many rooms as one multi-room entry
+against an entry per room. Only the deterministic writes and timer handles
+are compared by default, set WASP_BENCHMARK_TIMING=1 to also compare the
+timings and allocations, which depend on the machine. Set
+WASP_BENCHMARK_UPDATE=1 to store new baselines and WASP_BENCHMARK_TOLERANCE to
+change the allowed timing regression factor.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import os
+import sys
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from itertools import count
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+from unittest.mock import patch
+
+import pytest
+from custom_components.wasp_in_a_box.const import (
+    CONF_BOX_ID,
+    CONF_DOOR_CLOSED_DELAY,
+    CONF_DOOR_OPEN_TIMEOUT,
+    CONF_IMMEDIATE_ON,
+    CONF_ROOMS,
+    CONF_WASP_ID,
+    DEFAULT_DOOR_CLOSED_DELAY,
+    DEFAULT_IMMEDIATE_ON,
+    DEFAULT_OPEN_DOOR_TIMEOUT,
+    DOMAIN,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+from custom_components.wasp_in_a_box.scheduler import DeadlineScheduler
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.const import (
+    CONF_ID,
+    CONF_NAME,
+    EVENT_STATE_CHANGED,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import Event, EventStateChangedData, HomeAssistant, State
+from homeassistant.helpers import entity_registry as er
+from homeassistant.setup import async_setup_component
+
+if TYPE_CHECKING:
+    from custom_components.wasp_in_a_box.binary_sensor import WaspInABoxSensor
+
+BASELINE_PATH = Path(__file__).parent / "benchmark_baseline.json"
+WASP_ENTITY_ID = "binary_sensor.bench_motion"
+BOX_ENTITY_ID = "binary_sensor.bench_door"
+SETUP_ROOMS = 50
+TOLERANCE = float(os.environ.get("WASP_BENCHMARK_TOLERANCE", "3"))
+TIMING = bool(os.environ.get("WASP_BENCHMARK_TIMING"))
+
+
+class _VirtualTimerHandle:
+    """Timer handle of the virtual clock."""
+
+    def __init__(self, callback: Callable[[], None]) -> None:
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Cancel the callback."""
+        self.cancelled = True
+
+
+class VirtualClock:
+    """Loop stand-in for the deadline scheduler, time only moves when advanced."""
+
+    def __init__(self) -> None:
+        """Initialize the clock at zero."""
+        self.now = 0.0
+        self.handles_created = 0
+        self._handles: list[tuple[float, int, _VirtualTimerHandle]] = []
+        self._seq = count()
+
+    def time(self) -> float:
+        """Return the current virtual time."""
+        return self.now
+
+    def call_at(self, when: float, callback: Callable[[], None]) -> _VirtualTimerHandle:
+        """Schedule a callback at a virtual time."""
+        self.handles_created += 1
+        handle = _VirtualTimerHandle(callback)
+        heappush(self._handles, (when, next(self._seq), handle))
+        return handle
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock forward, running the timers that come due."""
+        target = self.now + seconds
+        while self._handles and self._handles[0][0] <= target:
+            when, _, handle = heappop(self._handles)
+            if handle.cancelled:
+                continue
+            self.now = max(self.now, when)
+            handle.callback()
+        self.now = target
+
+
+@dataclass(frozen=True)
+class TraceStep:
+    """A source state change after a delay."""
+
+    delay: float
+    entity_id: str
+    state: str
+
+
+def _chattering_pir() -> Iterator[TraceStep]:
+    """Door closed, motion sensor toggling every second."""
+    yield TraceStep(0, BOX_ENTITY_ID, STATE_OFF)
+    for _ in range(500):
+        yield TraceStep(1, WASP_ENTITY_ID, STATE_ON)
+        yield TraceStep(1, WASP_ENTITY_ID, STATE_OFF)
+
+
+def _door_bounce() -> Iterator[TraceStep]:
+    """Motion detected, door contact bouncing every 50 ms."""
+    yield TraceStep(0, WASP_ENTITY_ID, STATE_ON)
+    for _ in range(250):
+        yield TraceStep(0.05, BOX_ENTITY_ID, STATE_ON)
+        yield TraceStep(0.05, BOX_ENTITY_ID, STATE_OFF)
+    yield TraceStep(DEFAULT_DOOR_CLOSED_DELAY + 10, WASP_ENTITY_ID, STATE_OFF)
+
+
+def _long_occupancy() -> Iterator[TraceStep]:
+    """Enter, stay for four hours with intermittent motion, leave."""
+    yield TraceStep(0, BOX_ENTITY_ID, STATE_ON)
+    yield TraceStep(1, WASP_ENTITY_ID, STATE_ON)
+    yield TraceStep(3, BOX_ENTITY_ID, STATE_OFF)
+    for _ in range(240):
+        yield TraceStep(50, WASP_ENTITY_ID, STATE_OFF)
+        yield TraceStep(10, WASP_ENTITY_ID, STATE_ON)
+    yield TraceStep(5, BOX_ENTITY_ID, STATE_ON)
+    yield TraceStep(5, WASP_ENTITY_ID, STATE_OFF)
+    yield TraceStep(DEFAULT_OPEN_DOOR_TIMEOUT + 10, BOX_ENTITY_ID, STATE_OFF)
+
+
+TRACES: dict[str, Callable[[], Iterator[TraceStep]]] = {
+    "chattering_pir": _chattering_pir,
+    "door_bounce": _door_bounce,
+    "long_occupancy": _long_occupancy,
+}
+
+
+def _build_events(
+    trace: Iterator[TraceStep],
+) -> list[tuple[float, str, Event[EventStateChangedData]]]:
+    """Return the trace as state changed events, built ahead of measuring."""
+    states: dict[str, State | None] = {WASP_ENTITY_ID: None, BOX_ENTITY_ID: None}
+    events = []
+    for step in trace:
+        new_state = State(step.entity_id, step.state)
+        events.append(
+            (
+                step.delay,
+                step.entity_id,
+                Event(
+                    EVENT_STATE_CHANGED,
+                    {
+                        "entity_id": step.entity_id,
+                        "old_state": states[step.entity_id],
+                        "new_state": new_state,
+                    },
+                ),
+            )
+        )
+        states[step.entity_id] = new_state
+    return events
+
+
+def _run_trace(
+    sensor: WaspInABoxSensor,
+    clock: VirtualClock,
+    events: list[tuple[float, str, Event[EventStateChangedData]]],
+) -> dict[str, float]:
+    """Drive the events through the sensor and return the measurements."""
+    listeners = {
+        WASP_ENTITY_ID: sensor._async_wasp_state_listener,  # noqa: SLF001
+        BOX_ENTITY_ID: sensor._async_box_state_listener,  # noqa: SLF001
+    }
+    writes = 0
+    write_ha_state = sensor.async_write_ha_state
+
+    def _counting_write_ha_state() -> None:
+        nonlocal writes
+        writes += 1
+        write_ha_state()
+
+    handles_created = clock.handles_created
+    gc.collect()
+    gc.disable()
+    blocks = sys.getallocatedblocks()
+    try:
+        with patch.object(sensor, "async_write_ha_state", _counting_write_ha_state):
+            start = time.perf_counter_ns()
+            for delay, entity_id, event in events:
+                clock.advance(delay)
+                listeners[entity_id](event)
+            clock.advance(DEFAULT_OPEN_DOOR_TIMEOUT + DEFAULT_DOOR_CLOSED_DELAY)
+            elapsed = time.perf_counter_ns() - start
+        blocks = sys.getallocatedblocks() - blocks
+    finally:
+        gc.enable()
+
+    return {
+        "ns_per_event": elapsed / len(events),
+        "allocated_blocks_per_event": blocks / len(events),
+        "writes_per_event": writes / len(events),
+        "timer_handles_created": clock.handles_created - handles_created,
+    }
+
+
+@pytest.fixture(name="bench")
+async def bench_fixture(
+    hass: HomeAssistant, entity_registry: er.EntityRegistry
+) -> tuple[WaspInABoxSensor, VirtualClock]:
+    """Set up a sensor whose timers run on a virtual clock."""
+    clock = VirtualClock()
+    async_get_data(hass).scheduler = DeadlineScheduler(SimpleNamespace(loop=clock))  # type: ignore[arg-type]
+
+    for entity_id in (WASP_ENTITY_ID, BOX_ENTITY_ID):
+        entity_registry.async_get_or_create(
+            "binary_sensor", "test", entity_id, suggested_object_id=entity_id[14:]
+        )
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={
+            CONF_WASP_ID: [WASP_ENTITY_ID],
+            CONF_BOX_ID: [BOX_ENTITY_ID],
+            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+        },
+        title="Bench",
+        version=2,
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    return next(iter(async_get_data(hass).sensors)), clock
+
+
+def _load_baseline(name: str, results: dict[str, float]) -> dict[str, float] | None:
+    """Return the stored baseline, or store the results and return None."""
+    baselines = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+    if os.environ.get("WASP_BENCHMARK_UPDATE"):
+        baselines[name] = results
+        BASELINE_PATH.write_text(
+            json.dumps(baselines, indent=2, sort_keys=True) + "\n", encoding="utf-8"
+        )
+        return None
+    baseline: dict[str, float] = baselines[name]
+    return baseline
+
+
+@pytest.mark.parametrize("trace_name", TRACES)
+async def test_benchmark(
+    bench: tuple[WaspInABoxSensor, VirtualClock],
+    trace_name: str,
+    record_property: Callable[[str, Any], None],
+) -> None:
+    """Test the cost of a trace has not regressed beyond the baseline."""
+
+    sensor, clock = bench
+    results = _run_trace(sensor, clock, _build_events(TRACES[trace_name]()))
+    for name, value in results.items():
+        record_property(name, value)
+
+    if (baseline := _load_baseline(trace_name, results)) is None:
+        return
+
+    assert results["writes_per_event"] <= baseline["writes_per_event"]
+    assert results["timer_handles_created"] <= baseline["timer_handles_created"]
+    if not TIMING:
+        return
+    assert results["ns_per_event"] <= baseline["ns_per_event"] * TOLERANCE
+    assert (
+        results["allocated_blocks_per_event"]
+        <= max(baseline["allocated_blocks_per_event"], 1.0) * TOLERANCE
+    )
+
+
+def _room_options(index: int) -> dict[str, Any]:
+    """Return the options of a benchmark room."""
+    return {
+        CONF_WASP_ID: [f"binary_sensor.bench_motion_{index}"],
+        CONF_BOX_ID: [f"binary_sensor.bench_door_{index}"],
+        CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+        CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+        CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+    }
+
+
+async def _async_time_setup(
+    hass: HomeAssistant, config_entries: list[MockConfigEntry]
+) -> int:
+    """Return the ns taken to set up the config entries."""
+    for config_entry in config_entries:
+        config_entry.add_to_hass(hass)
+    start = time.perf_counter_ns()
+    for config_entry in config_entries:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    return time.perf_counter_ns() - start
+
+
+async def test_benchmark_setup(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    record_property: Callable[[str, Any], None],
+) -> None:
+    """Test a multi-room entry sets up faster than an entry per room."""
+
+    for index in range(SETUP_ROOMS):
+        for object_id in (f"bench_motion_{index}", f"bench_door_{index}"):
+            entity_registry.async_get_or_create(
+                "binary_sensor", "test", object_id, suggested_object_id=object_id
+            )
+    assert await async_setup_component(hass, DOMAIN, {})
+
+    single_ns = await _async_time_setup(
+        hass,
+        [
+            MockConfigEntry(
+                domain=DOMAIN,
+                options=_room_options(index),
+                title=f"Single {index}",
+                version=2,
+            )
+            for index in range(SETUP_ROOMS)
+        ],
+    )
+    multi_ns = await _async_time_setup(
+        hass,
+        [
+            MockConfigEntry(
+                domain=DOMAIN,
+                options={
+                    CONF_ROOMS: [
+                        {
+                            **_room_options(index),
+                            CONF_ID: str(index),
+                            CONF_NAME: f"Multi {index}",
+                        }
+                        for index in range(SETUP_ROOMS)
+                    ]
+                },
+                title="Multi",
+                version=2,
+            )
+        ],
+    )
+    data = async_get_data(hass)
+    assert len(data.sensors) == SETUP_ROOMS * 2
+    # Both setups share the sources of each room
+    assert data.dispatcher.source_count == SETUP_ROOMS * 2
+
+    results = {
+        "single_room_entries_ns_per_room": single_ns / SETUP_ROOMS,
+        "multi_room_entry_ns_per_room": multi_ns / SETUP_ROOMS,
+    }
+    for name, value in results.items():
+        record_property(name, value)
+
+    if (baseline := _load_baseline("setup", results)) is None or not TIMING:
+        return
+
+    assert multi_ns < single_ns
+
+    for name, value in results.items():
+        assert value <= baseline[name] * TOLERANCE
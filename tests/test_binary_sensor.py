@@ -0,0 +1,379 @@
+"""Test wasp_in_a_box binary sensor."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from custom_components.wasp_in_a_box.config_flow import ConfigFlowHandler
+from custom_components.wasp_in_a_box.const import (
+    ATTR_DOOR_SENSOR_STATE,
+    ATTR_MOTION_SENSOR_STATE,
+    CONF_BOX_ID,
+    CONF_COALESCE_WINDOW,
+    CONF_DOOR_CLOSED_DELAY,
+    CONF_DOOR_OPEN_TIMEOUT,
+    CONF_IMMEDIATE_ON,
+    CONF_WASP_ID,
+    DEFAULT_DOOR_CLOSED_DELAY,
+    DEFAULT_OPEN_DOOR_TIMEOUT,
+    DOMAIN,
+    SERVICE_RESET,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+    async_fire_time_changed_exact,
+    mock_restore_cache_with_extra_data,
+)
+
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    EVENT_HOMEASSISTANT_STARTED,
+    STATE_OFF,
+    STATE_ON,
+    STATE_UNKNOWN,
+)
+from homeassistant.core import CoreState, HomeAssistant, State, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.util import dt as dt_util
+
+from .conftest import async_fire_time_changed_until
+
+if TYPE_CHECKING:
+    from freezegun.api import FrozenDateTimeFactory
+
+SUB_SECOND_DELAY = 0.025
+MAX_JITTER = 0.001
+
+
+async def _async_close_window(hass: HomeAssistant) -> None:
+    """Move time past the coalescing window, and any window it opens."""
+    sensors = async_get_data(hass).sensors
+    await async_fire_time_changed_until(
+        hass,
+        2,
+        lambda: (
+            not any(
+                sensor._coalesce_timer.pending  # noqa: SLF001
+                for sensor in sensors
+            )
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "config_overrides", [{CONF_COALESCE_WINDOW: 1, CONF_IMMEDIATE_ON: False}]
+)
+async def test_coalesce_window(
+    hass: HomeAssistant, get_config: dict[str, Any], loaded_entry: MockConfigEntry
+) -> None:
+    """Test writes inside the coalescing window collapse into the final value."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    # The deferred initial door state is flushed and opens another window
+    await _async_close_window(hass)
+
+    writes: list[str] = []
+    async_track_state_change_event(
+        hass,
+        sensor.entity_id,
+        callback(
+            lambda event: writes.append(
+                event.data["new_state"].attributes[ATTR_MOTION_SENSOR_STATE]
+            )
+        ),
+    )
+
+    # The first change is written and opens the window
+    for state in (STATE_ON, STATE_OFF, STATE_ON, STATE_OFF):
+        hass.states.async_set("binary_sensor.test_motion", state)
+        await hass.async_block_till_done()
+
+    assert writes == [STATE_ON]
+    assert sensor.suppressed_writes == 1
+
+    await _async_close_window(hass)
+
+    assert writes == [STATE_ON, STATE_OFF]
+    assert sensor.suppressed_writes == 1
+
+
+@pytest.mark.parametrize(
+    "config_overrides", [{CONF_COALESCE_WINDOW: 1, CONF_IMMEDIATE_ON: True}]
+)
+async def test_coalesce_window_immediate_on(
+    hass: HomeAssistant, get_config: dict[str, Any], loaded_entry: MockConfigEntry
+) -> None:
+    """Test immediate on transitions are written inside the coalescing window."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    await _async_close_window(hass)
+
+    await hass.services.async_call(
+        DOMAIN, SERVICE_RESET, {ATTR_ENTITY_ID: sensor.entity_id}, blocking=True
+    )
+    state = hass.states.get(sensor.entity_id)
+    assert state is not None
+    assert state.state == STATE_OFF
+
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    await hass.async_block_till_done()
+
+    state = hass.states.get(sensor.entity_id)
+    assert state is not None
+    assert state.state == STATE_ON
+    assert sensor.suppressed_writes == 0
+
+
+@pytest.mark.parametrize(
+    "config_overrides",
+    [
+        {
+            CONF_WASP_ID: ["binary_sensor.test_motion", "binary_sensor.test_mmwave"],
+            CONF_BOX_ID: ["binary_sensor.test_door", "binary_sensor.test_window"],
+            CONF_IMMEDIATE_ON: False,
+        }
+    ],
+)
+async def test_multiple_sources(
+    hass: HomeAssistant, get_config: dict[str, Any], loaded_entry: MockConfigEntry
+) -> None:
+    """Test motion and doors are aggregated across multiple sources."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    for entity_id in ("binary_sensor.test_mmwave", "binary_sensor.test_window"):
+        hass.states.async_set(entity_id, STATE_OFF)
+    await hass.async_block_till_done()
+
+    hass.states.async_set("binary_sensor.test_mmwave", STATE_ON)
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    hass.states.async_set("binary_sensor.test_motion", STATE_OFF)
+    await hass.async_block_till_done()
+
+    state = hass.states.get(sensor.entity_id)
+    assert state is not None
+    assert state.state == STATE_ON
+    assert state.attributes[ATTR_MOTION_SENSOR_STATE] == STATE_ON
+    assert sensor.async_get_diagnostics()["active_motion_sources"] == 1
+
+    hass.states.async_set("binary_sensor.test_window", STATE_ON)
+    await hass.async_block_till_done()
+
+    state = hass.states.get(sensor.entity_id)
+    assert state is not None
+    assert state.state == STATE_OFF
+    assert state.attributes[ATTR_DOOR_SENSOR_STATE] == STATE_ON
+    assert sensor.async_get_diagnostics()["open_doors"] == 1
+
+
+async def test_hierarchy(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test a boxless entry follows the wasp_in_a_box sensors it contains."""
+
+    room = er.async_entries_for_config_entry(entity_registry, loaded_entry.entry_id)[
+        0
+    ].entity_id
+    floor_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={
+            CONF_WASP_ID: [room],
+            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: True,
+        },
+        title="Floor",
+        version=ConfigFlowHandler.VERSION,
+    )
+    floor_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(floor_entry.entry_id)
+    await hass.async_block_till_done()
+    floor = er.async_entries_for_config_entry(entity_registry, floor_entry.entry_id)[
+        0
+    ].entity_id
+
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    await hass.async_block_till_done()
+
+    state = hass.states.get(floor)
+    assert state is not None
+    assert state.state == STATE_ON
+
+    await hass.services.async_call(
+        DOMAIN, SERVICE_RESET, {ATTR_ENTITY_ID: room}, blocking=True
+    )
+
+    state = hass.states.get(floor)
+    assert state is not None
+    assert state.state == STATE_OFF
+
+
+@pytest.mark.parametrize(
+    ("door_closed_delay_remaining", "expected_state"),
+    [(-10, STATE_OFF), (10, STATE_ON)],
+)
+async def test_restore_state(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    get_config: dict[str, Any],
+    door_closed_delay_remaining: float,
+    expected_state: str,
+) -> None:
+    """Test occupancy is restored with expired deadlines resolved at once."""
+
+    for object_id in ("motion", "door"):
+        entity_registry.async_get_or_create(
+            "binary_sensor", "test", object_id, suggested_object_id=f"test_{object_id}"
+        )
+        hass.states.async_set(f"binary_sensor.test_{object_id}", STATE_OFF)
+
+    now = dt_util.utcnow().timestamp()
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State("binary_sensor.mock_title", STATE_ON),
+                {
+                    "state": STATE_ON,
+                    "wasp_state": STATE_OFF,
+                    "box_state": STATE_OFF,
+                    "motion_was_detected": True,
+                    "door_closed_delay_deadline": now + door_closed_delay_remaining,
+                    "door_open_timeout_deadline": None,
+                },
+            )
+        ],
+    )
+
+    writes: list[str] = []
+    async_track_state_change_event(
+        hass,
+        "binary_sensor.mock_title",
+        callback(lambda event: writes.append(event.data["new_state"].state)),
+    )
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN, options=get_config, version=ConfigFlowHandler.VERSION
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert writes == [expected_state]
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=11))
+    await hass.async_block_till_done()
+
+    assert writes[-1] == STATE_OFF
+
+
+async def test_evaluate_after_started(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    get_config: dict[str, Any],
+) -> None:
+    """Test sensors added during startup are evaluated once started."""
+
+    hass.set_state(CoreState.starting)
+    for object_id in ("motion", "door"):
+        entity_registry.async_get_or_create(
+            "binary_sensor", "test", object_id, suggested_object_id=f"test_{object_id}"
+        )
+
+    writes: list[str] = []
+    async_track_state_change_event(
+        hass,
+        "binary_sensor.mock_title",
+        callback(lambda event: writes.append(event.data["new_state"].state)),
+    )
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN, options=get_config, version=ConfigFlowHandler.VERSION
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert len(async_get_data(hass).pending_evaluation) == 1
+    assert writes == [STATE_UNKNOWN]
+
+    # Sources load and change later during startup
+    hass.states.async_set("binary_sensor.test_motion", STATE_OFF)
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    hass.states.async_set("binary_sensor.test_door", STATE_OFF)
+    await hass.async_block_till_done()
+
+    hass.set_state(CoreState.running)
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_STARTED)
+    await hass.async_block_till_done()
+
+    assert not async_get_data(hass).pending_evaluation
+    assert writes == [STATE_UNKNOWN, STATE_ON]
+
+
+@pytest.mark.parametrize(
+    "config_overrides",
+    [{CONF_DOOR_CLOSED_DELAY: SUB_SECOND_DELAY, CONF_IMMEDIATE_ON: False}],
+)
+async def test_sub_second_delay(
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+    get_config: dict[str, Any],
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test a sub-second door closed delay fires on its deadline, not before."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    loop = asyncio.get_running_loop()
+    written_at: list[float] = []
+    async_track_state_change_event(
+        hass,
+        sensor.entity_id,
+        callback(
+            lambda event: (
+                written_at.append(loop.time())
+                if event.data["new_state"].state == STATE_ON
+                else None
+            )
+        ),
+    )
+
+    jitter: list[float] = []
+    for _ in range(10):
+        hass.states.async_set("binary_sensor.test_door", STATE_ON)
+        hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+        hass.states.async_set("binary_sensor.test_door", STATE_OFF)
+        await hass.async_block_till_done()
+        deadline = sensor.snapshot.door_closed_delay_deadline
+        assert deadline is not None
+        assert deadline - loop.time() == pytest.approx(SUB_SECOND_DELAY, abs=1e-3)
+
+        # The loop clock only moves with the frozen time
+        written = len(written_at)
+        freezer.tick(SUB_SECOND_DELAY / 2)
+        async_fire_time_changed_exact(hass)
+        await hass.async_block_till_done()
+        assert len(written_at) == written
+
+        # The frozen time moves in whole microseconds, round up to the deadline
+        freezer.tick(
+            timedelta(microseconds=math.ceil((deadline - loop.time()) * 1_000_000))
+        )
+        async_fire_time_changed_exact(hass)
+        await hass.async_block_till_done()
+        assert len(written_at) == written + 1
+        jitter.append(written_at[-1] - deadline)
+
+        await sensor.async_reset()
+        hass.states.async_set("binary_sensor.test_motion", STATE_OFF)
+        await hass.async_block_till_done()
+
+    assert max(abs(value) for value in jitter) <= MAX_JITTER
@@ -4,25 +4,38 @@ from __future__ import annotations
 
 from unittest.mock import AsyncMock
 
+from custom_components.wasp_in_a_box.config_flow import ConfigFlowHandler
 from custom_components.wasp_in_a_box.const import (
+    CONF_ADAPTIVE,
     CONF_BOX_ID,
     CONF_DOOR_CLOSED_DELAY,
     CONF_DOOR_OPEN_TIMEOUT,
     CONF_IMMEDIATE_ON,
+    CONF_ROOM,
+    CONF_ROOMS,
     CONF_WASP_ID,
     DEFAULT_DOOR_CLOSED_DELAY,
     DEFAULT_IMMEDIATE_ON,
     DEFAULT_OPEN_DOOR_TIMEOUT,
     DOMAIN,
 )
+from pytest_homeassistant_custom_component.common import MockConfigEntry
 
 from homeassistant import config_entries
-from homeassistant.const import CONF_NAME
+from homeassistant.components.binary_sensor import BinarySensorDeviceClass
+from homeassistant.const import CONF_ID, CONF_NAME
 from homeassistant.core import HomeAssistant
 from homeassistant.data_entry_flow import FlowResultType
+from homeassistant.helpers import (
+    area_registry as ar,
+    device_registry as dr,
+    entity_registry as er,
+)
 
 from .const import DEFAULT_NAME
 
+CHANGED_DOOR_CLOSED_DELAY = 30
+
 
 async def test_form_sensor(hass: HomeAssistant, mock_setup_entry: AsyncMock) -> None:
     """Test we get the form for sensor."""
@@ -37,8 +50,8 @@ async def test_form_sensor(hass: HomeAssistant, mock_setup_entry: AsyncMock) ->
         result["flow_id"],
         {
             CONF_NAME: DEFAULT_NAME,
-            CONF_WASP_ID: "binary_sensor.test_motion",
-            CONF_BOX_ID: "binary_sensor.test_door",
+            CONF_WASP_ID: ["binary_sensor.test_motion"],
+            CONF_BOX_ID: ["binary_sensor.test_door"],
             CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
             CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
             CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
@@ -47,14 +60,233 @@ async def test_form_sensor(hass: HomeAssistant, mock_setup_entry: AsyncMock) ->
     await hass.async_block_till_done()
 
     assert result["type"] is FlowResultType.CREATE_ENTRY
-    assert result["version"] == 1
+    assert result["version"] == ConfigFlowHandler.VERSION
     assert result["options"] == {
         CONF_NAME: DEFAULT_NAME,
-        CONF_WASP_ID: "binary_sensor.test_motion",
-        CONF_BOX_ID: "binary_sensor.test_door",
+        CONF_WASP_ID: ["binary_sensor.test_motion"],
+        CONF_BOX_ID: ["binary_sensor.test_door"],
         CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
         CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
         CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
     }
 
     assert len(mock_setup_entry.mock_calls) == 1
+
+
+async def test_options_wasp_cycle(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test an entry can not contain a sensor that contains the entry."""
+
+    room = er.async_entries_for_config_entry(entity_registry, loaded_entry.entry_id)[
+        0
+    ].entity_id
+    floor_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={
+            CONF_WASP_ID: [room],
+            CONF_BOX_ID: [],
+            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+        },
+        title="Floor",
+        version=ConfigFlowHandler.VERSION,
+    )
+    floor_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(floor_entry.entry_id)
+    await hass.async_block_till_done()
+    floor = er.async_entries_for_config_entry(entity_registry, floor_entry.entry_id)[
+        0
+    ].entity_id
+
+    result = await hass.config_entries.options.async_init(loaded_entry.entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {**loaded_entry.options, CONF_WASP_ID: ["binary_sensor.test_motion", floor]},
+    )
+
+    assert result["type"] is FlowResultType.FORM
+    assert result["errors"] == {"base": "wasp_cycle"}
+
+
+async def test_discovery(
+    hass: HomeAssistant,
+    area_registry: ar.AreaRegistry,
+    device_registry: dr.DeviceRegistry,
+    entity_registry: er.EntityRegistry,
+    mock_setup_entry: AsyncMock,
+) -> None:
+    """Test areas with motion and door sensors are proposed as rooms."""
+
+    bathroom = area_registry.async_create("Bathroom")
+    hallway = area_registry.async_create("Hallway")
+    kitchen = area_registry.async_create("Kitchen")
+
+    device_entry = MockConfigEntry(domain="test")
+    device_entry.add_to_hass(hass)
+    device = device_registry.async_get_or_create(
+        config_entry_id=device_entry.entry_id, identifiers={("test", "bathroom")}
+    )
+    device_registry.async_update_device(device.id, area_id=bathroom.id)
+
+    # The bathroom door takes the area of its device
+    for object_id, device_class, area_id, device_id in (
+        ("bathroom_motion", BinarySensorDeviceClass.MOTION, bathroom.id, None),
+        ("bathroom_door", BinarySensorDeviceClass.DOOR, None, device.id),
+        ("hallway_presence", BinarySensorDeviceClass.PRESENCE, hallway.id, None),
+        ("hallway_window", BinarySensorDeviceClass.OPENING, hallway.id, None),
+        ("kitchen_motion", BinarySensorDeviceClass.MOTION, kitchen.id, None),
+        ("kitchen_smoke", BinarySensorDeviceClass.SMOKE, kitchen.id, None),
+    ):
+        entry = entity_registry.async_get_or_create(
+            "binary_sensor",
+            "test",
+            object_id,
+            suggested_object_id=object_id,
+            original_device_class=device_class,
+            device_id=device_id,
+        )
+        entity_registry.async_update_entity(entry.entity_id, area_id=area_id)
+
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN,
+        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+        data={},
+    )
+    assert result["type"] is FlowResultType.FORM
+    assert result["step_id"] == "discovery_confirm"
+    assert result["description_placeholders"] == {"count": "2"}
+
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"], {CONF_ROOMS: [bathroom.id]}
+    )
+    await hass.async_block_till_done()
+
+    assert result["type"] is FlowResultType.CREATE_ENTRY
+    assert result["options"][CONF_ROOMS] == [
+        {
+            CONF_ID: bathroom.id,
+            CONF_NAME: "Bathroom",
+            CONF_WASP_ID: ["binary_sensor.bathroom_motion"],
+            CONF_BOX_ID: ["binary_sensor.bathroom_door"],
+            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+        }
+    ]
+    assert len(mock_setup_entry.mock_calls) == 1
+
+    # Configured rooms are not proposed again
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN,
+        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+        data={},
+    )
+    assert result["type"] is FlowResultType.FORM
+    assert result["description_placeholders"] == {"count": "1"}
+
+    # An ignored proposal is not shown again
+    flow = hass.config_entries.flow.async_get(result["flow_id"])
+    await hass.config_entries.flow.async_init(
+        DOMAIN,
+        context={"source": config_entries.SOURCE_IGNORE},
+        data={"unique_id": flow["context"]["unique_id"], "title": "Hallway"},
+    )
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN,
+        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+        data={},
+    )
+    assert result["type"] is FlowResultType.ABORT
+    assert result["reason"] == "already_configured"
+
+    # Until another area gets motion and door sensors
+    entry = entity_registry.async_get_or_create(
+        "binary_sensor",
+        "test",
+        "kitchen_door",
+        suggested_object_id="kitchen_door",
+        original_device_class=BinarySensorDeviceClass.DOOR,
+    )
+    entity_registry.async_update_entity(entry.entity_id, area_id=kitchen.id)
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN,
+        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+        data={},
+    )
+    assert result["type"] is FlowResultType.FORM
+    assert result["description_placeholders"] == {"count": "2"}
+
+
+async def test_options_multi_room(
+    hass: HomeAssistant, mock_setup_entry: AsyncMock
+) -> None:
+    """Test the options of one room of a multi-room entry can be changed."""
+
+    rooms = [
+        {
+            CONF_ID: f"room_{index}",
+            CONF_NAME: f"Room {index}",
+            CONF_WASP_ID: [f"binary_sensor.motion_{index}"],
+            CONF_BOX_ID: [f"binary_sensor.door_{index}"],
+            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+        }
+        for index in range(2)
+    ]
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={CONF_NAME: "House", CONF_ROOMS: rooms},
+        title="House",
+        version=ConfigFlowHandler.VERSION,
+    )
+    config_entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(config_entry.entry_id)
+    assert result["type"] is FlowResultType.FORM
+    assert result["step_id"] == "init"
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], {CONF_ROOM: "room_1"}
+    )
+    assert result["type"] is FlowResultType.FORM
+    assert result["step_id"] == "room"
+    # The form starts from the options of the selected room
+    schema = result["data_schema"].schema
+    suggested = {
+        str(key): key.description["suggested_value"]
+        for key in schema
+        if key.description and "suggested_value" in key.description
+    }
+    assert suggested[CONF_WASP_ID] == ["binary_sensor.motion_1"]
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {
+            CONF_WASP_ID: ["binary_sensor.motion_1"],
+            CONF_BOX_ID: ["binary_sensor.door_1"],
+            CONF_DOOR_CLOSED_DELAY: CHANGED_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: not DEFAULT_IMMEDIATE_ON,
+            CONF_ADAPTIVE: True,
+        },
+    )
+    await hass.async_block_till_done()
+
+    assert result["type"] is FlowResultType.CREATE_ENTRY
+    assert config_entry.options == {
+        CONF_NAME: "House",
+        CONF_ROOMS: [
+            rooms[0],
+            {
+                **rooms[1],
+                CONF_DOOR_CLOSED_DELAY: CHANGED_DOOR_CLOSED_DELAY,
+                CONF_IMMEDIATE_ON: not DEFAULT_IMMEDIATE_ON,
+                CONF_ADAPTIVE: True,
+            },
+        ],
+    }
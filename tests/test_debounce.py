@@ -0,0 +1,114 @@
+"""Test wasp_in_a_box source debouncing."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+from custom_components.wasp_in_a_box.const import (
+    CONF_BOX_SETTLE_TIME,
+    CONF_WASP_SETTLE_TIME,
+)
+from custom_components.wasp_in_a_box.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant
+
+from .conftest import async_fire_time_changed_until
+
+if TYPE_CHECKING:
+    from custom_components.wasp_in_a_box.binary_sensor import WaspInABoxSensor
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+BOX_SETTLE_TIME = 0.5
+# Bounces of a closed door settling back closed, then of an open door closing
+RETURNING_BOUNCES = (STATE_ON, STATE_OFF, STATE_ON, STATE_OFF)
+CLOSING_BOUNCES = (STATE_OFF, STATE_ON, STATE_OFF, STATE_ON, STATE_OFF)
+
+
+async def _async_settle(hass: HomeAssistant, sensor: WaspInABoxSensor) -> None:
+    """Move time past the settle time until no change is held."""
+    debouncer = sensor._box_debouncer  # noqa: SLF001
+    await async_fire_time_changed_until(
+        hass,
+        BOX_SETTLE_TIME * 2,
+        lambda: not debouncer._pending,  # noqa: SLF001
+    )
+
+
+def _door_state(sensor: WaspInABoxSensor) -> str:
+    """Return the door state the rules of the sensor have seen."""
+    return str(sensor.async_get_diagnostics()["box_state"])
+
+
+@pytest.mark.parametrize("config_overrides", [{CONF_BOX_SETTLE_TIME: BOX_SETTLE_TIME}])
+async def test_bouncing_door(
+    hass: HomeAssistant, loaded_entry: MockConfigEntry
+) -> None:
+    """Test a bouncing door contact is passed on as one stable change."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+
+    # Bounces that settle back where they started are dropped
+    for state in RETURNING_BOUNCES:
+        hass.states.async_set("binary_sensor.test_door", state)
+        await hass.async_block_till_done()
+    await _async_settle(hass, sensor)
+    assert _door_state(sensor) == STATE_OFF
+    assert sensor.bounces == len(RETURNING_BOUNCES)
+
+    hass.states.async_set("binary_sensor.test_door", STATE_ON)
+    await hass.async_block_till_done()
+    assert _door_state(sensor) == STATE_OFF
+    await _async_settle(hass, sensor)
+    assert _door_state(sensor) == STATE_ON
+
+    # Closing with bounces starts the door closed delay once it settles
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    await hass.async_block_till_done()
+    for state in CLOSING_BOUNCES:
+        hass.states.async_set("binary_sensor.test_door", state)
+        await hass.async_block_till_done()
+    assert sensor.snapshot.door_closed_delay_deadline is None
+    await _async_settle(hass, sensor)
+    assert _door_state(sensor) == STATE_OFF
+    assert sensor.snapshot.door_closed_delay_deadline is not None
+    # All but the change passed on are counted
+    bounces = len(RETURNING_BOUNCES) + len(CLOSING_BOUNCES) - 1
+    assert sensor.bounces == bounces
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, loaded_entry)
+    assert diagnostics["sensors"][sensor.entity_id]["bounces"] == {
+        "binary_sensor.test_motion": 0,
+        "binary_sensor.test_door": bounces,
+    }
+
+
+@pytest.mark.parametrize("config_overrides", [{CONF_BOX_SETTLE_TIME: BOX_SETTLE_TIME}])
+async def test_settle_time_options(
+    hass: HomeAssistant, loaded_entry: MockConfigEntry
+) -> None:
+    """Test settle times are applied to the running sensor."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    hass.config_entries.async_update_entry(
+        loaded_entry,
+        options={
+            **loaded_entry.options,
+            CONF_WASP_SETTLE_TIME: BOX_SETTLE_TIME,
+            CONF_BOX_SETTLE_TIME: 0,
+        },
+    )
+    await hass.async_block_till_done()
+    assert next(iter(async_get_data(hass).sensors)) is sensor
+
+    # Door changes are passed on at once, motion waits for the settle time
+    hass.states.async_set("binary_sensor.test_door", STATE_ON)
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    await hass.async_block_till_done()
+    diagnostics = sensor.async_get_diagnostics()
+    assert diagnostics["box_state"] == STATE_ON
+    assert diagnostics["wasp_state"] == STATE_OFF
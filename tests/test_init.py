@@ -2,22 +2,30 @@
 
 from __future__ import annotations
 
+from unittest.mock import patch
+
+import pytest
+from custom_components.wasp_in_a_box.config_flow import ConfigFlowHandler
 from custom_components.wasp_in_a_box.const import (
     CONF_BOX_ID,
     CONF_DOOR_CLOSED_DELAY,
     CONF_DOOR_OPEN_TIMEOUT,
     CONF_IMMEDIATE_ON,
+    CONF_ROOMS,
     CONF_WASP_ID,
     DEFAULT_DOOR_CLOSED_DELAY,
     DEFAULT_IMMEDIATE_ON,
     DEFAULT_OPEN_DOOR_TIMEOUT,
     DOMAIN,
 )
+from custom_components.wasp_in_a_box.models import async_get_data
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 
 from homeassistant.config_entries import ConfigEntryState
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_ID, CONF_NAME, STATE_UNKNOWN
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.event import async_track_state_change_event
 
 from .const import DEFAULT_NAME
 
@@ -102,3 +110,385 @@ async def test_setup(
     # Check the state and entity registry entry are removed
     assert hass.states.get(wasp_in_a_box_entity.entity_id) is None
     assert entity_registry.async_get(wasp_in_a_box_entity.entity_id) is None
+
+
+async def test_shared_dispatcher(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test sensors sharing a source are routed by a single dispatcher."""
+
+    second_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options=loaded_entry.options,
+        title="Second",
+        version=ConfigFlowHandler.VERSION,
+    )
+    second_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(second_entry.entry_id)
+    await hass.async_block_till_done()
+
+    dispatcher = async_get_data(hass).dispatcher
+    assert dispatcher.source_count == len(
+        {*loaded_entry.options[CONF_WASP_ID], *loaded_entry.options[CONF_BOX_ID]}
+    )
+
+    hass.states.async_set("binary_sensor.test_motion", "on")
+    await hass.async_block_till_done()
+
+    for entry in (loaded_entry, second_entry):
+        entity_id = er.async_entries_for_config_entry(entity_registry, entry.entry_id)[
+            0
+        ].entity_id
+        state = hass.states.get(entity_id)
+        assert state is not None
+        assert state.attributes["motion_sensor_state"] == "on"
+
+    assert await hass.config_entries.async_unload(second_entry.entry_id)
+    assert await hass.config_entries.async_unload(loaded_entry.entry_id)
+    await hass.async_block_till_done()
+    assert dispatcher.source_count == 0
+
+
+async def test_rename_source_in_place(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test renamed sources are moved in place, keeping the state and timers."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    hass.states.async_set("binary_sensor.test_door", "on")
+    hass.states.async_set("binary_sensor.test_door", "off")
+    await hass.async_block_till_done()
+    diagnostics = sensor.async_get_diagnostics()
+    assert diagnostics["door_closed_delay_remaining"] is not None
+
+    writes: list[str] = []
+    async_track_state_change_event(
+        hass,
+        sensor.entity_id,
+        callback(lambda event: writes.append(event.data["new_state"].state)),
+    )
+
+    with patch.object(
+        hass.config_entries, "async_reload", return_value=True
+    ) as mock_reload:
+        for object_id in ("motion", "door"):
+            entity_registry.async_update_entity(
+                f"binary_sensor.test_{object_id}",
+                new_entity_id=f"binary_sensor.new_{object_id}",
+            )
+            # The source is removed and added again under its new entity id
+            hass.states.async_remove(f"binary_sensor.test_{object_id}")
+            hass.states.async_set(f"binary_sensor.new_{object_id}", "off")
+        await hass.async_block_till_done()
+
+    mock_reload.assert_not_called()
+    assert writes == []
+    assert loaded_entry.options[CONF_WASP_ID] == ["binary_sensor.new_motion"]
+    assert loaded_entry.options[CONF_BOX_ID] == ["binary_sensor.new_door"]
+    assert sensor.async_get_diagnostics() == diagnostics | {
+        remaining: pytest.approx(diagnostics[remaining], abs=1)
+        for remaining in ("door_closed_delay_remaining", "door_open_timeout_remaining")
+    } | {
+        "filtered_events": {
+            "binary_sensor.new_motion": 0,
+            "binary_sensor.new_door": 0,
+        },
+        "bounces": {
+            "binary_sensor.new_motion": 0,
+            "binary_sensor.new_door": 0,
+        },
+    }
+
+    hass.states.async_set("binary_sensor.new_motion", "on")
+    await hass.async_block_till_done()
+
+    state = hass.states.get(sensor.entity_id)
+    assert state is not None
+    assert state.attributes["motion_sensor_state"] == "on"
+
+
+async def test_registry_updates_batched(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test sources removed in one tick are handed to each entry once."""
+
+    other_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options=dict(loaded_entry.options),
+        title="Other",
+        version=ConfigFlowHandler.VERSION,
+    )
+    other_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(other_entry.entry_id)
+    await hass.async_block_till_done()
+
+    with patch.object(
+        hass.config_entries, "async_remove", return_value={}
+    ) as mock_remove:
+        entity_registry.async_remove("binary_sensor.test_motion")
+        entity_registry.async_remove("binary_sensor.test_door")
+        await hass.async_block_till_done()
+
+    assert sorted(call.args[0] for call in mock_remove.call_args_list) == sorted(
+        (loaded_entry.entry_id, other_entry.entry_id)
+    )
+
+
+async def test_filter_attribute_only_changes(
+    hass: HomeAssistant, loaded_entry: MockConfigEntry
+) -> None:
+    """Test attribute only source updates are dropped before the sensor."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    skipped_writes = sensor.skipped_writes
+    state = hass.states.get(sensor.entity_id)
+    assert state is not None
+
+    for linkquality in (10, 20, 30):
+        hass.states.async_set(
+            "binary_sensor.test_door", "off", {"linkquality": linkquality}
+        )
+    await hass.async_block_till_done()
+
+    assert sensor.skipped_writes == skipped_writes
+    assert sensor.async_get_diagnostics()["filtered_events"] == {
+        "binary_sensor.test_motion": 0,
+        "binary_sensor.test_door": 3,
+    }
+    new_state = hass.states.get(sensor.entity_id)
+    assert new_state is not None
+    assert new_state.last_reported == state.last_reported
+
+
+async def test_migrate_entry(
+    hass: HomeAssistant, entity_registry: er.EntityRegistry
+) -> None:
+    """Test single source entries are migrated to lists of sources."""
+
+    for object_id in ("motion", "door"):
+        entity_registry.async_get_or_create(
+            "binary_sensor", "test", object_id, suggested_object_id=f"test_{object_id}"
+        )
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={
+            CONF_WASP_ID: "binary_sensor.test_motion",
+            CONF_BOX_ID: "binary_sensor.test_door",
+            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+        },
+        title=DEFAULT_NAME,
+        version=1,
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert config_entry.state is ConfigEntryState.LOADED
+    assert config_entry.version == ConfigFlowHandler.VERSION
+    assert config_entry.options[CONF_WASP_ID] == ["binary_sensor.test_motion"]
+    assert config_entry.options[CONF_BOX_ID] == ["binary_sensor.test_door"]
+
+
+async def test_multi_room_entry(
+    hass: HomeAssistant, entity_registry: er.EntityRegistry
+) -> None:
+    """Test a multi-room entry adds a sensor for each room."""
+
+    rooms = []
+    for index in range(3):
+        for object_id in (f"motion_{index}", f"door_{index}"):
+            entity_registry.async_get_or_create(
+                "binary_sensor", "test", object_id, suggested_object_id=object_id
+            )
+        rooms.append(
+            {
+                CONF_ID: f"room_{index}",
+                CONF_NAME: f"Room {index}",
+                CONF_WASP_ID: [f"binary_sensor.motion_{index}"],
+                CONF_BOX_ID: [f"binary_sensor.door_{index}"],
+                CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+                CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+                CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+            }
+        )
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={CONF_ROOMS: rooms},
+        title="House",
+        version=ConfigFlowHandler.VERSION,
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    entities = er.async_entries_for_config_entry(entity_registry, config_entry.entry_id)
+    assert {entity.unique_id for entity in entities} == {
+        f"{config_entry.entry_id}_{room[CONF_ID]}" for room in rooms
+    }
+    assert async_get_data(hass).dispatcher.source_count == len(rooms) * 2
+
+    hass.states.async_set("binary_sensor.motion_1", "on")
+    await hass.async_block_till_done()
+
+    state = hass.states.get("binary_sensor.room_1")
+    assert state is not None
+    assert state.attributes["motion_sensor_state"] == "on"
+
+
+async def test_remove_source_of_multi_room_entry(
+    hass: HomeAssistant, entity_registry: er.EntityRegistry
+) -> None:
+    """Test removing a source drops only its room from a multi-room entry."""
+
+    rooms = []
+    for index in range(3):
+        for object_id in (f"motion_{index}", f"door_{index}"):
+            entity_registry.async_get_or_create(
+                "binary_sensor", "test", object_id, suggested_object_id=object_id
+            )
+        rooms.append(
+            {
+                CONF_ID: f"room_{index}",
+                CONF_NAME: f"Room {index}",
+                CONF_WASP_ID: [f"binary_sensor.motion_{index}"],
+                CONF_BOX_ID: [f"binary_sensor.door_{index}"],
+                CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+                CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+                CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+            }
+        )
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={CONF_ROOMS: rooms},
+        title="House",
+        version=ConfigFlowHandler.VERSION,
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    # Both sources of a room removed in one tick drop it once
+    entity_registry.async_remove("binary_sensor.door_2")
+    entity_registry.async_remove("binary_sensor.motion_2")
+    await hass.async_block_till_done()
+
+    assert hass.config_entries.async_get_entry(config_entry.entry_id) is config_entry
+    assert config_entry.state is ConfigEntryState.LOADED
+    assert config_entry.options[CONF_ROOMS] == rooms[:2]
+    entities = er.async_entries_for_config_entry(entity_registry, config_entry.entry_id)
+    assert {entity.unique_id for entity in entities} == {
+        f"{config_entry.entry_id}_{room[CONF_ID]}" for room in rooms[:2]
+    }
+    assert hass.states.get("binary_sensor.room_2") is None
+    assert len(async_get_data(hass).sensors) == len(rooms) - 1
+
+    # An entry left without rooms is removed
+    entity_registry.async_remove("binary_sensor.door_0")
+    entity_registry.async_remove("binary_sensor.door_1")
+    await hass.async_block_till_done()
+
+    assert hass.config_entries.async_get_entry(config_entry.entry_id) is None
+
+
+async def test_options_applied_in_place(
+    hass: HomeAssistant, loaded_entry: MockConfigEntry
+) -> None:
+    """Test timing options are applied without a reload, rescaling deadlines."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    hass.states.async_set("binary_sensor.test_door", "on")
+    hass.states.async_set("binary_sensor.test_door", "off")
+    await hass.async_block_till_done()
+
+    remaining = sensor.async_get_diagnostics()["door_closed_delay_remaining"]
+    assert remaining is not None
+
+    with patch.object(
+        hass.config_entries, "async_reload", return_value=True
+    ) as mock_reload:
+        hass.config_entries.async_update_entry(
+            loaded_entry,
+            options={
+                **loaded_entry.options,
+                CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY + 10,
+                CONF_IMMEDIATE_ON: not DEFAULT_IMMEDIATE_ON,
+            },
+        )
+        await hass.async_block_till_done()
+
+        mock_reload.assert_not_called()
+        assert sensor.async_get_diagnostics()[
+            "door_closed_delay_remaining"
+        ] == pytest.approx(remaining + 10, abs=1)
+
+        # Immediate on is applied to the state of an open door without motion
+        hass.states.async_set("binary_sensor.test_door", "on")
+        await hass.async_block_till_done()
+        assert hass.states.get(sensor.entity_id).state == "off"
+        for immediate_on, state in ((True, "on"), (False, "off")):
+            hass.config_entries.async_update_entry(
+                loaded_entry,
+                options={**loaded_entry.options, CONF_IMMEDIATE_ON: immediate_on},
+            )
+            await hass.async_block_till_done()
+            assert hass.states.get(sensor.entity_id).state == state
+        mock_reload.assert_not_called()
+
+        # Changing a source reloads the entry
+        hass.config_entries.async_update_entry(
+            loaded_entry,
+            options={**loaded_entry.options, CONF_BOX_ID: []},
+        )
+        await hass.async_block_till_done()
+
+    mock_reload.assert_called_once_with(loaded_entry.entry_id)
+
+
+async def test_remove_child_keeps_parent(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test removing a room entry keeps the floor entry using its sensor."""
+
+    room = er.async_entries_for_config_entry(entity_registry, loaded_entry.entry_id)[
+        0
+    ].entity_id
+    floor_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={
+            CONF_WASP_ID: [room],
+            CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY,
+            CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT,
+            CONF_IMMEDIATE_ON: True,
+        },
+        title="Floor",
+        version=ConfigFlowHandler.VERSION,
+    )
+    floor_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(floor_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert await hass.config_entries.async_remove(loaded_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert entity_registry.async_get(room) is None
+    assert hass.config_entries.async_get_entry(floor_entry.entry_id) is floor_entry
+    assert floor_entry.state is ConfigEntryState.LOADED
+    floor = er.async_entries_for_config_entry(entity_registry, floor_entry.entry_id)[
+        0
+    ].entity_id
+    sensor = next(
+        sensor for sensor in async_get_data(hass).sensors if sensor.entity_id == floor
+    )
+    assert sensor.async_get_diagnostics()["wasp_state"] == STATE_UNKNOWN
@@ -0,0 +1,74 @@
+"""Test wasp_in_a_box latency histograms."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+from custom_components.wasp_in_a_box.const import CONF_LATENCY_SENSORS
+from custom_components.wasp_in_a_box.diagnostics import (
+    async_get_config_entry_diagnostics,
+)
+from custom_components.wasp_in_a_box.latency import LATENCY_BUCKETS, LatencyHistogram
+from custom_components.wasp_in_a_box.models import async_get_data
+
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_component import async_update_entity
+
+if TYPE_CHECKING:
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+SAMPLES = 100
+DOOR_CHANGES = (STATE_ON, STATE_OFF, STATE_ON)
+MAX_LATENCY_MS = 1000
+
+
+def test_histogram() -> None:
+    """Test percentiles are interpolated within their bucket."""
+
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) is None
+
+    # 100 latencies spread evenly over the 1 ms to 2.5 ms bucket
+    for index in range(SAMPLES):
+        histogram.record(0.001 + 0.0015 * (index + 1) / SAMPLES)
+    histogram.record(-1)
+
+    assert histogram.count == SAMPLES + 1
+    assert histogram.percentile(0.5) == pytest.approx(0.00175, abs=0.0001)
+    assert histogram.percentile(0.99) == pytest.approx(0.0025, abs=0.0001)
+    assert histogram.as_dict()["buckets"]["0.0001"] == 1
+
+    # Latencies beyond the last bucket are bounded by the largest one
+    histogram.record(LATENCY_BUCKETS[-1] * 2)
+    assert histogram.percentile(1) == LATENCY_BUCKETS[-1] * 2
+    assert histogram.as_dict()["buckets"]["+Inf"] == 1
+
+    merged = LatencyHistogram.merged([histogram, histogram])
+    assert merged.count == histogram.count * 2
+    assert merged.percentile(0.5) == histogram.percentile(0.5)
+
+
+@pytest.mark.parametrize("config_overrides", [{CONF_LATENCY_SENSORS: True}])
+async def test_latency(hass: HomeAssistant, loaded_entry: MockConfigEntry) -> None:
+    """Test source changes written are timed and exposed as sensors."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    for state in DOOR_CHANGES:
+        hass.states.async_set("binary_sensor.test_door", state)
+        await hass.async_block_till_done()
+
+    # Each door change is written, the door closing as the door sensor state
+    assert sensor.latency.count == len(DOOR_CHANGES)
+    diagnostics = await async_get_config_entry_diagnostics(hass, loaded_entry)
+    assert diagnostics["latency"]["count"] == len(DOOR_CHANGES)
+    assert diagnostics["sensors"][sensor.entity_id]["latency"]["p99"] is not None
+
+    for percentile in (50, 95, 99):
+        entity_id = f"sensor.mock_title_latency_p{percentile}"
+        await async_update_entity(hass, entity_id)
+        state = hass.states.get(entity_id)
+        assert state is not None
+        assert 0 <= float(state.state) < MAX_LATENCY_MS
+        assert state.name == f"Mock Title latency p{percentile}"
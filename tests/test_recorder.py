@@ -0,0 +1,159 @@
+"""Measure what wasp_in_a_box sensors write to the recorder.
+
+A normal and a recorder friendly room follow the same sources through an
+hour of visits. The states rows, state attributes rows and attribute bytes
+each writes are recorded as test properties.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from custom_components.wasp_in_a_box.config_flow import ConfigFlowHandler
+from custom_components.wasp_in_a_box.const import (
+    ATTR_MOTION_SENSOR_STATE,
+    CONF_RECORDER_FRIENDLY,
+    DEFAULT_DOOR_CLOSED_DELAY,
+    DOMAIN,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.components.recorder.common import (
+    async_wait_recording_done,
+)
+
+from homeassistant.components.recorder.db_schema import (
+    StateAttributes,
+    States,
+    StatesMeta,
+)
+from homeassistant.components.recorder.util import session_scope
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from .conftest import async_fire_time_changed_until
+
+if TYPE_CHECKING:
+    from homeassistant.components.recorder import Recorder
+
+VISITS_PER_HOUR = 6
+MOTION_PULSES = 10
+
+
+# The recorder has to be set up before hass, which custom integrations need
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(
+    recorder_mock: Recorder,
+    enable_custom_integrations,  # noqa: ANN001
+) -> None:
+    """Set up the recorder, then enable loading custom integrations."""
+
+
+async def _async_expire_door_closed_delays(hass: HomeAssistant) -> None:
+    """Move time past the door closed delays of all sensors."""
+    sensors = async_get_data(hass).sensors
+    await async_fire_time_changed_until(
+        hass,
+        DEFAULT_DOOR_CLOSED_DELAY + 1,
+        lambda: all(
+            sensor.snapshot.door_closed_delay_deadline is None for sensor in sensors
+        ),
+    )
+
+
+def _recorded(hass: HomeAssistant, entity_id: str) -> dict[str, Any]:
+    """Return the rows and attribute bytes recorded for an entity."""
+    with session_scope(hass=hass, read_only=True) as session:
+        attributes_ids = [
+            row.attributes_id
+            for row in session.query(States.attributes_id)
+            .join(StatesMeta, States.metadata_id == StatesMeta.metadata_id)
+            .filter(StatesMeta.entity_id == entity_id)
+        ]
+        shared_attrs = [
+            row.shared_attrs
+            for row in session.query(StateAttributes.shared_attrs).filter(
+                StateAttributes.attributes_id.in_(set(attributes_ids))
+            )
+        ]
+    return {
+        "states_rows": len(attributes_ids),
+        "state_attributes_rows": len(shared_attrs),
+        "state_attributes_bytes": sum(len(attrs.encode()) for attrs in shared_attrs),
+        "shared_attrs": shared_attrs,
+    }
+
+
+async def test_recorder_friendly(
+    recorder_mock: Recorder,
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    get_config: dict[str, Any],
+    record_property: Callable[[str, Any], None],
+) -> None:
+    """Test a recorder friendly room writes a row per occupancy change only."""
+
+    for object_id in ("motion", "door"):
+        entity_registry.async_get_or_create(
+            "binary_sensor", "test", object_id, suggested_object_id=f"test_{object_id}"
+        )
+        hass.states.async_set(f"binary_sensor.test_{object_id}", STATE_OFF)
+
+    for title, recorder_friendly in (("Normal", False), ("Friendly", True)):
+        config_entry = MockConfigEntry(
+            domain=DOMAIN,
+            options={**get_config, CONF_RECORDER_FRIENDLY: recorder_friendly},
+            title=title,
+            version=ConfigFlowHandler.VERSION,
+        )
+        config_entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    for _ in range(VISITS_PER_HOUR):
+        changes = [
+            ("door", STATE_ON),
+            ("motion", STATE_ON),
+            ("door", STATE_OFF),
+            *[
+                change
+                for _ in range(MOTION_PULSES)
+                for change in (("motion", STATE_OFF), ("motion", STATE_ON))
+            ],
+            ("door", STATE_ON),
+            ("motion", STATE_OFF),
+            ("door", STATE_OFF),
+        ]
+        for object_id, state in changes:
+            hass.states.async_set(f"binary_sensor.test_{object_id}", state)
+            await hass.async_block_till_done()
+        await _async_expire_door_closed_delays(hass)
+
+    await async_wait_recording_done(hass)
+
+    normal = await recorder_mock.async_add_executor_job(
+        _recorded, hass, "binary_sensor.normal"
+    )
+    friendly = await recorder_mock.async_add_executor_job(
+        _recorded, hass, "binary_sensor.friendly"
+    )
+    for name, recorded in (("normal", normal), ("recorder_friendly", friendly)):
+        for key in ("states_rows", "state_attributes_rows", "state_attributes_bytes"):
+            record_property(f"{name}_{key}_per_hour", recorded[key])
+
+    for entity_id in ("binary_sensor.normal", "binary_sensor.friendly"):
+        state = hass.states.get(entity_id)
+        assert state is not None
+        assert state.state == STATE_OFF
+
+    # The initial write, then on and off for each visit
+    assert friendly["states_rows"] == 1 + 2 * VISITS_PER_HOUR
+    assert normal["states_rows"] > MOTION_PULSES * VISITS_PER_HOUR
+    assert friendly["state_attributes_rows"] == 1
+    assert not any(
+        ATTR_MOTION_SENSOR_STATE in attrs for attrs in friendly["shared_attrs"]
+    )
+    assert friendly["state_attributes_bytes"] < normal["state_attributes_bytes"]
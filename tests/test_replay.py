@@ -0,0 +1,327 @@
+"""Test wasp_in_a_box recorder replay."""
+
+from __future__ import annotations
+
+import json
+import random
+import sqlite3
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from custom_components.wasp_in_a_box.const import (
+    CONF_BOX_ID,
+    CONF_DOOR_CLOSED_DELAY,
+    CONF_DOOR_OPEN_TIMEOUT,
+    CONF_IMMEDIATE_ON,
+    CONF_ROOMS,
+    CONF_WASP_ID,
+    DEFAULT_DOOR_CLOSED_DELAY,
+    DEFAULT_IMMEDIATE_ON,
+    DEFAULT_OPEN_DOOR_TIMEOUT,
+    DOMAIN,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+from custom_components.wasp_in_a_box.occupancy import (
+    STATE_OFF,
+    STATE_ON,
+    OccupancyRules,
+    VirtualOccupancy,
+)
+from custom_components.wasp_in_a_box.replay import (
+    RoomConfig,
+    replay_rooms,
+    rooms_from_config_entries,
+)
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.const import CONF_ID, CONF_NAME
+from homeassistant.core import Event, EventStateChangedData, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_state_change_event
+from homeassistant.util import dt as dt_util
+
+from .const import DEFAULT_NAME
+
+if TYPE_CHECKING:
+    from freezegun.api import FrozenDateTimeFactory
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+ROOMS = 4
+BATTERY = {"battery": 90}
+# Seconds from the start, source, state and attributes, the door closed at 30
+# starts the delay, later rows of an unchanged state must not disturb it
+LIVE_ROWS = (
+    (10, "binary_sensor.test_door", STATE_ON, None),
+    (20, "binary_sensor.test_motion", STATE_ON, None),
+    (22, "binary_sensor.test_motion", STATE_ON, None),
+    (25, "binary_sensor.test_motion", STATE_OFF, None),
+    (30, "binary_sensor.test_door", STATE_OFF, None),
+    (40, "binary_sensor.test_door", STATE_OFF, BATTERY),
+    (45, "binary_sensor.test_motion", STATE_OFF, BATTERY),
+    (100, "binary_sensor.test_door", STATE_OFF, None),
+)
+
+
+def _room(index: int) -> RoomConfig:
+    """Return the config of a generated room."""
+    return RoomConfig(
+        name=f"Room {index}",
+        wasp_ids=(f"binary_sensor.motion_{index}",),
+        box_ids=(f"binary_sensor.door_{index}",),
+        door_closed_delay=30,
+        door_open_timeout=300,
+        immediate_on=index % 2 == 0,
+    )
+
+
+def _connect(database: Path) -> sqlite3.Connection:
+    """Return a connection to a new database with the recorder states tables."""
+    connection = sqlite3.connect(database)
+    connection.executescript(
+        """
+        CREATE TABLE states_meta (
+            metadata_id INTEGER PRIMARY KEY, entity_id VARCHAR(255)
+        );
+        CREATE TABLE states (
+            state_id INTEGER PRIMARY KEY,
+            state VARCHAR(255),
+            last_updated_ts FLOAT,
+            metadata_id INTEGER
+        );
+        """
+    )
+    return connection
+
+
+@pytest.fixture(name="recorder_db")
+def recorder_db_fixture(tmp_path: Path) -> tuple[Path, dict[str, list]]:
+    """Return a recorder database with generated states and the states per room."""
+    database = tmp_path / "home-assistant_v2.db"
+    connection = _connect(database)
+
+    rng = random.Random(1)  # noqa: S311
+    generated: dict[str, list] = {}
+    for index in range(ROOMS):
+        room = _room(index)
+        events: list[tuple[float, bool, str]] = []
+        time = 1_700_000_000.0
+        for _ in range(200):
+            time += rng.uniform(1, 600)
+            is_wasp = rng.random() < 0.6  # noqa: PLR2004
+            events.append((time, is_wasp, rng.choice([STATE_ON, STATE_OFF])))
+        generated[room.name] = events
+
+        for is_wasp, entity_id in ((True, room.wasp_ids[0]), (False, room.box_ids[0])):
+            cursor = connection.execute(
+                "INSERT INTO states_meta (entity_id) VALUES (?)", (entity_id,)
+            )
+            connection.executemany(
+                "INSERT INTO states (state, last_updated_ts, metadata_id) VALUES (?, ?, ?)",
+                [
+                    (state, time, cursor.lastrowid)
+                    for time, wasp, state in events
+                    if wasp is is_wasp
+                ],
+            )
+
+    connection.commit()
+    connection.close()
+    return database, generated
+
+
+def test_replay_rooms(recorder_db: tuple[Path, dict[str, list]]) -> None:
+    """Test replayed timelines match feeding the rules directly."""
+
+    database, generated = recorder_db
+    rooms = [_room(index) for index in range(ROOMS)]
+
+    timelines = replay_rooms(database, rooms, chunk_size=7, workers=2)
+
+    for room in rooms:
+        occupancy = VirtualOccupancy(
+            room.door_closed_delay, room.door_open_timeout, room.immediate_on
+        )
+        previous: dict[bool, str] = {}
+        for time, is_wasp, state in generated[room.name]:
+            # Repeated states are dropped as the dispatcher filter does
+            if previous.get(is_wasp) == state:
+                continue
+            previous[is_wasp] = state
+            if is_wasp:
+                occupancy.wasp_changed(time, state)
+            else:
+                occupancy.box_changed(time, state)
+        occupancy.advance(generated[room.name][-1][0])
+
+        assert timelines[room.name] == occupancy.transitions
+        assert timelines[room.name]
+
+
+async def test_replay_matches_live(
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+    loaded_entry: MockConfigEntry,
+    tmp_path: Path,
+) -> None:
+    """Test repeated and attribute only rows replay as the live sensor runs."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    start = float(int(dt_util.utcnow().timestamp()) + 1)
+    freezer.move_to(datetime.fromtimestamp(start, UTC))
+
+    live: list[tuple[float, str]] = []
+
+    @callback
+    def _async_occupancy_changed(event: Event[EventStateChangedData]) -> None:
+        old_state, new_state = event.data["old_state"], event.data["new_state"]
+        if new_state is not None and (
+            old_state is None or old_state.state != new_state.state
+        ):
+            live.append((dt_util.utcnow().timestamp(), new_state.state))
+
+    async_track_state_change_event(hass, sensor.entity_id, _async_occupancy_changed)
+
+    # Moving the clock a second at a time expires the timers on time
+    elapsed = 0
+    for offset, entity_id, state, attributes in LIVE_ROWS:
+        for second in range(elapsed + 1, offset + 1):
+            freezer.move_to(datetime.fromtimestamp(start + second, UTC))
+            async_fire_time_changed(hass)
+            await hass.async_block_till_done()
+        elapsed = offset
+        hass.states.async_set(entity_id, state, attributes, force_update=True)
+        await hass.async_block_till_done()
+
+    database = tmp_path / "home-assistant_v2.db"
+    connection = _connect(database)
+    for entity_id in ("binary_sensor.test_motion", "binary_sensor.test_door"):
+        cursor = connection.execute(
+            "INSERT INTO states_meta (entity_id) VALUES (?)", (entity_id,)
+        )
+        connection.executemany(
+            "INSERT INTO states (state, last_updated_ts, metadata_id) VALUES (?, ?, ?)",
+            [(STATE_OFF, start, cursor.lastrowid)]
+            + [
+                (state, start + offset, cursor.lastrowid)
+                for offset, row_entity_id, state, _ in LIVE_ROWS
+                if row_entity_id == entity_id
+            ],
+        )
+    connection.commit()
+    connection.close()
+
+    room = RoomConfig(
+        name=DEFAULT_NAME,
+        wasp_ids=("binary_sensor.test_motion",),
+        box_ids=("binary_sensor.test_door",),
+        door_closed_delay=DEFAULT_DOOR_CLOSED_DELAY,
+        door_open_timeout=DEFAULT_OPEN_DOOR_TIMEOUT,
+        immediate_on=DEFAULT_IMMEDIATE_ON,
+    )
+    timeline = replay_rooms(database, [room], workers=1)[DEFAULT_NAME]
+
+    assert live[-1][1] == STATE_OFF
+    assert [transition for transition in timeline if transition[0] > start] == live
+
+
+def test_replay_boxless_room(tmp_path: Path) -> None:
+    """Test a boxless room follows its wasps as the live rules do."""
+
+    database = tmp_path / "home-assistant_v2.db"
+    connection = _connect(database)
+    cursor = connection.execute(
+        "INSERT INTO states_meta (entity_id) VALUES (?)", ("binary_sensor.room",)
+    )
+    rows = [(0.0, STATE_OFF), (10.0, STATE_ON), (20.0, STATE_OFF)]
+    connection.executemany(
+        "INSERT INTO states (state, last_updated_ts, metadata_id) VALUES (?, ?, ?)",
+        [(state, time, cursor.lastrowid) for time, state in rows],
+    )
+    connection.commit()
+    connection.close()
+
+    room = RoomConfig(
+        name="Floor",
+        wasp_ids=("binary_sensor.room",),
+        box_ids=(),
+        door_closed_delay=DEFAULT_DOOR_CLOSED_DELAY,
+        door_open_timeout=DEFAULT_OPEN_DOOR_TIMEOUT,
+        immediate_on=True,
+    )
+    timeline = replay_rooms(database, [room], workers=1)["Floor"]
+
+    rules = OccupancyRules(immediate_on=True, boxless=True)
+    expected = []
+    for time, state in rows:
+        rules.wasp_changed(state)
+        expected.append((time, rules.state))
+    assert timeline == expected == rows
+
+
+def test_rooms_from_config_entries(tmp_path: Path) -> None:
+    """Test reading the rooms from the config entries storage."""
+
+    path = tmp_path / "core.config_entries"
+    path.write_text(
+        json.dumps(
+            {
+                "data": {
+                    "entries": [
+                        {
+                            "domain": DOMAIN,
+                            "title": "Bathroom",
+                            "options": {
+                                CONF_WASP_ID: [
+                                    "binary_sensor.motion",
+                                    "binary_sensor.mmwave",
+                                ],
+                                CONF_BOX_ID: "binary_sensor.door",
+                                CONF_DOOR_CLOSED_DELAY: 30,
+                                CONF_DOOR_OPEN_TIMEOUT: 300,
+                                CONF_IMMEDIATE_ON: True,
+                            },
+                        },
+                        {
+                            "domain": DOMAIN,
+                            "title": "House",
+                            "options": {
+                                CONF_ROOMS: [
+                                    {
+                                        CONF_ID: "hall",
+                                        CONF_NAME: "Hall",
+                                        CONF_WASP_ID: ["binary_sensor.hall_motion"],
+                                        CONF_BOX_ID: [],
+                                        CONF_DOOR_CLOSED_DELAY: 10,
+                                        CONF_DOOR_OPEN_TIMEOUT: 60,
+                                        CONF_IMMEDIATE_ON: False,
+                                    }
+                                ]
+                            },
+                        },
+                        {"domain": "other", "title": "Other", "options": {}},
+                    ]
+                }
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    assert rooms_from_config_entries(path) == [
+        RoomConfig(
+            name="Bathroom",
+            wasp_ids=("binary_sensor.motion", "binary_sensor.mmwave"),
+            box_ids=("binary_sensor.door",),
+            door_closed_delay=30,
+            door_open_timeout=300,
+            immediate_on=True,
+        ),
+        RoomConfig(
+            name="Hall",
+            wasp_ids=("binary_sensor.hall_motion",),
+            box_ids=(),
+            door_closed_delay=10,
+            door_open_timeout=60,
+            immediate_on=False,
+        ),
+    ]
@@ -0,0 +1,58 @@
+"""Test wasp_in_a_box deadline scheduler."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from custom_components.wasp_in_a_box.scheduler import DeadlineScheduler
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+
+async def test_move_deadline_later(hass: HomeAssistant) -> None:
+    """Test moving a deadline later reuses its heap entry."""
+
+    scheduler = DeadlineScheduler(hass)
+    fired: list[str] = []
+    deadline = scheduler.async_deadline(lambda: fired.append("deadline"))
+
+    deadline.async_schedule(10)
+    for _ in range(100):
+        deadline.async_cancel()
+        deadline.async_schedule(20)
+
+    assert scheduler.pending == 1
+    assert scheduler.queued == 1
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=11))
+    await hass.async_block_till_done()
+    assert fired == []
+    assert deadline.pending
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=21))
+    await hass.async_block_till_done()
+    assert fired == ["deadline"]
+    assert scheduler.pending == 0
+    assert not deadline.pending
+
+
+async def test_cancel_and_move_earlier(hass: HomeAssistant) -> None:
+    """Test cancelled deadlines do not fire and earlier deadlines do."""
+
+    scheduler = DeadlineScheduler(hass)
+    fired: list[str] = []
+    first = scheduler.async_deadline(lambda: fired.append("first"))
+    second = scheduler.async_deadline(lambda: fired.append("second"))
+
+    first.async_schedule(30)
+    first.async_schedule(5)
+    second.async_schedule(5)
+    second.async_cancel()
+    assert scheduler.pending == 1
+
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=6))
+    await hass.async_block_till_done()
+    assert fired == ["first"]
+    assert scheduler.pending == 0
@@ -0,0 +1,113 @@
+"""Test wasp_in_a_box occupancy rules and parameter sweep simulator."""
+
+from __future__ import annotations
+
+import random
+from itertools import pairwise
+
+import numpy as np
+from custom_components.wasp_in_a_box.occupancy import (
+    STATE_OFF,
+    STATE_ON,
+    VirtualOccupancy,
+)
+from custom_components.wasp_in_a_box.simulation import (
+    TraceEvent,
+    parameter_grid,
+    sweep,
+)
+
+
+def _random_trace(seed: int, visits: int) -> list[TraceEvent]:
+    """Return a trace of visits to a room with a flaky motion sensor."""
+    rng = random.Random(seed)  # noqa: S311
+    trace: list[TraceEvent] = [
+        TraceEvent(0, is_wasp=True, state=STATE_OFF, occupied=False),
+        TraceEvent(0, is_wasp=False, state=STATE_OFF, occupied=False),
+    ]
+    time = 0.0
+    for _ in range(visits):
+        time += rng.uniform(60, 600)
+        trace.append(TraceEvent(time, is_wasp=False, state=STATE_ON, occupied=True))
+        time += rng.uniform(1, 5)
+        trace.append(TraceEvent(time, is_wasp=True, state=STATE_ON, occupied=True))
+        time += rng.uniform(1, 5)
+        trace.append(TraceEvent(time, is_wasp=False, state=STATE_OFF, occupied=True))
+        stay_end = time + rng.uniform(30, 900)
+        while time < stay_end:
+            time += rng.uniform(10, 60)
+            trace.append(TraceEvent(time, is_wasp=True, state=STATE_OFF, occupied=True))
+            time += rng.uniform(5, 120)
+            trace.append(TraceEvent(time, is_wasp=True, state=STATE_ON, occupied=True))
+        time += rng.uniform(1, 5)
+        trace.append(TraceEvent(time, is_wasp=False, state=STATE_ON, occupied=False))
+        time += rng.uniform(1, 5)
+        trace.append(TraceEvent(time, is_wasp=False, state=STATE_OFF, occupied=False))
+        time += rng.uniform(10, 30)
+        trace.append(TraceEvent(time, is_wasp=True, state=STATE_OFF, occupied=False))
+    return trace
+
+
+def _scalar_errors(
+    trace: list[TraceEvent],
+    delay: float,
+    timeout: float,
+    immediate_on: bool,
+    end_time: float,
+) -> tuple[float, float]:
+    """Return false on and false off seconds using the scalar rules."""
+    room = VirtualOccupancy(delay, timeout, immediate_on)
+    for event in trace:
+        if event.is_wasp:
+            room.wasp_changed(event.time, event.state)
+        else:
+            room.box_changed(event.time, event.state)
+    room.advance(end_time)
+
+    truth = [(event.time, event.occupied) for event in trace]
+    boundaries = sorted({time for time, _ in room.transitions} | {t for t, _ in truth})
+    boundaries.append(end_time)
+
+    false_on = false_off = 0.0
+    for start, end in pairwise(boundaries):
+        state = [s for t, s in room.transitions if t <= start][-1]
+        occupied = [o for t, o in truth if t <= start][-1]
+        if state == STATE_ON and not occupied:
+            false_on += end - start
+        elif state != STATE_ON and occupied:
+            false_off += end - start
+    return false_on, false_off
+
+
+def test_sweep_matches_scalar_rules() -> None:
+    """Test every sweep combination matches the scalar occupancy rules."""
+
+    trace = _random_trace(seed=1, visits=20)
+    end_time = trace[-1].time + 3600
+    delay, timeout, immediate_on = parameter_grid([1, 10, 30, 120], [1, 60, 300, 3600])
+
+    result = sweep(trace, delay, timeout, immediate_on, end_time=end_time)
+
+    for index in range(delay.shape[0]):
+        false_on, false_off = _scalar_errors(
+            trace,
+            float(delay[index]),
+            float(timeout[index]),
+            bool(immediate_on[index]),
+            end_time,
+        )
+        assert np.isclose(result.false_on[index], false_on)
+        assert np.isclose(result.false_off[index], false_off)
+
+
+def test_sweep_full_selector_range() -> None:
+    """Test sweeping the whole door closed delay and timeout range."""
+
+    trace = _random_trace(seed=2, visits=10)
+    delay, timeout, immediate_on = parameter_grid(range(1, 601, 5), range(1, 3601, 30))
+
+    result = sweep(trace, delay, timeout, immediate_on)
+
+    assert result.false_on.shape == delay.shape
+    assert (result.error >= 0).all()
+    assert result.error[result.best()] == result.error.min()
@@ -0,0 +1,254 @@
+"""Soak the integration with a simulated building.
+
+Input booleans stand in for the motion and door sensors of every room, each
+room is its own wasp_in_a_box entry. A randomised occupancy schedule is
+replayed on the real event loop with time compressed by SPEEDUP, the timing
+options are compressed alike. Loop lag percentiles, RSS per sensor, state
+writes per second and setup and teardown times are recorded as test
+properties. Set WASP_SOAK_ROOMS and WASP_SOAK_HOURS to size the building,
+WASP_SOAK_SEED to change the schedule and WASP_SOAK_REPORT to a path to store
+the results as JSON.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import time
+from collections.abc import Callable, Iterator
+from contextlib import suppress
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Any
+
+from custom_components.wasp_in_a_box.const import (
+    CONF_BOX_ID,
+    CONF_DOOR_CLOSED_DELAY,
+    CONF_DOOR_OPEN_TIMEOUT,
+    CONF_IMMEDIATE_ON,
+    CONF_WASP_ID,
+    DEFAULT_DOOR_CLOSED_DELAY,
+    DEFAULT_IMMEDIATE_ON,
+    DEFAULT_OPEN_DOOR_TIMEOUT,
+    DOMAIN,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.components.input_boolean import DOMAIN as INPUT_BOOLEAN_DOMAIN
+from homeassistant.const import (
+    ATTR_ENTITY_ID,
+    EVENT_STATE_CHANGED,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+    STATE_OFF,
+    STATE_ON,
+)
+from homeassistant.core import EventStateChangedData, HomeAssistant, callback
+from homeassistant.setup import async_setup_component
+
+ROOMS = int(os.environ.get("WASP_SOAK_ROOMS", "25"))
+HOURS = float(os.environ.get("WASP_SOAK_HOURS", "0.25"))
+SEED = int(os.environ.get("WASP_SOAK_SEED", "0"))
+REPORT = os.environ.get("WASP_SOAK_REPORT")
+SPEEDUP = 600
+LAG_INTERVAL = 0.01
+MAX_LAG_P99 = float(os.environ.get("WASP_SOAK_MAX_LAG_P99", "1"))
+
+
+def _schedule(rng: random.Random, index: int, duration: float) -> Iterator[tuple]:
+    """Yield the (time, entity_id, state) changes of visits to a room.
+
+    Each visit opens the door, moves inside with the door closed, then leaves
+    through the door. Visits end before the duration so every room is empty
+    once the schedule and the timers have run.
+    """
+    motion = f"{INPUT_BOOLEAN_DOMAIN}.motion_{index}"
+    door = f"{INPUT_BOOLEAN_DOMAIN}.door_{index}"
+    now = rng.uniform(0, 300)
+    while True:
+        stay = rng.uniform(60, 900)
+        if now + stay + 10 > duration:
+            return
+        yield now, door, STATE_ON
+        yield now + 2, motion, STATE_ON
+        yield now + 5, door, STATE_OFF
+        moment = now + 5
+        while (moment := moment + rng.uniform(20, 90)) + 10 < now + stay:
+            yield moment, motion, STATE_OFF
+            yield moment + rng.uniform(1, 10), motion, STATE_ON
+        yield now + stay, door, STATE_ON
+        yield now + stay + 2, motion, STATE_OFF
+        yield now + stay + 10, door, STATE_OFF
+        now += stay + rng.expovariate(1 / 600)
+
+
+def _rss_bytes() -> int:
+    """Return the resident set size of the process."""
+    with suppress(OSError):
+        pages = int(Path("/proc/self/statm").read_text(encoding="utf-8").split()[1])
+        return pages * resource.getpagesize()
+    # Peak RSS where /proc is not available, in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    """Return the p50, p95 and p99 of the samples."""
+    quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98]}
+
+
+async def _async_measure_lag(samples: list[float]) -> None:
+    """Record how late the loop wakes up a sleeping task, until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(loop.time() - start - LAG_INTERVAL)
+
+
+async def test_soak(
+    hass: HomeAssistant, record_property: Callable[[str, Any], None]
+) -> None:
+    """Test a building of rooms follows a randomised schedule under load."""
+
+    rng = random.Random(SEED)  # noqa: S311
+    duration = HOURS * 3600
+    changes = sorted(
+        (
+            change
+            for index in range(ROOMS)
+            for change in _schedule(rng, index, duration)
+        ),
+        key=itemgetter(0),
+    )
+
+    assert await async_setup_component(
+        hass,
+        INPUT_BOOLEAN_DOMAIN,
+        {
+            INPUT_BOOLEAN_DOMAIN: {
+                f"{role}_{index}": {}
+                for index in range(ROOMS)
+                for role in ("motion", "door")
+            }
+        },
+    )
+    await hass.async_block_till_done()
+
+    config_entries = [
+        MockConfigEntry(
+            domain=DOMAIN,
+            options={
+                CONF_WASP_ID: [f"{INPUT_BOOLEAN_DOMAIN}.motion_{index}"],
+                CONF_BOX_ID: [f"{INPUT_BOOLEAN_DOMAIN}.door_{index}"],
+                CONF_DOOR_CLOSED_DELAY: DEFAULT_DOOR_CLOSED_DELAY / SPEEDUP,
+                CONF_DOOR_OPEN_TIMEOUT: DEFAULT_OPEN_DOOR_TIMEOUT / SPEEDUP,
+                CONF_IMMEDIATE_ON: DEFAULT_IMMEDIATE_ON,
+            },
+            title=f"Room {index}",
+            version=2,
+        )
+        for index in range(ROOMS)
+    ]
+    for config_entry in config_entries:
+        config_entry.add_to_hass(hass)
+
+    rss = _rss_bytes()
+    start = time.perf_counter()
+    assert await async_setup_component(hass, DOMAIN, {})
+    await hass.async_block_till_done()
+    setup_seconds = time.perf_counter() - start
+    rss_per_sensor = (_rss_bytes() - rss) / ROOMS
+
+    sensors = async_get_data(hass).sensors
+    assert len(sensors) == ROOMS
+    sensor_ids = {sensor.entity_id for sensor in sensors}
+
+    writes = 0
+
+    @callback
+    def _async_count_write(event_data: EventStateChangedData) -> bool:
+        nonlocal writes
+        writes += event_data["entity_id"] in sensor_ids
+        return False
+
+    unsub = hass.bus.async_listen(
+        EVENT_STATE_CHANGED, callback(lambda _: None), event_filter=_async_count_write
+    )
+
+    lag: list[float] = []
+    lag_task = hass.async_create_background_task(
+        _async_measure_lag(lag), "wasp_in_a_box soak loop lag"
+    )
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for moment, tick in groupby(changes, key=itemgetter(0)):
+        # Yields to the loop even when behind the schedule
+        await asyncio.sleep(max(start + moment / SPEEDUP - loop.time(), 0))
+        states: dict[str, list[str]] = {STATE_ON: [], STATE_OFF: []}
+        for _, entity_id, state in tick:
+            states[state].append(entity_id)
+        for state, service in (
+            (STATE_ON, SERVICE_TURN_ON),
+            (STATE_OFF, SERVICE_TURN_OFF),
+        ):
+            if states[state]:
+                await hass.services.async_call(
+                    INPUT_BOOLEAN_DOMAIN,
+                    service,
+                    {ATTR_ENTITY_ID: states[state]},
+                    blocking=True,
+                )
+    replay_seconds = loop.time() - start
+    scheduled_seconds = changes[-1][0] / SPEEDUP if changes else 0
+
+    # Let the door open timeouts of the last visits run out
+    await asyncio.sleep(
+        (DEFAULT_OPEN_DOOR_TIMEOUT + DEFAULT_DOOR_CLOSED_DELAY) / SPEEDUP
+    )
+    await hass.async_block_till_done()
+    lag_task.cancel()
+    unsub()
+
+    for entity_id in sensor_ids:
+        state = hass.states.get(entity_id)
+        assert state is not None
+        assert state.state == STATE_OFF
+
+    start = time.perf_counter()
+    for config_entry in config_entries:
+        assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    teardown_seconds = time.perf_counter() - start
+
+    results = {
+        "rooms": ROOMS,
+        "source_changes": len(changes),
+        "setup_seconds": setup_seconds,
+        "teardown_seconds": teardown_seconds,
+        "rss_bytes_per_sensor": rss_per_sensor,
+        "writes_per_second": writes / replay_seconds,
+        "replay_overrun_seconds": replay_seconds - scheduled_seconds,
+        **{
+            f"loop_lag_{name}_seconds": value
+            for name, value in _percentiles(lag).items()
+        },
+    }
+    for name, value in results.items():
+        record_property(name, value)
+    if REPORT:
+        await hass.async_add_executor_job(
+            partial(Path(REPORT).write_text, encoding="utf-8"),
+            json.dumps(results, indent=2, sort_keys=True) + "\n",
+        )
+
+    assert writes
+    assert results["loop_lag_p99_seconds"] <= MAX_LAG_P99
@@ -0,0 +1,174 @@
+"""Test wasp_in_a_box occupancy statistics."""
+
+from __future__ import annotations
+
+from datetime import UTC, datetime, time, timedelta
+from typing import TYPE_CHECKING, Any
+
+import pytest
+from custom_components.wasp_in_a_box.config_flow import ConfigFlowHandler
+from custom_components.wasp_in_a_box.const import (
+    CONF_STATISTICS_RESET,
+    CONF_STATISTICS_SENSORS,
+    DOMAIN,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+from custom_components.wasp_in_a_box.stats import (
+    OccupancyStatistics,
+    get_period,
+    parse_reset_time,
+)
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    mock_restore_cache_with_extra_data,
+)
+
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant, State
+from homeassistant.helpers.entity_component import async_update_entity
+
+if TYPE_CHECKING:
+    from freezegun.api import FrozenDateTimeFactory
+
+    from homeassistant.helpers import entity_registry as er
+
+RESET_TIME = time(4, 30)
+# 2026-01-01 12:00 UTC
+NOON = datetime(2026, 1, 1, 12, tzinfo=UTC).timestamp()
+HOUR = 3600
+RESTORED_SECONDS = 600
+RESTORED_SESSIONS = 3
+
+
+def test_parse_reset_time() -> None:
+    """Test invalid reset times fall back to midnight."""
+
+    assert parse_reset_time("04:30:00") == RESET_TIME
+    assert parse_reset_time("not a time") == time()
+
+
+def test_period() -> None:
+    """Test periods start each day at the reset time."""
+
+    start, end = get_period(NOON, RESET_TIME, UTC)
+    assert datetime.fromtimestamp(start, UTC) == datetime(2026, 1, 1, 4, 30, tzinfo=UTC)
+    assert end - start == timedelta(days=1).total_seconds()
+
+    # Before the reset time belongs to the period of the previous day
+    early = datetime(2026, 1, 1, 3, tzinfo=UTC).timestamp()
+    assert get_period(early, RESET_TIME, UTC)[1] == start
+
+
+def test_statistics() -> None:
+    """Test occupied time and sessions are kept and roll over each period."""
+
+    statistics = OccupancyStatistics(RESET_TIME, UTC)
+    statistics.transition(NOON, occupied=False)
+    assert statistics.sessions == 0
+    assert statistics.last_vacated is None
+
+    statistics.transition(NOON + HOUR, occupied=True)
+    # Repeated occupancy is the same session
+    statistics.transition(NOON + HOUR + 1, occupied=True)
+    assert statistics.occupied_time(NOON + 2 * HOUR) == HOUR
+    statistics.transition(NOON + 2 * HOUR, occupied=False)
+    assert statistics.sessions == 1
+    assert statistics.last_vacated == NOON + 2 * HOUR
+    assert statistics.occupied_time(NOON + 3 * HOUR) == HOUR
+
+    # A session running over the reset time is split between the periods
+    _, end = get_period(NOON, RESET_TIME, UTC)
+    statistics.transition(end - HOUR, occupied=True)
+    assert statistics.occupied_time(end + HOUR) == HOUR
+    assert statistics.sessions == 1
+    assert statistics.period_start == end
+    statistics.transition(end + 2 * HOUR, occupied=False)
+    assert statistics.occupied_time(end + 3 * HOUR) == 2 * HOUR
+
+    # Restored statistics of an earlier period are discarded
+    restored = OccupancyStatistics(RESET_TIME, UTC)
+    restored.restore(statistics.as_dict(), end + 4 * HOUR)
+    assert restored.sessions == 1
+    restored.restore(statistics.as_dict(), end + timedelta(days=1).total_seconds())
+    assert restored.sessions == 0
+    assert restored.occupied_time(end + timedelta(days=1).total_seconds()) == 0
+    assert restored.last_vacated == end + 2 * HOUR
+
+
+@pytest.mark.parametrize(
+    "config_overrides",
+    [{CONF_STATISTICS_SENSORS: True, CONF_STATISTICS_RESET: "04:30:00"}],
+)
+async def test_statistics_sensors(
+    hass: HomeAssistant,
+    entity_registry: er.EntityRegistry,
+    freezer: FrozenDateTimeFactory,
+    get_config: dict[str, Any],
+) -> None:
+    """Test the statistics sensors follow the occupancy and are restored."""
+
+    # Noon in the time zone of the tests, hours from the reset time
+    now = NOON + 8 * HOUR
+    freezer.move_to(datetime.fromtimestamp(now, UTC))
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State("binary_sensor.mock_title", STATE_OFF),
+                {
+                    "state": STATE_OFF,
+                    "wasp_state": STATE_OFF,
+                    "box_state": STATE_OFF,
+                    "motion_was_detected": False,
+                    "door_closed_delay_deadline": None,
+                    "door_open_timeout_deadline": None,
+                    "statistics": {
+                        "period_start": now,
+                        "occupied_seconds": RESTORED_SECONDS,
+                        "sessions": RESTORED_SESSIONS,
+                        "occupied_since": None,
+                        "last_vacated": now,
+                    },
+                },
+            )
+        ],
+    )
+    for object_id in ("motion", "door"):
+        entity_registry.async_get_or_create(
+            "binary_sensor", "test", object_id, suggested_object_id=f"test_{object_id}"
+        )
+        hass.states.async_set(f"binary_sensor.test_{object_id}", STATE_OFF)
+
+    config_entry = MockConfigEntry(
+        domain=DOMAIN, options=get_config, version=ConfigFlowHandler.VERSION
+    )
+    config_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    sessions = hass.states.get("sensor.mock_title_occupancy_sessions")
+    assert sessions is not None
+    assert int(sessions.state) == RESTORED_SESSIONS
+    assert sessions.attributes["last_reset"] is not None
+    occupied_time = hass.states.get("sensor.mock_title_occupied_time")
+    assert occupied_time is not None
+    assert float(occupied_time.state) == RESTORED_SECONDS / 60
+    assert occupied_time.name == "Mock Title occupied time"
+    assert hass.states.get("sensor.mock_title_last_vacated") is not None
+
+    # Occupancy changes are pushed to the sensors
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    await hass.async_block_till_done()
+    assert hass.states.get("binary_sensor.mock_title").state == STATE_ON
+    sessions = hass.states.get("sensor.mock_title_occupancy_sessions")
+    assert int(sessions.state) == RESTORED_SESSIONS + 1
+
+    # The occupied time keeps growing while polled
+    freezer.tick(HOUR)
+    await async_update_entity(hass, "sensor.mock_title_occupied_time")
+    occupied_time = hass.states.get("sensor.mock_title_occupied_time")
+    assert float(occupied_time.state) == (RESTORED_SECONDS + HOUR) / 60
+
+    await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert not async_get_data(hass).statistics
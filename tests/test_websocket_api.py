@@ -0,0 +1,82 @@
+"""Test wasp_in_a_box websocket API."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from custom_components.wasp_in_a_box.const import (
+    ATTR_DOOR_SENSOR_STATE,
+    ATTR_MOTION_SENSOR_STATE,
+)
+from custom_components.wasp_in_a_box.models import async_get_data
+
+from homeassistant.const import STATE_OFF, STATE_ON
+from homeassistant.core import HomeAssistant
+
+if TYPE_CHECKING:
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+    from pytest_homeassistant_custom_component.typing import WebSocketGenerator
+
+
+async def test_list(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test the snapshot of all sensors is returned in one round trip."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    hass.states.async_set("binary_sensor.test_door", STATE_ON)
+    await hass.async_block_till_done()
+
+    client = await hass_ws_client(hass)
+    await client.send_json_auto_id({"type": "wasp_in_a_box/list"})
+    msg = await client.receive_json()
+
+    assert msg["success"]
+    snapshot = msg["result"]["sensors"][sensor.entity_id]
+    assert snapshot["state"] == STATE_ON
+    assert snapshot[ATTR_MOTION_SENSOR_STATE] == STATE_OFF
+    assert snapshot[ATTR_DOOR_SENSOR_STATE] == STATE_ON
+    assert snapshot["door_closed_delay_deadline"] is None
+    assert snapshot["door_open_timeout_deadline"] is not None
+
+
+async def test_subscribe(
+    hass: HomeAssistant,
+    hass_ws_client: WebSocketGenerator,
+    loaded_entry: MockConfigEntry,
+) -> None:
+    """Test changes are streamed as one delta per loop tick."""
+
+    sensor = next(iter(async_get_data(hass).sensors))
+    client = await hass_ws_client(hass)
+    await client.send_json_auto_id({"type": "wasp_in_a_box/subscribe"})
+    msg = await client.receive_json()
+    assert msg["success"]
+
+    msg = await client.receive_json()
+    assert set(msg["event"]["sensors"]) == {sensor.entity_id}
+
+    # Several changes in one tick are delivered together
+    hass.states.async_set("binary_sensor.test_door", STATE_ON)
+    hass.states.async_set("binary_sensor.test_motion", STATE_ON)
+    await hass.async_block_till_done()
+
+    msg = await client.receive_json()
+    assert msg["event"]["sensors"] == {
+        sensor.entity_id: {
+            "state": STATE_ON,
+            ATTR_MOTION_SENSOR_STATE: STATE_ON,
+            ATTR_DOOR_SENSOR_STATE: STATE_ON,
+            "door_closed_delay_deadline": None,
+            "door_open_timeout_deadline": None,
+        }
+    }
+
+    # Removed sensors are delivered as None
+    assert await hass.config_entries.async_unload(loaded_entry.entry_id)
+    await hass.async_block_till_done()
+
+    msg = await client.receive_json()
+    assert msg["event"]["sensors"] == {sensor.entity_id: None}